@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tracemalloc
+import statistics
+import numpy as np
+import pandas as pd
+
+from ebas_importer import EbasData
+from ebas_proj import EbasDataBase
+from .synthetic import generate_dataset
+
+__all__ = [
+   "measure",
+   "run_benchmarks",
+   "compare_reports",
+]
+
+
+def measure(stage, func, repeat=3, memory=True, items=None):
+   """this method times a stage and measures its peak memory
+
+   Args:
+       stage (str): stage name
+       func (callable): called without arguments, repeat times for timing and once more for memory
+       repeat (int, optional): timed runs. Defaults to 3.
+       memory (bool, optional): measure peak memory with tracemalloc, in an extra run as tracing slows it down.
+          only allocations of this process are seen. Defaults to True.
+       items (callable, optional): items processed, from the result of func, for throughput. Defaults to None.
+
+   Returns:
+       (tuple): (result of the last run, stage record)
+   """
+   wall = []
+   cpu = []
+   for _ in range(repeat):
+      w0 = time.perf_counter()
+      c0 = time.process_time()
+      res = func()
+      cpu.append(time.process_time() - c0)
+      wall.append(time.perf_counter() - w0)
+
+   record = {
+      "stage": stage,
+      "repeat": repeat,
+      "wall_s": min(wall),
+      "wall_median_s": statistics.median(wall),
+      "cpu_s": min(cpu),
+      "peak_mb": None,
+      "items": None,
+      "items_per_s": None,
+   }
+   if memory:
+      tracemalloc.start()
+      res = func()
+      record["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+      tracemalloc.stop()
+   if items is not None:
+      record["items"] = items(res)
+      record["items_per_s"] = record["items"] / record["wall_s"] if record["wall_s"] > 0 else None
+
+   print(f"{stage:<20} {record['wall_s']:>10.3f} s {record['cpu_s']:>10.3f} s cpu",
+         f"{record['peak_mb']:>10.1f} MB" if record["peak_mb"] is not None else "")
+   return res, record
+
+def run_benchmarks(workdir="ebas_benchmark", sites=10, files_per_site=4, rows=8760, components_per_file=2,
+                   revisions=2, repeat=3, memory=True, compression=None, dump_format="pickle",
+                   report="benchmark_report.json", seed=0):
+   """this method generates a synthetic data directory and benchmarks the ingest and query paths stage by stage:
+   get_indexing (header only and with xarray), combine_infor, get_site_data, init_db (cold and warm), select_db, get_selected_db, aggregate.
+   stages run in this process, one file or site after the other, so runs are repeatable.
+
+   Args:
+       workdir (str, optional): working directory, dumps and indexes are written here. Defaults to "ebas_benchmark".
+       report (str, optional): JSON report, relative to the working directory. Defaults to "benchmark_report.json".
+       see generate_dataset for the size of the data, and EbasData for compression and dump_format.
+
+   Returns:
+       dict: the report
+   """
+   config = {k: v for k, v in locals().items()}
+   cwd = os.getcwd()
+   os.makedirs(workdir, exist_ok=True)
+   os.chdir(workdir)
+   try:
+      # start from an empty database, the raw data is kept if it was generated with the same config
+      data_config = {k: config[k] for k in ["sites", "files_per_site", "rows", "components_per_file", "revisions", "seed"]}
+      raw_config = None
+      if os.path.exists("raw_config.json"):
+         with open("raw_config.json", "r") as f:
+            raw_config = json.load(f)
+      if not os.path.exists("raw") or raw_config != data_config:
+         print("generating synthetic data...")
+         shutil.rmtree("raw", ignore_errors=True)
+         generate_dataset("raw", sites, files_per_site, rows, components_per_file, revisions, seed=seed)
+         with open("raw_config.json", "w") as f:
+            json.dump(data_config, f)
+      for path in ["ebas_proj_dump", "ebas_proj_dump_xz", "ebas_proj_rollup"]:
+         shutil.rmtree(path, ignore_errors=True)
+      for path in ["value_index", "ebas_db_index.dump", "ebas_db_summary.dump"]:
+         if os.path.exists(path):
+            os.remove(path)
+
+      stages = []
+      d = EbasData("raw", compression=compression, dump_format=dump_format, backend="serial")
+      importer = d.data_importer
+      files = sorted(f for f in d.raw_data_files if f.endswith(".nc"))
+      raw_bytes = sum(os.path.getsize(os.path.join("raw", f)) for f in files)
+
+      records, r = measure("get_indexing", lambda: [importer.get_indexing(f) for f in files], repeat, memory, len)
+      stages.append(r)
+      # the same files decoded by xarray, as before the header only scan
+      importer.fast_scan = False
+      _, r = measure("get_indexing_xarray", lambda: [importer.get_indexing(f) for f in files], repeat, memory, len)
+      stages.append(r)
+      importer.fast_scan = True
+      infor, r = measure("combine_infor", lambda: importer.combine_infor(records), repeat, memory, len)
+      stages.append(r)
+
+      # site dumps use the value index, as in the usual workflow
+      d.set_site_infor(infor, "xz")
+      d.create_value_index()
+      importer.value_index = d.value_index
+      importer.use_value_index = True
+      d.set_site_infor(importer.combine_infor([importer.get_indexing(f) for f in files]), "xz")
+
+      site_files = [d.site_infor[k]["files"] for k in d.site_infor.keys() if "files" in d.site_infor[k]]
+      res, r = measure("get_site_data", lambda: [importer.get_site_data(f) for f in site_files], repeat, memory,
+                       lambda res: sum(len(x) for x in res))
+      stages.append(r)
+      db_index = {}
+      for x in res:
+         db_index.update(x)
+      d.update_db_index(db_index, [], full=True)
+
+      data_path = os.path.dirname(importer.get_dump_path(list(db_index.keys())[0]))
+      dump_bytes = sum(os.path.getsize(os.path.join(data_path, f)) for f in os.listdir(data_path))
+
+      def init_db():
+         for path in ["ebas_db_index.dump", "ebas_db_summary.dump"]:
+            if os.path.exists(path):
+               os.remove(path)
+         return EbasDataBase("site_infor.xz", data_path=data_path, compression=compression, dump_format=dump_format)
+      db, r = measure("init_db_cold", init_db, repeat, memory)
+      stages.append(r)
+      db, r = measure("init_db", lambda: EbasDataBase("site_infor.xz", data_path=data_path, compression=compression,
+                                                       dump_format=dump_format), repeat, memory)
+      stages.append(r)
+
+      # two components over the middle half of the time range
+      span = db.summary["ed"] - db.summary["st"]
+      condition = {"component": d.value_index.get_values("component")[:2],
+                   "st": db.summary["st"] + span // 4, "ed": db.summary["ed"] - span // 4}
+      selected, r = measure("select_db", lambda: db.select_db(condition), repeat, memory,
+                            lambda res: sum(len(x) for x in res.values()))
+      stages.append(r)
+      df, r = measure("get_selected_db", lambda: db.get_selected_db(), repeat, memory, len)
+      stages.append(r)
+      agg, r = measure("aggregate", lambda: db.aggregate("M", use_rollups=False), repeat, memory, len)
+      stages.append(r)
+
+      res = {
+         "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+         "config": {k: v for k, v in config.items() if k != "report"},
+         "environment": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+         },
+         "data": {"files": len(files), "raw_bytes": raw_bytes, "dump_bytes": dump_bytes, "selected_rows": len(df)},
+         "stages": stages,
+      }
+      with open(report, "w") as f:
+         json.dump(res, f, indent=1)
+      print(f"Report is written to '{os.path.join(workdir, report)}'.")
+      return res
+   finally:
+      os.chdir(cwd)
+
+def compare_reports(old, new):
+   """this method compares two benchmark reports stage by stage
+
+   Args:
+       old (str): path of the baseline report
+       new (str): path of the new report
+
+   Returns:
+       pd.DataFrame: wall time, cpu time and peak memory of both, and their ratio new / old
+   """
+   res = []
+   for path in [old, new]:
+      with open(path, "r") as f:
+         res.append(pd.DataFrame(json.load(f)["stages"]).set_index("stage")[["wall_s", "cpu_s", "peak_mb"]])
+   res = res[0].join(res[1], lsuffix="_old", rsuffix="_new", how="outer")
+   for k in ["wall_s", "cpu_s", "peak_mb"]:
+      res[f"{k}_ratio"] = res[f"{k}_new"] / res[f"{k}_old"]
+   return res
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="benchmark the ingest and query paths on synthetic EBAS data.")
+   parser.add_argument("--workdir", default="ebas_benchmark")
+   parser.add_argument("--sites", type=int, default=10)
+   parser.add_argument("--files-per-site", type=int, default=4)
+   parser.add_argument("--rows", type=int, default=8760)
+   parser.add_argument("--components-per-file", type=int, default=2)
+   parser.add_argument("--revisions", type=int, default=2)
+   parser.add_argument("--repeat", type=int, default=3)
+   parser.add_argument("--no-memory", action="store_true")
+   parser.add_argument("--compression", default=None)
+   parser.add_argument("--dump-format", default="pickle", choices=["pickle", "columnar"])
+   parser.add_argument("--report", default="benchmark_report.json")
+   parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two reports instead of running.")
+   args = parser.parse_args()
+
+   if args.compare is not None:
+      print(compare_reports(*args.compare).to_string())
+   else:
+      run_benchmarks(args.workdir, args.sites, args.files_per_site, args.rows, args.components_per_file,
+                     args.revisions, args.repeat, not args.no_memory, args.compression, args.dump_format,
+                     args.report)
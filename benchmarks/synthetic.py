@@ -0,0 +1,96 @@
+import os
+import json
+import zlib
+import numpy as np
+import xarray as xr
+
+__all__ = [
+   "write_synthetic_file",
+   "generate_dataset",
+]
+
+countries = ["DE", "FR", "NO", "CH", "AT", "FI", "SE", "IT", "ES", "GB", "NL", "PL", "CZ", "IE", "DK"]
+components = ["ozone", "nitrate", "sulphate_total", "ammonium", "nitrogen_dioxide", "pm10_mass"]
+bad_flags = [459, 460, 499, 999]
+good_flags = [0, 0, 0, 100, 147, 247]
+
+
+def write_synthetic_file(path, site, components=("ozone",), rows=8760, revisions=2, st="2000-01-01",
+                         resolution=np.timedelta64(1, "h"), matrix="air", qc_fraction=0.05, seed=0):
+   """this method writes one NetCDF file shaped as the EBAS thredds files:
+   1. global attribute "ebas_metadata", a JSON string with station metadata
+   2. time_bnds and metadata_time_bnds
+   3. per component: values and "_qc" flags with a leading revision dimension, and "_ebasmetadata" JSON strings
+
+   Args:
+       path (str): output file
+       site (str): station code, the first two letters are the country code
+       components (tuple, optional): one variable per component. Defaults to ("ozone",).
+       rows (int, optional): number of time steps. Defaults to 8760.
+       revisions (int, optional): size of the revision dimension, the last revision is the current one. Defaults to 2.
+       st (str, optional): first time step. Defaults to "2000-01-01".
+       resolution (np.timedelta64, optional): time step. Defaults to 1 hour.
+       matrix (str, optional): matrix of all components. Defaults to "air".
+       qc_fraction (float, optional): fraction of values flagged with a bad qc flag. Defaults to 0.05.
+       seed (int, optional): random seed. Defaults to 0.
+   """
+   rng = np.random.default_rng(seed)
+   t0 = np.datetime64(st, "ns")
+   st_ = t0 + np.arange(rows) * resolution.astype("timedelta64[ns]")
+   ed_ = st_ + resolution.astype("timedelta64[ns]")
+
+   # station metadata as raw strings, as in the EBAS files, the same for every file of a site
+   station = np.random.default_rng(zlib.crc32(site.encode()))
+   metadata = {
+      "Station code": site,
+      "Station name": f"Synthetic station {site}",
+      "Resolution code": f"{resolution.astype(int)}{np.datetime_data(resolution.dtype)[0]}",
+      "Station latitude": f"{station.uniform(35, 70):.6f}",
+      "Station longitude": f"{station.uniform(-10, 30):.6f}",
+      "Station altitude": f"{station.uniform(0, 3000):.1f} m",
+      "Station land use": "Grassland",
+      "Station setting": "Rural",
+   }
+
+   data_vars = {
+      "time_bnds": (("time", "tbnds"), np.stack([st_, ed_], axis=1)),
+      "metadata_time_bnds": (("metadata_time", "tbnds"), np.array([[st_[0], ed_[-1]]])),
+   }
+   for c in components:
+      rev = f"{c}_rev"
+      val = rng.gamma(2.0, 10.0, size=(revisions, rows))
+      val[rng.random((revisions, rows)) < qc_fraction / 2] = np.nan
+      qc = rng.choice(good_flags, size=(revisions, rows)).astype(np.int32)
+      flagged = rng.random((revisions, rows)) < qc_fraction
+      qc[flagged] = rng.choice(bad_flags, size=flagged.sum())
+      var_metadata = json.dumps({"Matrix": matrix, "Unit": "ug/m3", "Statistics": "arithmetic mean", "Component": c})
+      data_vars[c] = ((rev, "time"), val)
+      data_vars[c + "_qc"] = ((rev, "time"), qc)
+      data_vars[c + "_ebasmetadata"] = ((rev, "metadata_time"), np.full((revisions, 1), var_metadata, dtype=object))
+
+   ds = xr.Dataset(data_vars, coords={"time": st_})
+   ds.attrs["ebas_metadata"] = json.dumps(metadata)
+   ds.attrs["title"] = "synthetic EBAS data"
+   ds.to_netcdf(path)
+
+def generate_dataset(out_path, sites=10, files_per_site=4, rows=8760, components_per_file=2, revisions=2,
+                     qc_fraction=0.05, seed=0):
+   """this method writes a synthetic EBAS data directory, every file of a site covers the next period
+
+   Returns:
+       list: file names
+   """
+   os.makedirs(out_path, exist_ok=True)
+   files = []
+   for s in range(sites):
+      site = f"{countries[s % len(countries)]}{s:04d}R"
+      st = np.datetime64("2000-01-01T00", "h")
+      for f in range(files_per_site):
+         # the same component may be measured at the site in several files
+         comps = [components[(f + i) % len(components)] for i in range(components_per_file)]
+         name = f"{site}.{str(st)[:10].replace('-', '')}000000.20210101000000.synthetic.{comps[0]}.air.1y.1h.lev2.nc"
+         write_synthetic_file(os.path.join(out_path, name), site, comps, rows, revisions, st=str(st),
+                              qc_fraction=qc_fraction, seed=seed + s * files_per_site + f)
+         files.append(name)
+         st = st + rows
+   return files
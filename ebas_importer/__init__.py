@@ -10,18 +10,31 @@ from .data_importer import *
 from .data_checker import *
 from .data_analyzer import *
 from .value_index import *
+from .site_store import *
+from .index_cache import *
+from .site_tracker import *
+from .catalogue import *
+from .aggregation import *
 
 
 __all__ =[
    "EbasData",
+   "SiteStore",
 ]
 
 class EbasData:
-   def __init__(self, data_path, file_type = "nc", compression="xz"):
+   def __init__(self, data_path, file_type = "nc", compression="xz", dump_format="pickle", backend="process", logger=None):
       # store parameters
       self.data_path = data_path
       self.file_type = file_type
+      # codec of pickled dumps: None, "zlib", "lzma-1", ..., see utilities.list_codecs
       self.compression = compression
+      # "pickle": one pickled dict per site, "columnar": memory-mappable SiteStore per site
+      self.dump_format = dump_format
+      # "process", "thread" or "serial", see utilities.run_mp
+      self.backend = backend
+      # stage and per file timings, failures and cache hits, logger: logging.Logger or callable, see utilities.RunReport
+      self.report = utilities.RunReport(logger)
       
       # make necessary directory
       if not os.path.exists(os.path.join(self.data_path,"archived")):
@@ -34,12 +47,16 @@ class EbasData:
       self.site_infor_detailed = None
    
       self.data_checker = EbasFtpDataChecker(data_path)
-      self.data_importer = EbasFtpDataImporter(data_path, compression)
+      self.data_importer = EbasFtpDataImporter(data_path, compression, dump_format)
       self.data_analyzer = EbasFtpDataAnalyzer(data_path)
       self.value_index = ValueIndex()
+      # one value index, new values found while indexing are appended to it
+      self.data_importer.value_index = self.value_index
+      self.site_tracker = DirtySiteTracker()
       
       self.raw_data_files = os.listdir(self.data_path)
 
+   @utilities.timed_stage()
    def create_value_index(self):
       print("creating value index...")
       matrix = self.data_analyzer.summary_attr("matrix")
@@ -67,12 +84,11 @@ class EbasData:
          data = None
          if file.endswith("csv"):
             data = pd.read_csv(file)
-         elif file.endswith("xz"):
-            with lzma.open(file, "rb") as pickle_file:
-               data = pickle.load(pickle_file)
          elif file.endswith("json"):
             with open(file,"r") as json_file:
                data = json.load(json_file)
+         else:
+            data = utilities.load_pickle(file)
          
          setattr(self, attr, data)
          print(f"{file:20} is loaded for {attr:>20}.")
@@ -80,23 +96,37 @@ class EbasData:
          self.data_analyzer.site_infor = self.site_infor
 
    # todo:
+   @utilities.timed_stage()
    def check_updates(self, download=False, print_file=True):
       new, archive = self.data_checker.check_updates(download)
       if print_file:
          print("Files need to be downloaded:", new)
          print("Files need to be archived", archive)
+      if download:
+         # sites of downloaded or archived files need to be imported again
+         self.site_tracker.mark_files(new + archive)
+         print(f"{len(self.site_tracker.sites())} sites need to be imported again.")
       # must update local files because they were updated.
       self.raw_data_files = os.listdir(self.data_path)
       
    
-   def get_site_infor(self, exporting ="xz", use_value_index=False):
+   @utilities.timed_stage()
+   def get_site_infor(self, exporting ="xz", use_value_index=False, incremental=False):
       print("-"*100)
       print("Gathering site information...")
       # filter out non ".nc" files
       self.data_importer.use_value_index = use_value_index
       files = list(filter(lambda x: x.endswith(self.file_type), self.raw_data_files))
-      res = utilities.run_mp(self.data_importer.get_indexing, files, self.data_importer.combine_infor)
+      if incremental:
+         res = self.get_indexing_incremental(files, use_value_index)
+      else:
+         res = self.run_importer(worker_get_indexing, files, 
+                                 reducer=self.data_importer.merge_indexing, initial={})
       
+      self.set_site_infor(res, exporting)
+   
+   @utilities.timed_stage()
+   def set_site_infor(self, res, exporting="xz"):
       self.site_infor = res
       bad =[]
       for k in res.keys():
@@ -110,10 +140,12 @@ class EbasData:
             print(b)
       
       print("Dumping data to disk...")      
-      if exporting =="xz":
-         with lzma.open("site_infor.xz", "wb") as pickle_file:
-            pickle.dump(self.site_infor, pickle_file)
-         print("Data is written to 'site_infor.xz'.")
+      if exporting in utilities.list_codecs():
+         # any codec, e.g. "xz" -> "site_infor.xz", "zlib-1" -> "site_infor.zz"
+         path = "site_infor" + utilities.get_codec(exporting).suffix
+         utilities.dump_pickle(self.site_infor, path, exporting)
+         self.report.add(bytes_written=os.path.getsize(path))
+         print(f"Data is written to '{path}'.")
       else:
          with open("site_infor.json","w") as f:
             json.dump(res, f, indent=4,  sort_keys=True, default=str)  
@@ -122,12 +154,132 @@ class EbasData:
       self.data_analyzer.site_infor = self.site_infor
       
       
-   def import_site_data(self):
+   def run_importer(self, worker_func, arg_list, combine_func=None, reducer=None, initial=None):
+      # workers build their own importer once, instead of receiving a pickled copy with every task
+      # their per file timings and failures come back with every result, see run_worker
+      tasks = [(worker_func, args) for args in arg_list]
+      
+      def collect(acc, r):
+         self.report.extend(r[1])
+         return reducer(acc, r[0])
+      
+      with self.report.stage(worker_func.__name__, items=len(arg_list)):
+         res = utilities.run_mp(run_worker, tasks, 
+                                reducer=collect if reducer is not None else None,
+                                initial=initial,
+                                initializer=init_worker, 
+                                initargs=self.data_importer.worker_args(),
+                                backend=self.backend)
+         if reducer is not None:
+            return res
+         for r in res:
+            self.report.extend(r[1])
+         res = [r[0] for r in res]
+      
+      if combine_func is not None:
+         return combine_func(res)
+      return res
+   
+   @utilities.timed_stage()
+   def get_indexing_incremental(self, files, use_value_index=False):
+      # only new or changed files are opened, the others are taken from the index cache
+      cache = IndexCache(options={"use_value_index": use_value_index,
+                                  "detailed": self.data_importer.detailed})
+      stale, removed, fingerprints = cache.diff(self.data_path, files)
+      print(f"{len(stale)} new or changed files, {len(removed)} removed files since last indexing.")
+      self.report.count("index_cache_hits", len(files) - len(stale))
+      self.report.count("index_cache_misses", len(stale))
+      
+      records = {}
+      if len(stale)>0:
+         res = self.run_importer(worker_get_indexing, stale)
+         records = dict(zip(stale, [self.data_importer.encode_infor(r) for r in res]))
+      
+      cache.drop(removed)
+      cache.update(records, fingerprints)
+      cache.dump()
+      
+      # failed files are not cached, but still reported in site_infor
+      failed = [r for r in records.values() if "error" in list(r.values())[0]]
+      return self.data_importer.combine_infor(cache.records() + failed)
+      
+   @utilities.timed_stage()
+   def import_site_data(self, only_dirty=False, db_index_path="ebas_db_index.dump", rollups=()):
+      # sites with error records have no files to import
+      # rollups: frequencies, e.g. ("M", "Y"), aggregated with every imported site, see EbasDataBase.aggregate
+      self.data_importer.rollups = tuple(rollups)
+      sites = [k for k in self.site_infor.keys() if "files" in self.site_infor[k]]
+      if only_dirty:
+         dirty = self.site_tracker.sites()
+         sites = [k for k in sites if k in dirty]
+         # sites without any file left in site_infor were archived completely
+         removed = [k for k in dirty if k not in self.site_infor.keys()]
+         print(f"{len(sites)} sites need to be imported, {len(removed)} sites were removed.")
+      else:
+         removed = []
+      
       files = []
-      for k in self.site_infor.keys():
+      for k in sites:
          files.append(self.site_infor[k]["files"])
       
       print("Importing datafile of each site...")
-      utilities.run_mp(self.data_importer.get_site_data, files)
+      res = self.run_importer(worker_get_site_data, files)
+      
+      for k in removed:
+         for path in [self.data_importer.get_dump_path(k), self.data_importer.get_rollup_path(k)]:
+            if os.path.exists(path):
+               os.remove(path)
+      
+      db_index = {}
+      for r in res:
+         db_index.update(r)
+      self.update_db_index(db_index, removed, full=not only_dirty, path=db_index_path)
+      self.site_tracker.clear(sites + removed)
    
-   
\ No newline at end of file
+   @utilities.timed_stage()
+   def ingest(self, exporting="xz", use_value_index=False, db_index_path="ebas_db_index.dump", rollups=()):
+      # single pass over raw data: each file is opened once for both site information and site dumps
+      print("-"*100)
+      print("Ingesting site information and datafile of each site...")
+      self.data_importer.use_value_index = use_value_index
+      self.data_importer.rollups = tuple(rollups)
+      files = list(filter(lambda x: x.endswith(self.file_type), self.raw_data_files))
+      
+      site_files = {}
+      for f in files:
+         site_files.setdefault(DirtySiteTracker.file2site(f), []).append(f)
+      
+      # each worker returns the site information of its site already combined, they are merged as they complete
+      # values new to the value index are encoded here, dumps keep them as values, see EbasDataBase.encode_index
+      def merge(acc, r):
+         self.data_importer.merge_site_infor(acc["site_infor"], self.data_importer.encode_infor(r["infor"]))
+         for site_id, content_index in r["db_index"].items():
+            if self.data_importer.use_value_index:
+               for c in content_index.values():
+                  self.value_index.encode_content(c, add=True)
+            acc["db_index"][site_id] = content_index
+         return acc
+      
+      res = self.run_importer(worker_ingest_site, list(site_files.values()), 
+                              reducer=merge, initial={"site_infor": {}, "db_index": {}})
+      
+      self.set_site_infor(res["site_infor"], exporting)
+      self.update_db_index(res["db_index"], [], full=True, path=db_index_path)
+      self.site_tracker.clear(list(site_files.keys()))
+   
+   def update_db_index(self, db_index, removed, full=False, path="ebas_db_index.dump"):
+      # the database index is a pickled {site: content_index}, see EbasDataBase.init_db
+      if not full:
+         if not os.path.exists(path):
+            # will be created by EbasDataBase from the dumps
+            return
+         with open(path, "rb") as pickle_file:
+            old = pickle.load(pickle_file)
+         for k in removed:
+            old.pop(k, None)
+         old.update(db_index)
+         db_index = old
+      
+      with open(path, "wb") as pickle_file:
+         pickle.dump(db_index, pickle_file)
+      print(f"Database index is written to '{path}'.")
@@ -0,0 +1,142 @@
+import numpy as np
+
+__all__ = [
+   "aggregate_intervals",
+   "merge_partials",
+   "finalize_partials",
+]
+
+# calendar bins, as numpy datetime units
+freqs = {"D": "D", "daily": "D", "M": "M", "monthly": "M", "Y": "Y", "A": "Y", "annual": "Y"}
+partial_columns = ["group", "st", "ed", "weight", "weighted_sum", "count", "min", "max"]
+stat_columns = ["mean", "min", "max", "count", "coverage"]
+
+
+def get_unit(freq):
+   if freq not in freqs:
+      raise ValueError(f"unknown frequency '{freq}', use one of {list(freqs.keys())}.")
+   return freqs[freq]
+
+def bin_edges(st, ed, freq):
+   # calendar bin edges from the bin holding the first st to the one holding the last ed
+   unit = get_unit(freq)
+   lo = st.min().astype(f"datetime64[{unit}]")
+   hi = ed.max().astype(f"datetime64[{unit}]") + 1
+   return np.arange(lo, hi + 1).astype("datetime64[ns]")
+
+def empty_partial():
+   res = {k: np.empty(0, dtype=np.float64) for k in partial_columns}
+   res["group"] = np.empty(0, dtype=np.int64)
+   res["st"] = np.empty(0, dtype="datetime64[ns]")
+   res["ed"] = np.empty(0, dtype="datetime64[ns]")
+   res["count"] = np.empty(0, dtype=np.int64)
+   return res
+
+def aggregate_intervals(ts, val, group=0, freq="M"):
+   """this method aggregates interval records to calendar bins, weighted by their overlap with each bin.
+   a record crossing bin edges is split, every piece counts in its own bin.
+
+   Args:
+       ts (np.ndarray): (n, 2) datetime64[ns], st and ed of every record
+       val (np.ndarray): (n,) values, NaN values are not counted
+       group (int or np.ndarray, optional): group code of every record. Defaults to 0.
+       freq (str, optional): "D", "M" or "Y". Defaults to "M".
+
+   Returns:
+       dict: partial aggregates, one row per (group, bin): group, st, ed, weight (valid seconds),
+          weighted_sum, count, min, max. partials can be merged with merge_partials.
+   """
+   n = len(val)
+   if n == 0:
+      return empty_partial()
+   st = np.asarray(ts[:,0], dtype="datetime64[ns]")
+   ed = np.asarray(ts[:,1], dtype="datetime64[ns]")
+   val = np.asarray(val, dtype=np.float64).reshape(n)
+   group = np.broadcast_to(np.asarray(group, dtype=np.int64), (n,))
+
+   edges = bin_edges(st, ed, freq)
+   first_bin = np.searchsorted(edges, st, side="right") - 1
+   last_bin = np.maximum(np.searchsorted(edges, ed, side="left") - 1, first_bin)
+
+   # one piece per (record, bin) it overlaps
+   pieces = last_bin - first_bin + 1
+   record = np.repeat(np.arange(n), pieces)
+   start = np.cumsum(pieces) - pieces
+   bins = first_bin[record] + np.arange(len(record)) - start[record]
+   piece_st = np.maximum(st[record], edges[bins])
+   piece_ed = np.minimum(ed[record], edges[bins + 1])
+   weight = (piece_ed - piece_st).astype(np.int64) / 1e9
+
+   v = val[record]
+   valid = ~np.isnan(v)
+   weight = np.where(valid, weight, 0.0)
+
+   keys, inverse = np.unique(group[record] * len(edges) + bins, return_inverse=True)
+   m = len(keys)
+   res_bins = keys % len(edges)
+   res = {
+      "group": keys // len(edges),
+      "st": edges[res_bins],
+      "ed": edges[res_bins + 1],
+      "weight": np.bincount(inverse, weights=weight, minlength=m),
+      "weighted_sum": np.bincount(inverse, weights=weight * np.where(valid, v, 0.0), minlength=m),
+      "count": np.bincount(inverse[valid], minlength=m).astype(np.int64),
+      "min": np.full(m, np.nan),
+      "max": np.full(m, np.nan),
+   }
+   np.fmin.at(res["min"], inverse[valid], v[valid])
+   np.fmax.at(res["max"], inverse[valid], v[valid])
+   return res
+
+def merge_partials(partials):
+   """this method merges partial aggregates, rows of the same (group, bin) are combined
+
+   Returns:
+       dict: partial aggregates sorted by group and bin
+   """
+   partials = [p for p in partials if len(p["group"]) > 0]
+   if len(partials) == 0:
+      return empty_partial()
+   p = {k: np.concatenate([x[k] for x in partials]) for k in partial_columns}
+   order = np.lexsort((p["st"], p["group"]))
+   p = {k: v[order] for k, v in p.items()}
+
+   new = np.ones(len(order), dtype=bool)
+   new[1:] = (p["group"][1:] != p["group"][:-1]) | (p["st"][1:] != p["st"][:-1])
+   idx = np.flatnonzero(new)
+   return {
+      "group": p["group"][idx],
+      "st": p["st"][idx],
+      "ed": p["ed"][idx],
+      "weight": np.add.reduceat(p["weight"], idx),
+      "weighted_sum": np.add.reduceat(p["weighted_sum"], idx),
+      "count": np.add.reduceat(p["count"], idx),
+      "min": np.fmin.reduceat(p["min"], idx),
+      "max": np.fmax.reduceat(p["max"], idx),
+   }
+
+def finalize_partials(partial, stats=stat_columns):
+   """this method computes statistics from partial aggregates
+
+   Args:
+       partial (dict): see aggregate_intervals
+       stats (list, optional): any of mean, min, max, count, coverage. Defaults to all.
+
+   Returns:
+       dict: group, st, ed and the statistics. coverage is the fraction of the bin covered by valid values,
+          overlapping records may cover the same time, so it is clipped to 1.
+   """
+   res = {"group": partial["group"], "st": partial["st"], "ed": partial["ed"]}
+   weight = partial["weight"]
+   for s in stats:
+      if s == "mean":
+         with np.errstate(divide="ignore", invalid="ignore"):
+            res["mean"] = np.where(weight > 0, partial["weighted_sum"] / weight, np.nan)
+      elif s in ["min", "max", "count"]:
+         res[s] = partial[s]
+      elif s == "coverage":
+         length = (partial["ed"] - partial["st"]).astype(np.int64) / 1e9
+         res["coverage"] = np.minimum(weight / length, 1.0)
+      else:
+         raise ValueError(f"unknown statistic '{s}', use any of {stat_columns}.")
+   return res
@@ -0,0 +1,82 @@
+import os
+import json
+import xml.etree.ElementTree as ET
+
+__all__ = [
+   "CatalogueManifest",
+]
+
+class CatalogueManifest:
+   """
+   this class compares the THREDDS catalogue with local raw data files:
+   1. the XML catalogue gives name, size and modification date of every remote file
+   2. the manifest keeps size and date of every local file as they were on the server when downloaded
+   3. remote files missing locally are new, files whose size or date differ from the manifest are changed,
+      local files missing remotely are removed
+   """
+
+   def __init__(self, path):
+      self.path = path
+      self.files = {}
+      if os.path.exists(self.path):
+         with open(self.path, "r") as json_file:
+            self.files = json.load(json_file)
+
+   @staticmethod
+   def parse_catalogue(xml_text):
+      """this method parses a THREDDS catalog.xml
+
+      Returns:
+          dict: {file_name: {"size": "1.433 Mbytes", "modified": "2021-03-12T10:11:12Z"}}
+      """
+      res = {}
+      root = ET.fromstring(xml_text)
+      for node in root.iter():
+         # datasets without urlPath are folders, e.g. the top level "ebas"
+         if not node.tag.endswith("dataset") or node.get("urlPath") is None:
+            continue
+         size = None
+         modified = None
+         for child in node:
+            if child.tag.endswith("dataSize"):
+               size = f"{child.text.strip()} {child.get('units', '')}".strip()
+            elif child.tag.endswith("date") and child.get("type") == "modified":
+               modified = child.text.strip()
+         res[node.get("name")] = {"size": size, "modified": modified}
+      return res
+
+   def diff(self, catalogue, local_files):
+      """this method compares the catalogue with local files in linear time
+
+      Args:
+          catalogue (dict): output of parse_catalogue
+          local_files (list): files in the local data directory
+
+      Returns:
+          (tuple): (new, changed, removed)
+      """
+      local = set(local_files)
+      new = []
+      changed = []
+      for f, meta in catalogue.items():
+         if f not in local:
+            new.append(f)
+         elif f in self.files and self.files[f] != meta:
+            changed.append(f)
+      removed = [f for f in local_files if f not in catalogue]
+      return new, changed, removed
+
+   def update(self, catalogue, local_files, downloaded=(), removed=()):
+      # downloaded files take the catalogue metadata, local files without any record are assumed up to date
+      for f in downloaded:
+         self.files[f] = catalogue[f]
+      for f in local_files:
+         if f in catalogue and f not in self.files:
+            self.files[f] = catalogue[f]
+      for f in removed:
+         self.files.pop(f, None)
+      self.dump()
+
+   def dump(self):
+      with open(self.path, "w") as json_file:
+         json.dump(self.files, json_file, indent=1, sort_keys=True)
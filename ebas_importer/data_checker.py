@@ -4,7 +4,9 @@ import utilities
 from datetime import datetime
 from tqdm import tqdm
 
-from utilities.utilities import download_ftp
+import requests
+
+from .catalogue import CatalogueManifest
 
 class EbasFtpDataChecker:
    """
@@ -16,8 +18,14 @@ class EbasFtpDataChecker:
    5. export which files were added, and which files are needed to be archived
    """
    
-   def __init__(self, data_path):
+   def __init__(self, data_path, max_workers=8, timeout=60):
       self.data_path = data_path
+      # concurrent downloads
+      self.max_workers = max_workers
+      # connect/read timeout in seconds of catalogue requests and downloads
+      self.timeout = timeout
+      # size and date of local files as they were on the server
+      self.manifest = CatalogueManifest(os.path.join(self.data_path, "archived", "manifest.json"))
       
    def check_updates(self, download=False):
       # check whether raw data need to be updated
@@ -25,29 +33,25 @@ class EbasFtpDataChecker:
       print("Check for updates...")
       print(f"{len(os.listdir(self.data_path))-1} raw data files in current data directory.")
       
-      ftp_files = self.get_current_ftp_files()
-      local_files = os.listdir(self.data_path)
+      catalogue = self.get_catalogue()
+      # ".part" files are unfinished downloads, kept to be resumed
+      local_files = [f for f in os.listdir(self.data_path) if f!="archived" and not f.endswith(".part")]
       
-      new = []
-      for f in tqdm(ftp_files, desc="check ftp files..."):
-         if f not in local_files:
-            new.append(f)
-
-      archive = []
-      for f in tqdm(local_files, desc="check local files..."):
-         if f not in ftp_files and f!="archived":
-            archive.append(f)
+      new, changed, archive = self.manifest.diff(catalogue, local_files)
             
       print(f"{len(new)} files need to be added.")
+      print(f"{len(changed)} files were re-published and need to be downloaded again.")
       print(f"{len(archive)} files need to be archived.")
       
       if download:
-         self.download_files(new)
+         errors = self.download_files(new + changed)
          self.archive_files(archive)
+         downloaded = [f for f in new + changed if f not in errors]
+         self.manifest.update(catalogue, local_files, downloaded=downloaded, removed=archive)
       
       print("-"*100)
       
-      return new, archive
+      return new + changed, archive
       
    
    def archive_files(self, files):
@@ -62,21 +66,26 @@ class EbasFtpDataChecker:
    
    def download_files(self, files):      
       # update file need to be changed.
-      errors = utilities.download_ftp(files, out_path=self.data_path, ftp="https://thredds.nilu.no/thredds/fileServer/ebas/")      
+      errors = utilities.download_concurrent(files, out_path=self.data_path, 
+                                             url="https://thredds.nilu.no/thredds/fileServer/ebas/",
+                                             max_workers=self.max_workers, timeout=self.timeout)
       if len(files)>0:
          self.log("downloaded",files)
+      errors = [e[0] for e in errors]
       if len(errors)>0:
          print(f"\t{len(errors)} errors occurred when downloading files, check log.txt.")
          self.log("errors",errors)
+      return errors
    
-   def get_current_ftp_files(self):
-      print("Reqesting data from ftp...")
-      url = "https://thredds.nilu.no/thredds/catalog/ebas/catalog.html"
-      selector = "tr > td > a > tt"
-      files = utilities.bs4_get(url, selector)
-      print(f"{len(files)-1} files on ftp server.")
-      # the first line is "Ebas"
-      return files[1:]
+   def get_catalogue(self):
+      print("Reqesting catalogue from ftp...")
+      url = "https://thredds.nilu.no/thredds/catalog/ebas/catalog.xml"
+      wb_res = requests.get(url, timeout=self.timeout)
+      if wb_res.status_code !=200:
+         raise ValueError("Connection error.")
+      catalogue = CatalogueManifest.parse_catalogue(wb_res.content)
+      print(f"{len(catalogue)} files on ftp server.")
+      return catalogue
    
    def log(self, change, files):
       with open(os.path.join(self.data_path,"archived","log.txt"),"a") as f:
@@ -6,10 +6,24 @@ from tqdm import tqdm
 import pandas as pd
 import numpy as np
 import os
-import pickle
-import lzma
+import time
+import threading
+
+try:
+   import netCDF4
+except ImportError:
+   netCDF4 = None
+
+# netCDF4 and HDF5 are not thread safe, the lock is the one xarray holds around them,
+# so headers scanned by thread workers never run next to another netCDF4 call
+try:
+   from xarray.backends.locks import HDF5_LOCK as netcdf_lock
+except ImportError:
+   netcdf_lock = threading.Lock()
 
 from .value_index import *
+from .site_store import SiteStore
+from .aggregation import aggregate_intervals, get_unit
 
 class EbasFtpDataImporter:
    """
@@ -19,175 +33,355 @@ class EbasFtpDataImporter:
    3. combine results from multiple file.
    """
    
-   def __init__(self, data_path, compression):
+   def __init__(self, data_path, compression, dump_format="pickle"):
       self.data_path = data_path
       self.site = {}
       # self.components = list(pd.read_csv("components.csv")["components"])
       self.detailed = True
+      # get_indexing reads only the header of files with netCDF4, xarray is used if it is not installed
+      self.fast_scan = True
       self.compression = compression
+      self.dump_format = dump_format
       self.value_index = ValueIndex()
       self.use_value_index = False
+      # frequencies ("D", "M", "Y") aggregated next to every site dump, see dump_rollups
+      self.rollups = ()
+      # per file timings and failures, sent back from workers by run_worker
+      self.report = utilities.RunReport()
       
      
+   def worker_args(self):
+      # arguments of init_worker, so workers build the same importer
+      return (self.data_path, self.compression, self.dump_format, self.detailed, self.use_value_index, self.rollups,
+              self.fast_scan)
+   
    def get_indexing(self, file_name):
+      timer = self.start_timer()
       try:
          # get site information
-         ebas = xr.open_dataset(os.path.join(self.data_path, file_name))
-         ebas_metadata = ebas.ebas_metadata
-         ebas_metadata = json.loads(ebas_metadata)
-            
-         site = {
-                "id": ebas_metadata["Station code"],
-                "name": ebas_metadata["Station name"],
-                "country": utilities.code2country(ebas_metadata["Station code"][0:2]),
-                "land_use":None,
-                "station_setting":None,
-                "alt":None,
-                "lat":None,
-                "lon":None,
-                "files":{},
-               #  "var_content":[]
-            }
-         try:
-            site["land_use"] = ebas_metadata["Station land use"]           
-         except:
-            pass
-         try:
-            site["station_setting"] = ebas_metadata["Station setting"]         
-         except:
-            pass
-         try:
-            site["alt"] = ebas_metadata["Station altitude"]                           
-         except:
-            pass
-         try:           
-            site["lat"] = ebas_metadata["Station latitude"]                           
-         except:
-            pass
-         try:            
-            site["lon"] = ebas_metadata["Station longitude"]               
-         except:
-            pass
+         header = None
+         if self.fast_scan and netCDF4 is not None:
+            try:
+               header = self.scan_header(os.path.join(self.data_path, file_name))
+            except Exception:
+               # files laid out differently are read by xarray
+               self.report.count("fast_scan_fallbacks")
+         if header is None:
+            ebas = xr.open_dataset(os.path.join(self.data_path, file_name))
+            timer["opened"] = time.perf_counter()
+            header = self.read_header(ebas)
+         else:
+            timer["opened"] = time.perf_counter()
+         res = self.index_header(header, file_name)
+         self.record_file("get_indexing", file_name, timer)
+         return res
+      
+      except Exception as e:
+         print(e)
+         print(file_name)
+         self.report.record_failure("get_indexing", file_name, e)
+         return self.error_record(file_name, e)
+   
+   @staticmethod
+   def start_timer():
+      return {"start": time.perf_counter(), "cpu": time.process_time(), "opened": None}
+   
+   def record_file(self, stage, file_name, timer, rows=None):
+      # open_s: opening the dataset, decode_s: reading what is needed from it
+      end = time.perf_counter()
+      opened = timer["opened"] if timer["opened"] is not None else end
+      self.report.record_file(stage, file_name, 
+                              open_s=opened - timer["start"], 
+                              decode_s=end - opened, 
+                              cpu_s=time.process_time() - timer["cpu"],
+                              bytes_read=os.path.getsize(os.path.join(self.data_path, file_name)),
+                              rows=rows)
+   
+   def index_dataset(self, ebas, file_name):
+      # get indexing information from an opened dataset
+      return self.index_header(self.read_header(ebas), file_name)
+   
+   @staticmethod
+   def read_header(ebas):
+      """this method reads what get_indexing needs from a dataset opened by xarray
+
+      Returns:
+          dict: {"attrs": global attributes, "vars": data variables, 
+                 "metadata": {var: last "_ebasmetadata" string}, "st": first time bound, "ed": last time bound}
+      """
+      vars = list(ebas.data_vars.keys())
+      metadata = {}
+      for v in vars:
+         if v.endswith("_ebasmetadata"):
+            temp = ebas[v].data.tolist()[-1]
+            while isinstance(temp, list):
+               temp = temp[-1]
+            metadata[v[:-len("_ebasmetadata")]] = temp
+      
+      return {
+         "attrs": {a: getattr(ebas, a) for a in ebas.attrs},
+         "vars": vars,
+         "metadata": metadata,
+         "st": ebas["time_bnds"][0,0].values,
+         "ed": ebas["time_bnds"][-1,1].values,
+      }
+   
+   @staticmethod
+   def scan_header(path):
+      """this method reads the same as read_header with netCDF4, without decoding whole variables:
+      global attributes, the last element of "_ebasmetadata" variables and two corners of "time_bnds".
+      raises if the file is laid out differently, e.g. char arrays instead of strings.
+
+      Returns:
+          dict: see read_header
+      """
+      with netcdf_lock, netCDF4.Dataset(path) as nc:
+         nc.set_auto_mask(False)
+         attrs = {a: nc.getncattr(a) for a in nc.ncattrs()}
          
-         # get var content
-         vars = list(ebas.data_vars.keys())
-         vars = list(filter(lambda x: not x.endswith("_qc") and not x.endswith("_ebasmetadata"), vars))
-         vars.remove("time_bnds")
-         vars.remove("metadata_time_bnds")
+         # as xarray: dimension variables and variables named in "coordinates" are not data variables
+         coords = set(nc.dimensions.keys())
+         for var in nc.variables.values():
+            if "coordinates" in var.ncattrs():
+               coords.update(var.getncattr("coordinates").split())
+         vars = [v for v in nc.variables.keys() if v not in coords]
          
-         var_content = []
+         metadata = {}
          for v in vars:
-            temp = ebas[v+"_ebasmetadata"].data.tolist()[-1]
-            
-            while isinstance(temp, list):
-               temp = temp[-1]
+            if v.endswith("_ebasmetadata"):
+               var = nc.variables[v]
+               temp = var[(-1,)*var.ndim]
+               if not isinstance(temp, str):
+                  raise TypeError(f"{v} is not a string variable.")
+               metadata[v[:-len("_ebasmetadata")]] = temp
+         
+         bnds = nc.variables["time_bnds"]
+         raw = np.array([bnds[0,0], bnds[-1,1]])
+         # bounds may have no units, then they are the ones of the time variable
+         attrs_bnds = {a: bnds.getncattr(a) for a in bnds.ncattrs()}
+         if "units" not in attrs_bnds:
+            for var in nc.variables.values():
+               if "bounds" in var.ncattrs() and var.getncattr("bounds") == "time_bnds":
+                  attrs_bnds = {a: var.getncattr(a) for a in var.ncattrs()}
+         
+      st, ed = xr.coding.times.decode_cf_datetime(raw, attrs_bnds["units"], attrs_bnds.get("calendar"))
+      return {"attrs": attrs, "vars": vars, "metadata": metadata, "st": st, "ed": ed}
+   
+   def index_header(self, header, file_name):
+      # get indexing information from a header, see read_header
+      ebas_metadata = header["attrs"]["ebas_metadata"]
+      ebas_metadata = json.loads(ebas_metadata)
+         
+      site = {
+             "id": ebas_metadata["Station code"],
+             "name": ebas_metadata["Station name"],
+             "country": utilities.code2country(ebas_metadata["Station code"][0:2]),
+             "land_use":None,
+             "station_setting":None,
+             "alt":None,
+             "lat":None,
+             "lon":None,
+             "files":{},
+            #  "var_content":[]
+         }
+      try:
+         site["land_use"] = ebas_metadata["Station land use"]           
+      except:
+         pass
+      try:
+         site["station_setting"] = ebas_metadata["Station setting"]         
+      except:
+         pass
+      try:
+         site["alt"] = utilities.to_float(ebas_metadata["Station altitude"])                           
+      except:
+         pass
+      try:           
+         site["lat"] = utilities.to_float(ebas_metadata["Station latitude"])                           
+      except:
+         pass
+      try:            
+         site["lon"] = utilities.to_float(ebas_metadata["Station longitude"])               
+      except:
+         pass
+      
+      # get var content
+      vars = list(header["vars"])
+      vars = list(filter(lambda x: not x.endswith("_qc") and not x.endswith("_ebasmetadata"), vars))
+      vars.remove("time_bnds")
+      vars.remove("metadata_time_bnds")
+      
+      var_content = []
+      for v in vars:
+         temp = json.loads(header["metadata"][v])
+         
+         if "Matrix" in temp.keys():
+            content ={
+               "res_code": ebas_metadata["Resolution code"],
+               "matrix": temp["Matrix"],
+               "unit":temp["Unit"],
+               "meta": "no_ebas", 
                
-            temp = json.loads(temp)
-            
-            if "Matrix" in temp.keys():
-               content ={
-                  "res_code": ebas_metadata["Resolution code"],
-                  "matrix": temp["Matrix"],
-                  "unit":temp["Unit"],
-                  "meta": "no_ebas", 
-                  
-                  "var":v,
-                  "site": ebas_metadata["Station code"],
-                  "stat": temp["Statistics"],
-                  "component":temp["Component"],
-                  "st":ebas["time_bnds"][0,0].values,
-                  "ed":ebas["time_bnds"][-1,1].values,
-               }
-            elif "ebas_matrix" in temp.keys():
-               content ={
-                  # "res": res_code_index[ebas_metadata["Resolution code"]],
-                  # "matrix": matrix_index[temp["ebas_matrix"]],
-                  # "unit":units_index[temp["ebas_unit"]],
-                  # "meta": meta_index["no_ebas"],
-                  
-                  "res_code": ebas_metadata["Resolution code"],
-                  "matrix": temp["ebas_matrix"],
-                  "unit":temp["ebas_unit"],
-                  "meta": "no_ebas",
-                  
-                  "var":v,
-                  "site": ebas_metadata["Station code"],
-                  "stat": temp["ebas_statistics"],
-                  "component":temp["ebas_component"],
-                  "st":ebas["time_bnds"][0,0].values,
-                  "ed":ebas["time_bnds"][-1,1].values,
-               }
-            
-            # convert string to indexing number
-            if self.use_value_index:
-               content["site"] = self.value_index.site[content["site"]]
-               content["matrix"] = self.value_index.matrix[content["matrix"]]
-               content["component"] = self.value_index.component[content["component"]]
-               content["unit"] = self.value_index.unit[content["unit"]]
-               content["res_code"] = self.value_index.res_code[content["res_code"]]
-               content["meta"] = self.value_index.meta[content["meta"]]
+               "var":v,
+               "site": ebas_metadata["Station code"],
+               "stat": temp["Statistics"],
+               "component":temp["Component"],
+               "st":header["st"],
+               "ed":header["ed"],
+            }
+         elif "ebas_matrix" in temp.keys():
+            content ={
+               # "res": res_code_index[ebas_metadata["Resolution code"]],
+               # "matrix": matrix_index[temp["ebas_matrix"]],
+               # "unit":units_index[temp["ebas_unit"]],
+               # "meta": meta_index["no_ebas"],
+               
+               "res_code": ebas_metadata["Resolution code"],
+               "matrix": temp["ebas_matrix"],
+               "unit":temp["ebas_unit"],
+               "meta": "no_ebas",
                
-            var_content.append(content)
+               "var":v,
+               "site": ebas_metadata["Station code"],
+               "stat": temp["ebas_statistics"],
+               "component":temp["ebas_component"],
+               "st":header["st"],
+               "ed":header["ed"],
+            }
+         
+         # convert string to indexing number, values new to the value index are encoded by encode_infor
+         if self.use_value_index:
+            self.value_index.encode_content(content)
             
-         # get attr information
-         attr_content={}
-         if self.detailed:
-            attrs = ebas.attrs
-            attr_content ={}
-            for a in attrs:
-               temp = getattr(ebas,a)
-               if isinstance(temp, np.ndarray):
-                  temp= temp.tolist()
-               attr_content[a] = temp
+         var_content.append(content)
          
-         site["files"] = {file_name:{"contents": var_content, "attrs": attr_content}}
-                       
-         return {site["id"]: site}
+      # get attr information
+      attr_content={}
+      if self.detailed:
+         attrs = header["attrs"]
+         attr_content ={}
+         for a in attrs:
+            temp = attrs[a]
+            if isinstance(temp, np.ndarray):
+               temp= temp.tolist()
+            attr_content[a] = temp
       
-      except Exception as e:
-         print(e)
-         print(file_name)
-         return {file_name: {
-                "id": "",
-                "name": "",
-                "land_use": "",
-                "station_setting": "",
-                "lat": "",
-                "lon": "",
-                "alt": "",
-                "error":str(e),
-            }}
+      site["files"] = {file_name:{"contents": var_content, "attrs": attr_content}}
+                    
+      return {site["id"]: site}
+
+   def encode_infor(self, infor):
+      """this method encodes values new to the value index, in place. 
+      workers only encode values already in the value index, new ones are appended here, in the main process,
+      so every worker's records get the same codes.
+
+      Args:
+          infor (dict): {site_id: site}, a get_indexing result or combined site information
+
+      Returns:
+          dict: infor
+      """
+      if not self.use_value_index:
+         return infor
+      for site in infor.values():
+         if "error" in site:
+            continue
+         for f in site["files"].values():
+            for c in f["contents"]:
+               self.value_index.encode_content(c, add=True)
+         if "components" in site:
+            site["components"] = {self.value_index.encode_content({"component": k}, add=True)["component"]: v
+                                  for k, v in site["components"].items()}
+      return infor
+   
+   def merge_indexing(self, res, d):
+      # run_mp reducer of get_indexing results, see merge_infor
+      return self.merge_infor(res, self.encode_infor(d))
+   
+   @staticmethod
+   def error_record(file_name, e):
+      return {file_name: {
+             "id": "",
+             "name": "",
+             "land_use": "",
+             "station_setting": "",
+             "lat": "",
+             "lon": "",
+             "alt": "",
+             "error":str(e),
+         }}
 
    @staticmethod
    def combine_infor(list_dict_infor):
       res = {}
       for d in list_dict_infor:
-         id = list(d.keys())[0]
-         if id not in res.keys():
-            res[id] = d[id]
-            # will add stats for how many files this site has
-            res[id]["file_num"] =1
-            res[id]["components"]={}
-         else:
-            res[id]["file_num"] +=1
-            res[id]["files"].update(d[id]["files"])
-         
-         # create a component indexing dict
-         for f in d[id]["files"].keys():
-            contents = d[id]["files"][f]["contents"]
-            for c in contents:
-               if c["component"] not in res[id]["components"].keys():
-                  res[id]["components"][c["component"]] = {
-                  "st":c["st"],
-                  "ed":c["ed"],
-               }
-               else:
-                  if c["st"] < res[id]["components"][c["component"]]["st"]:
-                     res[id]["components"][c["component"]]["st"] = c["st"]
-                  if c["ed"] > res[id]["components"][c["component"]]["ed"]:
-                     res[id]["components"][c["component"]]["ed"] = c["ed"]
-                      
+         EbasFtpDataImporter.merge_infor(res, d)
       return res
+   
+   @staticmethod
+   def merge_infor(res, d):
+      """folds one get_indexing result into combined site information, res is updated in place and returned.
+      used as run_mp reducer, merging starts with the first indexed file instead of after the last one.
+      """
+      return EbasFtpDataImporter.merge_site_infor(res, EbasFtpDataImporter.partial_infor(d))
+   
+   @staticmethod
+   def partial_infor(d):
+      # combined site information of a single get_indexing result
+      id = list(d.keys())[0]
+      # copy the site dict, the records may be kept in the index cache and must not be altered
+      site = dict(d[id])
+      if "error" in site:
+         # error records of files that could not be indexed are kept as they are, without files
+         return {id: site}
+      site["files"] = dict(d[id]["files"])
+      # will add stats for how many files this site has
+      site["file_num"] = 1
+      site["components"] = {}
+      
+      # create a component indexing dict
+      for f in site["files"].keys():
+         contents = site["files"][f]["contents"]
+         for c in contents:
+            if c["component"] not in site["components"].keys():
+               site["components"][c["component"]] = {
+               "st":c["st"],
+               "ed":c["ed"],
+            }
+            else:
+               if c["st"] < site["components"][c["component"]]["st"]:
+                  site["components"][c["component"]]["st"] = c["st"]
+               if c["ed"] > site["components"][c["component"]]["ed"]:
+                  site["components"][c["component"]]["ed"] = c["ed"]
+      return {id: site}
+   
+   @staticmethod
+   def merge_site_infor(a, b):
+      """merges combined site information b into a, a is updated in place and returned.
+      the merge is associative, partial results of different workers or shards can be merged in any grouping.
+      """
+      for id, site in b.items():
+         if "error" in site:
+            # keyed by the file name, there is nothing to merge
+            a[id] = dict(site)
+            continue
+         if id not in a.keys():
+            a[id] = dict(site)
+            a[id]["files"] = dict(site["files"])
+            a[id]["components"] = {k: dict(v) for k, v in site["components"].items()}
+            continue
+         
+         a[id]["file_num"] += site["file_num"]
+         a[id]["files"].update(site["files"])
+         for component, r in site["components"].items():
+            if component not in a[id]["components"].keys():
+               a[id]["components"][component] = dict(r)
+            else:
+               if r["st"] < a[id]["components"][component]["st"]:
+                  a[id]["components"][component]["st"] = r["st"]
+               if r["ed"] > a[id]["components"][component]["ed"]:
+                  a[id]["components"][component]["ed"] = r["ed"]
+      return a
 
 
    def get_site_data(self, files):
@@ -201,57 +395,208 @@ class EbasFtpDataImporter:
              }
          ,...
          }
-         id1:(df: st, ed, val_qc)
-         id2:(df: st, ed, val_qc)
+         id1:{ts, val, qc}
+         id2:{ts, val, qc}
       }
+      
+      returns {site_id: content_index}, so the database index can be updated without reloading the dump.
       """
-      compression = self.compression
       res = { "content_index" :{} }
       id_count = 0
+      site_id = list(files.keys())[0].split(".")[0]
       for file in files.keys():
+         timer = self.start_timer()
          try:
-            site_id = file.split(".")[0]
             ebas = xr.open_dataset(os.path.join(self.data_path, file))
-            for content in files[file]["contents"]:
-               res["content_index"][id_count] = {
-                     "st": content["st"],
-                     "ed": content["ed"],
-                     "component":content["component"],
-                     "matrix": content["matrix"],
-                     "res_code": content["res_code"],
-                     "unit": content["unit"],
-                     "var": content["var"],
-                     "stat": content["stat"],
-                     "file":file
-               }
-               # temp = pd.DataFrame()
-               st = ebas["time_bnds"].data[:,0]
-               ed = ebas["time_bnds"].data[:,1]
-               ts = np.array([st,ed]).T
-               
-               # get var value and qc, the values can be updated for several times, so additional dimensions may be applied
-               val = ebas[content["var"]].data
-               while len(val.shape)>1:
-                  val = val[-1,:]  
-               qc = ebas[content["var"]+"_qc"].data
-               while len(qc.shape)>1:
-                  qc = qc[-1,:]
-               
-               # filter value with qc values
-               val[np.isin(qc, bad_qc)]=None
-               
-               val = np.array([val]).T
-               
-               res[id_count] = {"ts": ts, "val": val}
-               id_count+=1
+            timer["opened"] = time.perf_counter()
+            content_index, data = self.read_contents(ebas, file, files[file]["contents"], id_count)
+            # a file failing partway leaves nothing in the dump
+            res["content_index"].update(content_index)
+            res.update(data)
+            id_count += len(content_index)
+            rows = sum(len(d["val"]) for d in data.values())
+            self.record_file("get_site_data", file, timer, rows)
             
          except Exception as e:
             print(e, file)  
+            self.report.record_failure("get_site_data", file, e)
+      
+      content_index = res["content_index"]
+      self.dump_site(site_id, res)
+      
+      return {site_id: content_index}
+   
+   def ingest_site(self, file_names):
+      """fused indexing and value extraction, each file of one site is opened only once
+      
+      Args:
+          file_names (list): raw data files of one site
+
+      Returns:
+          dict: {"infor": combined site information of these files, "db_index": {site_id: content_index}}
+      """
+      res = { "content_index" :{} }
+      infor = []
+      id_count = 0
+      site_id = file_names[0].split(".")[0]
+      for file in file_names:
+         timer = self.start_timer()
+         try:
+            ebas = xr.open_dataset(os.path.join(self.data_path, file))
+            timer["opened"] = time.perf_counter()
+            record = self.index_dataset(ebas, file)
+            content_index, data = self.read_contents(ebas, file, list(record.values())[0]["files"][file]["contents"], 
+                                                     id_count)
+            res["content_index"].update(content_index)
+            res.update(data)
+            id_count += len(content_index)
+            rows = sum(len(d["val"]) for d in data.values())
+            self.record_file("ingest_site", file, timer, rows)
+            
+         except Exception as e:
+            print(e, file)
+            self.report.record_failure("ingest_site", file, e)
+            record = self.error_record(file, e)
+         infor.append(record)
+      
+      content_index = res["content_index"]
+      self.dump_site(site_id, res)
       
-      if compression=="xz":   
-         with lzma.open(os.path.join("ebas_proj_dump_xz", f"{site_id}.xz"), "wb") as pickle_file:
-            pickle.dump(res, pickle_file)
-      elif compression is None:
-         with open(os.path.join("ebas_proj_dump", f"{site_id}"), "wb") as pickle_file:
-            pickle.dump(res, pickle_file)
-      
\ No newline at end of file
+      return {"infor": self.combine_infor(infor), "db_index": {site_id: content_index}}
+   
+   def read_contents(self, ebas, file, contents, first_id):
+      """this method reads the arrays of every content of one file
+      
+      Args:
+          ebas (xr.Dataset): the opened file
+          file (str): file name
+          contents (list): contents of the file in site_infor
+          first_id (int): content id of the first content
+
+      Returns:
+          (tuple): (content_index, {content id: {ts, val, qc}}) of this file
+      """
+      content_index = {}
+      data = {}
+      ts = self.get_ts(ebas)
+      for i, content in enumerate(contents):
+         content_index[first_id+i] = {
+               "st": content["st"],
+               "ed": content["ed"],
+               "component":content["component"],
+               "matrix": content["matrix"],
+               "res_code": content["res_code"],
+               "unit": content["unit"],
+               "var": content["var"],
+               "stat": content["stat"],
+               "file":file
+         }
+         data[first_id+i] = {"ts": ts, 
+                             "val": self.get_val(ebas, content["var"]),
+                             "qc": self.get_qc(ebas, content["var"])}
+      return content_index, data
+   
+   @staticmethod
+   def get_ts(ebas):
+      st = ebas["time_bnds"].data[:,0]
+      ed = ebas["time_bnds"].data[:,1]
+      return np.array([st,ed]).T
+   
+   @staticmethod
+   def get_val(ebas, var):
+      # get var value, the values can be updated for several times, so additional dimensions may be applied
+      # values are kept as they are, qc flags are applied when data is selected, see EbasDataBase.get_selected_db
+      val = ebas[var].data
+      while len(val.shape)>1:
+         val = val[-1,:]  
+      
+      return np.array([val]).T
+   
+   @staticmethod
+   def get_qc(ebas, var):
+      # qc flag of the last update, 0 if not flagged
+      qc = ebas[var+"_qc"].data
+      while len(qc.shape)>1:
+         qc = qc[-1,:]
+      
+      return np.nan_to_num(qc, nan=0).astype(np.uint16)
+   
+   def get_dump_path(self, site_id):
+      if self.dump_format=="columnar":
+         return os.path.join("ebas_proj_dump", f"{site_id}{SiteStore.suffix}")
+      elif self.compression=="xz":
+         return os.path.join("ebas_proj_dump_xz", f"{site_id}.xz")
+      else:
+         return os.path.join("ebas_proj_dump", f"{site_id}{utilities.get_codec(self.compression).suffix}")
+   
+   @staticmethod
+   def get_rollup_path(site_id):
+      return os.path.join("ebas_proj_rollup", f"{site_id}.rollup")
+   
+   def dump_rollups(self, site_id, res):
+      """this method aggregates every content of one site to the rollup frequencies, see EbasDataBase.aggregate.
+      rollups are written with the site dump, a site dumped without rollups has its old rollups removed.
+      
+      rollup file: {"version", "qc_policy", "freqs": {unit: {content id: partial aggregates}}}
+      """
+      path = self.get_rollup_path(site_id)
+      if len(self.rollups)==0:
+         if os.path.exists(path):
+            os.remove(path)
+         return
+      
+      freqs = {}
+      for freq in self.rollups:
+         unit = get_unit(freq)
+         freqs[unit] = {}
+         for cid in res["content_index"].keys():
+            val = res[cid]["val"][:,0].astype(np.float64)
+            val[np.isin(res[cid]["qc"], bad_qc)] = np.nan
+            freqs[unit][cid] = aggregate_intervals(res[cid]["ts"], val, 0, unit)
+      
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      utilities.dump_pickle({"version": 1, "qc_policy": "bad_qc", "freqs": freqs}, path, self.compression)
+   
+   def dump_site(self, site_id, res):
+      path = self.get_dump_path(site_id)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      start = time.perf_counter()
+      cpu = time.process_time()
+      self.dump_rollups(site_id, res)
+      if self.dump_format=="columnar":
+         SiteStore.write(path, res.pop("content_index"), res)
+      else:
+         utilities.dump_pickle(res, path, self.compression)
+      self.report.record_file("dump_site", path, 
+                              serialize_s=time.perf_counter() - start, 
+                              cpu_s=time.process_time() - cpu,
+                              bytes_written=os.path.getsize(path))
+
+
+# importer of the workers, built once by init_worker instead of pickling the importer for every task.
+# one per thread, init_worker runs in every thread of the thread backend.
+_worker = threading.local()
+
+def init_worker(data_path, compression, dump_format, detailed, use_value_index, rollups=(), fast_scan=True):
+   importer = EbasFtpDataImporter(data_path, compression, dump_format)
+   importer.detailed = detailed
+   importer.use_value_index = use_value_index
+   importer.rollups = rollups
+   importer.fast_scan = fast_scan
+   _worker.importer = importer
+
+def worker_get_indexing(file_name):
+   return _worker.importer.get_indexing(file_name)
+
+def worker_get_site_data(files):
+   return _worker.importer.get_site_data(files)
+
+def worker_ingest_site(file_names):
+   return _worker.importer.ingest_site(file_names)
+
+def run_worker(task):
+   # (worker function, argument) -> (result, records of the worker's report made by this task)
+   worker_func, args = task
+   report = utilities.RunReport()
+   _worker.importer.report = report
+   return worker_func(args), report.drain()
@@ -0,0 +1,84 @@
+import os
+import pickle
+import lzma
+
+__all__ = [
+   "IndexCache",
+]
+
+class IndexCache:
+   """
+   this class keeps the indexing result of every raw data file between runs:
+   1. each file is keyed on its name, and fingerprinted with size and modification time
+   2. only new or changed files need to be indexed again
+   3. files no longer in the data directory (e.g. archived) are dropped
+   """
+
+   version = 1
+
+   def __init__(self, path="site_infor_cache.xz", options=None):
+      self.path = path
+      # options used to produce the records, e.g. use_value_index, changing them invalidates the cache
+      self.options = options if options is not None else {}
+      self.files = {}
+      self.load()
+
+   def load(self):
+      if not os.path.exists(self.path):
+         return
+      with lzma.open(self.path, "rb") as pickle_file:
+         data = pickle.load(pickle_file)
+      if data.get("version") != IndexCache.version or data.get("options") != self.options:
+         print("index cache was built with different options, all files will be indexed again.")
+         return
+      self.files = data["files"]
+
+   def dump(self):
+      with lzma.open(self.path, "wb") as pickle_file:
+         pickle.dump({"version": IndexCache.version,
+                      "options": self.options,
+                      "files": self.files}, pickle_file)
+
+   @staticmethod
+   def fingerprint(data_path, file_name):
+      stat = os.stat(os.path.join(data_path, file_name))
+      return (stat.st_size, stat.st_mtime_ns)
+
+   def diff(self, data_path, file_names):
+      """this method compares files in the data directory with the cache
+
+      Args:
+          data_path (str): raw data directory
+          file_names (list): current raw data files
+
+      Returns:
+          (tuple): (stale, removed, fingerprints), stale files are new or changed
+      """
+      fingerprints = {f: IndexCache.fingerprint(data_path, f) for f in file_names}
+      stale = []
+      for f, fp in fingerprints.items():
+         if f not in self.files or self.files[f]["fingerprint"] != fp:
+            stale.append(f)
+      removed = list(self.files.keys() - fingerprints.keys())
+      return stale, removed, fingerprints
+
+   def update(self, records, fingerprints):
+      """this method stores indexing results, failed files are not cached so they are retried next time
+
+      Args:
+          records (dict): {file_name: {site_id: site}}, the output of get_indexing
+          fingerprints (dict): {file_name: (size, mtime)}
+      """
+      for f, record in records.items():
+         site = list(record.values())[0]
+         if "error" in site:
+            self.files.pop(f, None)
+         else:
+            self.files[f] = {"fingerprint": fingerprints[f], "record": record}
+
+   def drop(self, file_names):
+      for f in file_names:
+         self.files.pop(f, None)
+
+   def records(self):
+      return [self.files[f]["record"] for f in sorted(self.files.keys())]
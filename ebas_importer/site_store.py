@@ -0,0 +1,127 @@
+import os
+import pickle
+import struct
+import numpy as np
+
+__all__ = [
+   "SiteStore",
+]
+
+class SiteStore:
+   """
+   columnar, memory-mappable dump of one site:
+   1. a fixed preamble: magic bytes + header length
+   2. a small pickled header: content_index and the (offset, dtype, shape) of every array
+   3. one contiguous, aligned block per content id for each of its arrays, "ts", "val" and "qc"
+
+   opening a store only reads the header, array bytes are paged in when a content id is accessed.
+   """
+
+   magic = b"EBASCOL1"
+   suffix = ".ebas"
+   version = 1
+   alignment = 64
+
+   def __init__(self, path):
+      self.path = path
+      self._buffer = None
+
+      with open(path, "rb") as f:
+         preamble = f.read(16)
+         if preamble[:8] != SiteStore.magic:
+            raise ValueError(f"{path} is not a columnar site store.")
+         header_len = struct.unpack("<Q", preamble[8:16])[0]
+         # trailing alignment bytes after the pickle are ignored by pickle.loads
+         header = pickle.loads(f.read(header_len))
+
+      self.data_start = 16 + header_len
+      self.content_index = header["content_index"]
+      self.arrays = header["arrays"]
+      # bytes of all arrays, i.e. what can be paged in
+      self.nbytes = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize 
+                        for arrays in self.arrays.values() for (_, dtype, shape) in arrays.values())
+
+   @staticmethod
+   def is_store(path):
+      try:
+         with open(path, "rb") as f:
+            return f.read(8) == SiteStore.magic
+      except OSError:
+         return False
+
+   @staticmethod
+   def write(path, content_index, data):
+      """this method writes one site to a columnar store
+
+      Args:
+          path (str): output file
+          content_index (dict): {id: {st, ed, component, ...}}
+          data (dict): {id: {"ts": np.ndarray, "val": np.ndarray, "qc": np.ndarray}}
+      """
+      arrays = {}
+      blocks = []
+      offset = 0
+      for cid in data.keys():
+         arrays[cid] = {}
+         for name in data[cid].keys():
+            arr = np.ascontiguousarray(data[cid][name])
+            pad = -offset % SiteStore.alignment
+            offset += pad
+            arrays[cid][name] = (offset, arr.dtype.str, arr.shape)
+            blocks.append((pad, arr))
+            offset += arr.nbytes
+
+      header = pickle.dumps({"version": SiteStore.version,
+                             "content_index": content_index,
+                             "arrays": arrays})
+      # array offsets are relative to the end of the header, which is aligned as well
+      data_start = 16 + len(header)
+      header_pad = -data_start % SiteStore.alignment
+
+      # write to a temporary file first, readers may still map the old one
+      tmp_path = path + ".tmp"
+      with open(tmp_path, "wb") as f:
+         f.write(SiteStore.magic)
+         f.write(struct.pack("<Q", len(header) + header_pad))
+         f.write(header)
+         f.write(b"\0" * header_pad)
+         for pad, arr in blocks:
+            f.write(b"\0" * pad)
+            f.write(arr.tobytes())
+      os.replace(tmp_path, path)
+
+   def _map(self):
+      if self._buffer is None:
+         if os.path.getsize(self.path) > self.data_start:
+            self._buffer = np.memmap(self.path, dtype=np.uint8, mode="r", offset=self.data_start)
+         else:
+            self._buffer = np.empty(0, dtype=np.uint8)
+      return self._buffer
+
+   def _array(self, offset, dtype, shape):
+      dtype = np.dtype(dtype)
+      nbytes = int(np.prod(shape)) * dtype.itemsize
+      if nbytes == 0:
+         return np.empty(shape, dtype=dtype)
+      return self._map()[offset:offset + nbytes].view(dtype).reshape(shape)
+
+   def __getitem__(self, cid):
+      return {name: self._array(*spec) for name, spec in self.arrays[cid].items()}
+
+   def __contains__(self, cid):
+      return cid in self.arrays
+
+   def __iter__(self):
+      return iter(self.arrays)
+
+   def __len__(self):
+      return len(self.arrays)
+
+   def keys(self):
+      return self.arrays.keys()
+
+   def __getstate__(self):
+      # the memory map can not be pickled, it will be re-opened on first access
+      state = self.__dict__.copy()
+      state["_buffer"] = None
+      return state
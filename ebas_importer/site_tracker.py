@@ -0,0 +1,41 @@
+import os
+import json
+
+__all__ = [
+   "DirtySiteTracker",
+]
+
+class DirtySiteTracker:
+   """
+   this class records sites whose raw data files were downloaded or archived:
+   1. sites are derived from file names ("AM0001R.2008....nc" -> "AM0001R")
+   2. the dirty sites are kept on disk until their dumps are regenerated
+   """
+
+   def __init__(self, path="dirty_sites.json"):
+      self.path = path
+      self.dirty = set()
+      if os.path.exists(self.path):
+         with open(self.path, "r") as json_file:
+            self.dirty = set(json.load(json_file))
+
+   @staticmethod
+   def file2site(file_name):
+      return file_name.split(".")[0]
+
+   def mark_files(self, files):
+      for f in files:
+         if f != "archived":
+            self.dirty.add(DirtySiteTracker.file2site(f))
+      self.dump()
+
+   def clear(self, sites):
+      self.dirty -= set(sites)
+      self.dump()
+
+   def sites(self):
+      return sorted(self.dirty)
+
+   def dump(self):
+      with open(self.path, "w") as json_file:
+         json.dump(sorted(self.dirty), json_file)
@@ -1,52 +1,194 @@
 import os
 import pickle
+import numpy as np
+import pandas as pd
 
 bad_qc = [459,460,471,530,533,540,549,565,566,567,568,591,599,635,658,659,663,664,666,669,677,682,683,684,685,686,687,699,783,890,980,999]
 
 
+class ValueEncoder:
+   """
+   append-only dictionary encoding of one attribute:
+   1. values: code -> value, codes are positions in this list
+   2. codes: value -> code
+   new values are only appended, so codes already written to dumps and to the database index never change.
+   code -1 stands for unknown values, it is decoded to None.
+   """
+
+   def __init__(self, values=()):
+      self.values = []
+      self.codes = {}
+      self.array = None
+      self.extend(values)
+
+   def add(self, value):
+      # code of value, appended if it is new
+      code = self.codes.get(value)
+      if code is None:
+         code = len(self.values)
+         self.values.append(value)
+         self.codes[value] = code
+         self.array = None
+      return code
+
+   def extend(self, values):
+      return [self.add(v) for v in values]
+
+   def code(self, value, add=False):
+      if add:
+         return self.add(value)
+      return self.codes.get(value, -1)
+
+   def encode(self, values, add=False):
+      """this method encodes an array of values, every distinct value is looked up once
+
+      Args:
+          values (array-like): values to be encoded
+          add (bool, optional): append unknown values, otherwise they are encoded as -1. Defaults to False.
+
+      Returns:
+          np.ndarray: int32 codes, same shape as values
+      """
+      values = np.asarray(values, dtype=object)
+      labels, uniques = pd.factorize(values.ravel())
+      # label -1 (missing values) takes the last entry of the lookup table
+      lookup = [self.code(v, add) for v in uniques]
+      lookup.append(self.code(None, add) if (labels < 0).any() else -1)
+      return np.asarray(lookup, dtype=np.int32)[labels].reshape(values.shape)
+
+   def decode(self, codes):
+      """this method decodes an array of codes with one take
+
+      Returns:
+          np.ndarray: object array of values, None for code -1
+      """
+      if self.array is None:
+         # one trailing None, taken by code -1
+         self.array = np.empty(len(self.values) + 1, dtype=object)
+         self.array[:-1] = self.values
+      return self.array.take(np.asarray(codes, dtype=np.int64))
+
+   def __getitem__(self, value):
+      # value -> code, as the former value index dicts
+      return self.codes[value]
+
+   def __contains__(self, value):
+      return value in self.codes
+
+   def __len__(self):
+      return len(self.values)
+
+   @staticmethod
+   def from_legacy(data):
+      # former mixed dict {code: value, value: code}, only pairs pointing at each other are kept
+      codes = sorted(k for k, v in data.items()
+                     if isinstance(k, int) and not isinstance(k, bool) and data.get(v) == k)
+      if codes != list(range(len(codes))):
+         print("value index has colliding codes, some values are lost.")
+      encoder = ValueEncoder()
+      for c in codes:
+         if c != len(encoder.values):
+            break
+         encoder.add(data[c])
+      return encoder
+
+
 class ValueIndex:
-   def __init__(self):
-      self.meta={"ebas":0, "no_ebas":1, 0:"ebas", 1:"no_ebas"}
-      self.matrix={}
-      self.unit={}
-      self.res_code={}
-      self.component={}
-      self.site={}
+   """
+   codes of attributes stored as integers in site information, dumps and the database index.
+   codes are persisted to path, with a version number increased whenever values are appended.
+   """
+
+   attrs = ["matrix", "unit", "res_code", "component", "site"]
+   # attributes of content records which are stored as codes
+   content_attrs = ["site", "matrix", "component", "unit", "res_code", "meta"]
+   format = 2
+
+   def __init__(self, path="value_index"):
+      self.path = path
+      self.version = 0
+      self.meta = ValueEncoder(["ebas", "no_ebas"])
+      for attr in ValueIndex.attrs:
+         setattr(self, attr, ValueEncoder())
       self.load_index()
 
    def load_index(self):
-      if os.path.exists("value_index"):
-         with open("value_index","rb") as pickle_file:
-            data = pickle.load(pickle_file)
-         
-         self.matrix = data["matrix"]         
-         self.unit = data["unit"]         
-         self.res_code = data["res_code"]         
-         self.component = data["component"]         
-         self.site = data["site"]         
-         
-   def convert_list(self, attr_name, vals):
-      res = []
-      for v in vals:
-         temp = getattr(self, attr_name)
-         res.append(temp[v])
-         
-      return res
-   
-   def update_index(self, attr_name, vals):
-      temp = {}
-      for index, val in enumerate(vals):
-         temp[index]= val
-         temp[val]= index
-      
-      setattr(self,attr_name, temp)
-      
+      if os.path.exists(self.path):
+         data = self.read_index()
+
+         if data.get("format") == ValueIndex.format:
+            self.version = data["version"]
+            for attr in ValueIndex.attrs:
+               setattr(self, attr, ValueEncoder(data["attrs"].get(attr, [])))
+         else:
+            # value index written before encoders were introduced
+            for attr in ValueIndex.attrs:
+               setattr(self, attr, ValueEncoder.from_legacy(data.get(attr, {})))
+
+   def read_index(self):
+      with open(self.path,"rb") as pickle_file:
+         return pickle.load(pickle_file)
+
+   def refresh(self):
+      # values appended by another process since this index was loaded are loaded, before appending to it
+      if not os.path.exists(self.path):
+         return
+      data = self.read_index()
+      if data.get("format") == ValueIndex.format and data["version"] > self.version:
+         self.load_index()
+
+   def dump_index(self):
       data = {
-         "matrix":self.matrix,
-         "unit":self.unit,
-         "res_code":self.res_code,
-         "component":self.component,
-         "site":self.site,
+         "format": ValueIndex.format,
+         "version": self.version,
+         "attrs": {attr: getattr(self, attr).values for attr in ValueIndex.attrs},
       }
-      with open("value_index","wb") as pickle_file:
-         pickle.dump(data, pickle_file)
\ No newline at end of file
+      with open(self.path,"wb") as pickle_file:
+         pickle.dump(data, pickle_file)
+
+   def encode(self, attr_name, vals):
+      # values -> codes, -1 for unknown values
+      return getattr(self, attr_name).encode(vals)
+
+   def decode(self, attr_name, codes):
+      # codes -> values
+      return getattr(self, attr_name).decode(codes)
+
+   def get_values(self, attr_name):
+      # values ordered by their index number
+      return list(getattr(self, attr_name).values)
+
+   def update_index(self, attr_name, vals):
+      # new values are appended, existing codes are kept
+      encoder = getattr(self, attr_name)
+      if any(v not in encoder for v in vals):
+         self.refresh()
+         encoder = getattr(self, attr_name)
+      n = len(encoder)
+      encoder.extend(vals)
+      if len(encoder) > n:
+         self.version += 1
+         self.dump_index()
+
+   def encode_content(self, content, add=False):
+      """this method replaces the values of a content record by their codes, in place.
+      values already encoded are kept.
+
+      Args:
+          content (dict): content record, see get_indexing, or a content index entry
+          add (bool, optional): append unknown values with update_index, otherwise they are kept as values. 
+             Defaults to False.
+
+      Returns:
+          dict: content
+      """
+      for attr in ValueIndex.content_attrs:
+         if attr not in content or isinstance(content[attr], (int, np.integer)):
+            continue
+         encoder = getattr(self, attr)
+         if add and content[attr] not in encoder:
+            self.update_index(attr, [content[attr]])
+            encoder = getattr(self, attr)
+         if content[attr] in encoder:
+            content[attr] = encoder[content[attr]]
+      return content
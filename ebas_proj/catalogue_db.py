@@ -0,0 +1,233 @@
+import os
+import json
+import sqlite3
+import numpy as np
+
+__all__ = [
+   "SqliteCatalogue",
+]
+
+class SqliteCatalogue:
+   """
+   site information and database index kept in SQLite instead of one pickle loaded at start:
+   1. sites: one row per site, geographical information
+   2. files: raw data files of each site
+   3. contents: one row per content record (site, content id), indexed on component, matrix, country and time
+   4. attrs: file attributes as json, only read when a site is fetched
+   sites and their content index are fetched lazily, see sites and index.
+   """
+
+   suffix = ".sqlite"
+   site_columns = ["id", "name", "country", "land_use", "station_setting", "alt", "lat", "lon", "file_num"]
+   content_columns = ["file", "var", "component", "matrix", "stat", "unit", "res_code", "st", "ed"]
+
+   def __init__(self, path):
+      if not os.path.exists(path):
+         raise FileNotFoundError(f"{path} does not exist, create it with EbasDataBase.export_catalogue.")
+      self.path = path
+      self.conn = sqlite3.connect(path, check_same_thread=False)
+      self.sites = CatalogueMapping(self, self.get_site)
+      self.index = CatalogueMapping(self, self.get_index)
+
+   @staticmethod
+   def to_ns(t):
+      return None if t is None else int(np.datetime64(t, "ns").astype(np.int64))
+
+   @staticmethod
+   def from_ns(t):
+      return None if t is None else np.datetime64(int(t), "ns")
+
+   @staticmethod
+   def build(path, site_infor, db_index):
+      """this method writes site information and database index to a new SQLite catalogue
+
+      Args:
+          path (str): catalogue file, replaced if it exists
+          site_infor (dict): site information, see EbasData.get_site_infor
+          db_index (dict): {site_id: content_index}, see EbasDataBase.init_db
+      """
+      if os.path.exists(path):
+         os.remove(path)
+      conn = sqlite3.connect(path)
+      conn.executescript("""
+         CREATE TABLE sites (site TEXT PRIMARY KEY, ord INTEGER, id TEXT, name TEXT, country TEXT, land_use TEXT,
+                             station_setting TEXT, alt REAL, lat REAL, lon REAL, file_num INTEGER);
+         CREATE TABLE files (file TEXT PRIMARY KEY, site TEXT, contents TEXT);
+         CREATE TABLE contents (site TEXT, cid INTEGER, file TEXT, var TEXT, component, matrix, stat TEXT,
+                                unit, res_code, st INTEGER, ed INTEGER, PRIMARY KEY (site, cid));
+         CREATE TABLE attrs (file TEXT, key TEXT, value TEXT);
+      """)
+
+      for ord, (site_id, site) in enumerate(site_infor.items()):
+         # error records of files that could not be indexed have no files
+         if "files" not in site:
+            continue
+         conn.execute("INSERT INTO sites VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                      [site_id, ord] + [site.get(k) for k in SqliteCatalogue.site_columns])
+         for file, infor in site["files"].items():
+            contents = [dict(c, st=SqliteCatalogue.to_ns(c["st"]), ed=SqliteCatalogue.to_ns(c["ed"]))
+                        for c in infor["contents"]]
+            conn.execute("INSERT INTO files VALUES (?,?,?)", (file, site_id, json.dumps(contents, default=str)))
+            conn.executemany("INSERT INTO attrs VALUES (?,?,?)",
+                             [(file, k, json.dumps(v, default=str)) for k, v in infor.get("attrs", {}).items()])
+
+      for site_id, content_index in db_index.items():
+         conn.executemany("INSERT INTO contents VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                          [(site_id, cid, c["file"], c["var"], c["component"], c["matrix"], c["stat"],
+                            c["unit"], c["res_code"], SqliteCatalogue.to_ns(c["st"]), SqliteCatalogue.to_ns(c["ed"]))
+                           for cid, c in content_index.items()])
+
+      conn.executescript("""
+         CREATE INDEX contents_component ON contents (component);
+         CREATE INDEX contents_matrix ON contents (matrix);
+         CREATE INDEX contents_st ON contents (st);
+         CREATE INDEX contents_ed ON contents (ed);
+         CREATE INDEX sites_country ON sites (country);
+         CREATE INDEX files_site ON files (site);
+         CREATE INDEX attrs_file ON attrs (file);
+      """)
+      conn.commit()
+      conn.close()
+
+   @staticmethod
+   def condition_sql(column, values):
+      # "column IN (...)", None values have to be matched with IS NULL.
+      # values are bound as one JSON array, any number of them stays within SQLite's limit of bound variables
+      values = [v.item() if isinstance(v, np.generic) else v for v in values]
+      sql = []
+      args = []
+      not_null = [v for v in values if v is not None]
+      if len(not_null) > 0:
+         sql.append(f"{column} IN (SELECT value FROM json_each(?))")
+         args.append(json.dumps(not_null))
+      if len(not_null) < len(values):
+         sql.append(f"{column} IS NULL")
+      if len(sql) == 0:
+         return "0", []
+      return "(" + " OR ".join(sql) + ")", args
+
+   def select(self, condition):
+      """this method selects content records matching all conditions with one query
+
+      Args:
+          condition (dict): {attr: [values]}, "st"/"ed" as np.datetime64, content attributes already value indexed
+
+      Returns:
+          dict: {site_id: [content id, ...]}, ordered as site_infor
+      """
+      where = []
+      args = []
+      for k in ["id", "name", "land_use", "station_setting", "country"]:
+         if k in condition.keys():
+            sql, values = SqliteCatalogue.condition_sql("s." + k, condition[k])
+            where.append(sql)
+            args += values
+      for k in ["component", "matrix", "stat"]:
+         if k in condition.keys():
+            sql, values = SqliteCatalogue.condition_sql("c." + k, condition[k])
+            where.append(sql)
+            args += values
+      # records overlapping with [st, ed]
+      if "st" in condition.keys():
+         where.append("c.ed >= ?")
+         args.append(SqliteCatalogue.to_ns(condition["st"]))
+      if "ed" in condition.keys():
+         where.append("c.st <= ?")
+         args.append(SqliteCatalogue.to_ns(condition["ed"]))
+
+      sql = "SELECT c.site, c.cid FROM contents c JOIN sites s ON s.site = c.site"
+      if len(where) > 0:
+         sql += " WHERE " + " AND ".join(where)
+      sql += " ORDER BY s.ord, c.cid"
+
+      res = {}
+      for site_id, cid in self.conn.execute(sql, args):
+         res.setdefault(site_id, []).append(cid)
+      return res
+
+   def summary_attr(self, attr, sites=None):
+      # distinct values of a content attribute, for all sites or the given ones
+      if attr in ["st", "ed"]:
+         func = "MIN" if attr == "st" else "MAX"
+         sql = f"SELECT {func}({attr}) FROM contents"
+      else:
+         sql = f"SELECT DISTINCT {attr} FROM contents"
+      args = []
+      if sites is not None:
+         sql_in, args = SqliteCatalogue.condition_sql("site", sites)
+         sql += " WHERE " + sql_in
+      res = [r[0] for r in self.conn.execute(sql, args)]
+      if attr in ["st", "ed"]:
+         return SqliteCatalogue.from_ns(res[0])
+      return sorted(res, key=lambda x: (x is None, x))
+
+   def site_rows(self, sites=None):
+      sql = f"SELECT {', '.join(SqliteCatalogue.site_columns)} FROM sites"
+      args = []
+      if sites is not None:
+         sql_in, args = SqliteCatalogue.condition_sql("site", sites)
+         sql += " WHERE " + sql_in
+      sql += " ORDER BY ord"
+      return [dict(zip(SqliteCatalogue.site_columns, r)) for r in self.conn.execute(sql, args)]
+
+   def get_site(self, site_id):
+      # one site as in site_infor, with files, contents and attrs
+      rows = self.site_rows([site_id])
+      if len(rows) == 0:
+         raise KeyError(site_id)
+      site = rows[0]
+      site["files"] = {}
+      site["components"] = {}
+      for file, contents in self.conn.execute("SELECT file, contents FROM files WHERE site = ?", (site_id,)):
+         contents = json.loads(contents)
+         for c in contents:
+            c["st"] = SqliteCatalogue.from_ns(c["st"])
+            c["ed"] = SqliteCatalogue.from_ns(c["ed"])
+            component = site["components"].setdefault(c["component"], {"st": c["st"], "ed": c["ed"]})
+            component["st"] = min(component["st"], c["st"])
+            component["ed"] = max(component["ed"], c["ed"])
+         attrs = {k: json.loads(v) for k, v in
+                  self.conn.execute("SELECT key, value FROM attrs WHERE file = ?", (file,))}
+         site["files"][file] = {"contents": contents, "attrs": attrs}
+      return site
+
+   def get_index(self, site_id):
+      # content index of one site, as in the site dumps
+      res = {}
+      sql = f"SELECT cid, {', '.join(SqliteCatalogue.content_columns)} FROM contents WHERE site = ? ORDER BY cid"
+      for row in self.conn.execute(sql, (site_id,)):
+         content = dict(zip(SqliteCatalogue.content_columns, row[1:]))
+         content["st"] = SqliteCatalogue.from_ns(content["st"])
+         content["ed"] = SqliteCatalogue.from_ns(content["ed"])
+         res[row[0]] = content
+      return res
+
+
+class CatalogueMapping:
+   """read-only mapping fetching one site at a time from the catalogue with fetch(site_id), fetched sites are kept."""
+
+   def __init__(self, catalogue, fetch):
+      self.catalogue = catalogue
+      self.fetch = fetch
+      self.fetched = {}
+
+   def keys(self):
+      return [r[0] for r in self.catalogue.conn.execute("SELECT site FROM sites ORDER BY ord")]
+
+   def __getitem__(self, site_id):
+      if site_id not in self.fetched:
+         self.fetched[site_id] = self.fetch(site_id)
+      return self.fetched[site_id]
+
+   def __contains__(self, site_id):
+      return self.catalogue.conn.execute("SELECT 1 FROM sites WHERE site = ?", (site_id,)).fetchone() is not None
+
+   def __iter__(self):
+      return iter(self.keys())
+
+   def __len__(self):
+      return self.catalogue.conn.execute("SELECT COUNT(*) FROM sites").fetchone()[0]
+
+   def items(self):
+      return ((k, self[k]) for k in self.keys())
+
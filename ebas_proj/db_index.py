@@ -0,0 +1,260 @@
+import numpy as np
+import utilities
+
+try:
+   from scipy.spatial import cKDTree
+except ImportError:
+   cKDTree = None
+
+__all__ = [
+   "AttributeIndex",
+   "IntervalIndex",
+   "SpatialIndex",
+]
+
+class AttributeIndex:
+   """
+   inverted index of the database, built once when the database is initialized:
+   1. site attributes: value -> set of site ids
+   2. content attributes: value -> set of (site id, content id)
+   a query is then answered with set unions (values of one attribute) and intersections (different attributes).
+   """
+
+   site_keys = ["id", "name", "land_use", "station_setting", "country"]
+   content_keys = ["component", "matrix", "stat"]
+
+   def __init__(self, site_infor, db_index):
+      self.site_order = {}
+      self.sites = {k: {} for k in AttributeIndex.site_keys}
+      self.contents = {k: {} for k in AttributeIndex.content_keys}
+      self.site_contents = {}
+
+      for site_id in site_infor.keys():
+         # sites without data files can not be selected
+         if site_id not in db_index.keys():
+            continue
+         self.site_order[site_id] = len(self.site_order)
+         for k in AttributeIndex.site_keys:
+            self.sites[k].setdefault(site_infor[site_id].get(k), set()).add(site_id)
+
+         self.site_contents[site_id] = set()
+         for cid, content in db_index[site_id].items():
+            self.site_contents[site_id].add((site_id, cid))
+            for k in AttributeIndex.content_keys:
+               self.contents[k].setdefault(content[k], set()).add((site_id, cid))
+
+   @staticmethod
+   def lookup(postings, values):
+      res = set()
+      for v in values:
+         res |= postings.get(v, set())
+      return res
+
+   def select_sites(self, condition):
+      res = None
+      for k in AttributeIndex.site_keys:
+         if k in condition.keys():
+            sites = AttributeIndex.lookup(self.sites[k], condition[k])
+            res = sites if res is None else res & sites
+      if res is None:
+         res = set(self.site_order.keys())
+      return res
+
+   def select_contents(self, condition, sites):
+      res = None
+      # start from the smallest posting set, the intersection can only get smaller
+      postings = [AttributeIndex.lookup(self.contents[k], condition[k])
+                  for k in AttributeIndex.content_keys if k in condition.keys()]
+      postings.sort(key=len)
+      for p in postings:
+         res = p if res is None else res & p
+      if res is None:
+         res = set()
+         for site_id in sites:
+            res |= self.site_contents[site_id]
+      return res
+
+   def select(self, condition):
+      """this method selects contents matching all conditions
+
+      Args:
+          condition (dict): {attr: [values]}, content attributes must be already converted with value index
+
+      Returns:
+          dict: {site_id: [content id, ...]}, ordered as site_infor
+      """
+      sites = self.select_sites(condition)
+      res = {}
+      for site_id, cid in self.select_contents(condition, sites):
+         if site_id in sites:
+            res.setdefault(site_id, []).append(cid)
+
+      return {site_id: sorted(res[site_id]) for site_id in sorted(res.keys(), key=self.site_order.get)}
+
+
+class IntervalIndex:
+   """
+   time index of all content records, a record overlaps [st, ed] if record["ed"] >= st and record["st"] <= ed:
+   1. records sorted by "st": the ones starting before ed are a prefix found by binary search
+   2. records sorted by "ed": the ones ending after st are a suffix found by binary search
+   the smaller candidate range is then checked against the other bound with one vectorized comparison.
+   """
+
+   def __init__(self, db_index):
+      keys = []
+      st = []
+      ed = []
+      for site_id in db_index.keys():
+         for cid, content in db_index[site_id].items():
+            keys.append((site_id, cid))
+            st.append(content["st"])
+            ed.append(content["ed"])
+      
+      self.keys = np.empty(len(keys), dtype=object)
+      self.keys[:] = keys
+      st = np.array(st, dtype="datetime64[ns]")
+      ed = np.array(ed, dtype="datetime64[ns]")
+      
+      self.by_st = np.argsort(st, kind="stable")
+      self.by_ed = np.argsort(ed, kind="stable")
+      self.st = st
+      self.ed = ed
+      self.st_sorted = st[self.by_st]
+      self.ed_sorted = ed[self.by_ed]
+
+   def query(self, st=None, ed=None):
+      """this method finds records overlapping with [st, ed]
+
+      Args:
+          st (np.datetime64, optional): start of the range, open if None
+          ed (np.datetime64, optional): end of the range, open if None
+
+      Returns:
+          set: {(site_id, content id), ...}
+      """
+      # records starting no later than ed
+      if ed is not None:
+         hi = np.searchsorted(self.st_sorted, np.datetime64(ed, "ns"), side="right")
+         starting = self.by_st[:hi]
+      else:
+         starting = self.by_st
+      # records ending no earlier than st
+      if st is not None:
+         lo = np.searchsorted(self.ed_sorted, np.datetime64(st, "ns"), side="left")
+         ending = self.by_ed[lo:]
+      else:
+         ending = self.by_ed
+      
+      if len(starting) <= len(ending):
+         index = starting if st is None else starting[self.ed[starting] >= np.datetime64(st, "ns")]
+      else:
+         index = ending if ed is None else ending[self.st[ending] <= np.datetime64(ed, "ns")]
+      
+      return set(self.keys[index].tolist())
+
+
+class SpatialIndex:
+   """
+   location index of all sites, lat/lon/alt are parsed to floats (e.g. "2080.0 m"), missing ones are NaN:
+   1. sites are points on the unit sphere, a radius on earth is a chord length on the sphere
+   2. a KD-tree of the points answers radius queries if scipy is installed, otherwise all points are compared
+   3. bbox and altitude ranges are vectorized comparisons
+   selectors in a select_db condition:
+      "bbox": {"lat": (min, max), "lon": (min, max)}, lon min > max crosses the antimeridian
+      "radius": {"lat": lat, "lon": lon, "km": km}
+      "alt": (min, max)
+      "nearest": {"lat": lat, "lon": lon, "k": k}, the k sites nearest to the point among the ones matching all other conditions
+   """
+
+   keys = ["bbox", "radius", "alt", "nearest"]
+   earth_radius = 6371.0088
+
+   def __init__(self, site_infor, sites):
+      self.site_ids = np.empty(len(sites), dtype=object)
+      self.site_ids[:] = list(sites)
+      self.lat = np.array([SpatialIndex.to_float(site_infor[k].get("lat")) for k in sites], dtype=np.float64)
+      self.lon = np.array([SpatialIndex.to_float(site_infor[k].get("lon")) for k in sites], dtype=np.float64)
+      self.alt = np.array([SpatialIndex.to_float(site_infor[k].get("alt")) for k in sites], dtype=np.float64)
+      self.position = {site_id: i for i, site_id in enumerate(self.site_ids)}
+
+      # sites without coordinates can not be located
+      self.located = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lon))
+      self.xyz = SpatialIndex.to_xyz(self.lat[self.located], self.lon[self.located])
+      self.tree = cKDTree(self.xyz) if cKDTree is not None and len(self.located)>0 else None
+
+   @staticmethod
+   def to_float(value):
+      value = utilities.to_float(value)
+      return np.nan if value is None else value
+
+   @staticmethod
+   def to_xyz(lat, lon):
+      lat = np.radians(np.asarray(lat, dtype=np.float64))
+      lon = np.radians(np.asarray(lon, dtype=np.float64))
+      return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1).reshape(-1, 3)
+
+   @staticmethod
+   def chord(km):
+      return 2 * np.sin(km / SpatialIndex.earth_radius / 2)
+
+   def bbox(self, lat=(-90, 90), lon=(-180, 180)):
+      inside = (self.lat >= lat[0]) & (self.lat <= lat[1])
+      if lon[0] <= lon[1]:
+         inside &= (self.lon >= lon[0]) & (self.lon <= lon[1])
+      else:
+         inside &= (self.lon >= lon[0]) | (self.lon <= lon[1])
+      return set(self.site_ids[inside].tolist())
+
+   def altitude(self, alt):
+      return set(self.site_ids[(self.alt >= alt[0]) & (self.alt <= alt[1])].tolist())
+
+   def radius(self, lat, lon, km):
+      point = SpatialIndex.to_xyz(lat, lon)[0]
+      if self.tree is not None:
+         index = self.tree.query_ball_point(point, SpatialIndex.chord(km))
+      else:
+         index = np.flatnonzero(np.linalg.norm(self.xyz - point, axis=1) <= SpatialIndex.chord(km))
+      return set(self.site_ids[self.located[index]].tolist())
+
+   def distance(self, lat, lon, sites):
+      # great circle distance in km from the point to every site, NaN if not located
+      index = np.array([self.position[s] for s in sites], dtype=np.int64)
+      chord = np.linalg.norm(SpatialIndex.to_xyz(self.lat[index], self.lon[index]) - SpatialIndex.to_xyz(lat, lon), axis=1)
+      return 2 * np.arcsin(np.minimum(chord / 2, 1)) * SpatialIndex.earth_radius
+
+   def nearest(self, lat, lon, k, sites=None):
+      # the k located sites nearest to the point, nearest first
+      sites = [s for s in (self.site_ids if sites is None else sites) if s in self.position]
+      if len(sites)==0:
+         return []
+      d = self.distance(lat, lon, sites)
+      order = [i for i in np.argsort(d, kind="stable") if not np.isnan(d[i])]
+      return [sites[i] for i in order[:k]]
+
+   def select(self, res, condition):
+      """this method applies the spatial selectors of a condition to a selection
+
+      Args:
+          res (dict): {site_id: [content id, ...]}
+          condition (dict): see the class description
+
+      Returns:
+          dict: res without the sites not matching
+      """
+      sites = None
+      if "bbox" in condition.keys():
+         sites = self.bbox(**condition["bbox"])
+      if "radius" in condition.keys():
+         found = self.radius(**condition["radius"])
+         sites = found if sites is None else sites & found
+      if "alt" in condition.keys():
+         found = self.altitude(condition["alt"])
+         sites = found if sites is None else sites & found
+      if sites is not None:
+         res = {site_id: cids for site_id, cids in res.items() if site_id in sites}
+      
+      if "nearest" in condition.keys():
+         p = condition["nearest"]
+         sites = set(self.nearest(p["lat"], p["lon"], p["k"], list(res.keys())))
+         res = {site_id: cids for site_id, cids in res.items() if site_id in sites}
+      return res
@@ -0,0 +1,107 @@
+import os
+import pickle
+
+__all__ = [
+   "SummaryCache",
+]
+
+class SummaryCache:
+   """
+   database summary kept next to the database index:
+   1. every site is summarized once, in a single pass over its files and contents
+   2. site summaries are saved with the fingerprint of the site information file, and reloaded while it is unchanged
+   3. the summary of any set of sites is merged from their site summaries, without scanning site information again
+   """
+
+   version = 1
+   site_keys = ["country", "land_use", "station_setting", "name", "id", "lat", "lon", "alt"]
+
+   def __init__(self, path="ebas_db_summary.dump"):
+      self.path = path
+      self.fingerprint = None
+      self.sites = {}
+
+   @staticmethod
+   def get_fingerprint(site_infor_path):
+      stat = os.stat(site_infor_path)
+      return (os.path.abspath(site_infor_path), stat.st_size, stat.st_mtime_ns)
+
+   def load(self, site_infor_path):
+      """this method loads saved site summaries if they were made from the current site information file
+
+      Returns:
+          bool: True if loaded
+      """
+      self.fingerprint = SummaryCache.get_fingerprint(site_infor_path)
+      if not os.path.exists(self.path):
+         return False
+      with open(self.path, "rb") as pickle_file:
+         data = pickle.load(pickle_file)
+      if data.get("version") != SummaryCache.version or data.get("fingerprint") != self.fingerprint:
+         return False
+      self.sites = data["sites"]
+      return True
+
+   def dump(self):
+      with open(self.path, "wb") as pickle_file:
+         pickle.dump({"version": SummaryCache.version,
+                      "fingerprint": self.fingerprint,
+                      "sites": self.sites}, pickle_file)
+
+   def build(self, site_infor):
+      self.sites = {}
+      for site_id, site in site_infor.items():
+         # error records of files that could not be indexed have no files
+         if "files" in site:
+            self.sites[site_id] = SummaryCache.summarize_site(site)
+
+   @staticmethod
+   def summarize_site(site):
+      components = set()
+      matrix = set()
+      st = None
+      ed = None
+      for f in site["files"].values():
+         for c in f["contents"]:
+            components.add(c["component"])
+            matrix.add(c["matrix"])
+            if c["st"] is not None and (st is None or c["st"] < st):
+               st = c["st"]
+            if c["ed"] is not None and (ed is None or c["ed"] > ed):
+               ed = c["ed"]
+      return {
+         "site": {k: site.get(k) for k in SummaryCache.site_keys},
+         "components": components,
+         "matrix": matrix,
+         "st": st,
+         "ed": ed,
+      }
+
+   def merge(self, site_ids=None):
+      """this method merges site summaries
+
+      Args:
+          site_ids (iterable, optional): sites to be merged, all sites if None. Defaults to None.
+
+      Returns:
+          dict: {"site", "country", "components", "matrix", "st", "ed"}, components and matrix as sorted value index
+      """
+      if site_ids is None:
+         site_ids = self.sites.keys()
+      res = {"site": [], "country": set(), "components": set(), "matrix": set(), "st": None, "ed": None}
+      for site_id in site_ids:
+         s = self.sites.get(site_id)
+         if s is None:
+            continue
+         res["site"].append(dict(s["site"]))
+         res["country"].add(s["site"]["country"])
+         res["components"] |= s["components"]
+         res["matrix"] |= s["matrix"]
+         if s["st"] is not None and (res["st"] is None or s["st"] < res["st"]):
+            res["st"] = s["st"]
+         if s["ed"] is not None and (res["ed"] is None or s["ed"] > res["ed"]):
+            res["ed"] = s["ed"]
+      res["country"] = list(res["country"])
+      res["components"] = sorted(res["components"], key=lambda x: (x is None, x))
+      res["matrix"] = sorted(res["matrix"], key=lambda x: (x is None, x))
+      return res
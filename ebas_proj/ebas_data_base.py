@@ -10,31 +10,60 @@ import json
 import time
 
 from ebas_importer.value_index import *
+from ebas_importer.site_store import SiteStore
+from ebas_importer.aggregation import aggregate_intervals, merge_partials, finalize_partials, get_unit
 from .ebas_data_file import EbasFiles
+from .db_index import AttributeIndex, IntervalIndex, SpatialIndex
+from .site_cache import SiteCache
+from .catalogue_db import SqliteCatalogue
+from .db_summary import SummaryCache
 
 class EbasDataBase:
-   def __init__(self, site_infor_path, data_path ="ebas_proj_dump", lazy_loading=True, compression='xz'):
+   def __init__(self, site_infor_path, data_path ="ebas_proj_dump", lazy_loading=True, compression='xz', dump_format="pickle", cache_bytes=None, 
+                rollup_path="ebas_proj_rollup", logger=None):
       self.site_infor_path = site_infor_path
       self.data_path = data_path
       self.lazy_loading = lazy_loading
       self.compression = compression
+      self.dump_format = dump_format
       
-      self.db={}
+      # loaded site data, least recently used sites are evicted beyond cache_bytes
+      self.db=SiteCache(max_bytes=cache_bytes)
+      # dump and decoded bytes of the sites loaded so far, the size of a site is estimated before loading it
+      self.loaded_bytes = {"dump": 0, "data": 0}
       self.db_index={}
       self.selected = {}
+      self.time_selector = {}
+      # aggregates written at import, see aggregate, {site_id: (size and mtime of the file, rollups)}
+      self.rollup_path = rollup_path
+      self.rollups = {}
       
       self.summary = {}
       self.selected_summary = {}
+      # site summaries, kept next to the database index
+      self.summary_cache = SummaryCache()
       
       self.value_index = ValueIndex()
+      # stage and per file timings and cache hits, logger: logging.Logger or callable, see utilities.RunReport
+      self.report = utilities.RunReport(logger)
+      # site information and index are answered by SQL if site_infor_path is a ".sqlite" catalogue
+      self.catalogue = None
       
       self.init_db()
       
    
+   @utilities.timed_stage()
    def init_db(self):
       print("init database...")
       print(f"\t{len(os.listdir(self.data_path))} files in the data path {self.data_path}.")
-      print(f"\t{self.compression} compression method is used in for the data file.")
+      if self.dump_format == "columnar":
+         print("\tcolumnar data files are used, they will be memory mapped.")
+      else:
+         print(f"\t{self.compression} compression method is used in for the data file.")
+      
+      if self.site_infor_path.endswith(SqliteCatalogue.suffix):
+         self.init_catalogue()
+         return
       
       print("load site information...")
       site_infor = EbasFiles.load_file(file={"name":"site_infor",
@@ -47,68 +76,140 @@ class EbasDataBase:
       else:
          print("load all ebas data files...")
          
-      files = EbasFiles.get_load_files(data_path=self.data_path, 
-                                       selected="all", 
-                                       loaded_db=[], 
-                                       full_db=list(self.site_infor.keys()), 
-                                       compression=self.compression,
-                                       lazy_loading=self.lazy_loading)
-      
       if self.lazy_loading and os.path.exists("ebas_db_index.dump"):
          db_index = EbasFiles.load_file(file={"name":"db_index",
                                        "path":"ebas_db_index.dump"})
          self.db_index = db_index["data"]
+         stale = self.update_stale_index()
       else:
+         files = EbasFiles.get_load_files(data_path=self.data_path, 
+                                          selected="all", 
+                                          loaded_db=[], 
+                                          full_db=list(self.site_infor.keys()), 
+                                          compression=self.compression,
+                                          lazy_loading=self.lazy_loading,
+                                          dump_format=self.dump_format)
          db_index, db = EbasFiles.load_files(files=files, 
-                                             lazy_loading=self.lazy_loading)
-         self.db_index.update(db_index)
+                                             lazy_loading=self.lazy_loading,
+                                             report=self.report)
+         self.db_index.update(self.encode_index(db_index))
          self.db.update(db)
+         stale = False
       
-      if not os.path.exists("ebas_db_index.dump"): 
+      if not os.path.exists("ebas_db_index.dump") or stale: 
          print("dumping database index...")
          with open("ebas_db_index.dump", "wb") as pickle_file:
             pickle.dump(self.db_index, pickle_file)
       
+      print("building attribute index...")
+      self.attr_index = AttributeIndex(self.site_infor, self.db_index)
+      self.interval_index = IntervalIndex(self.db_index)
+      self.spatial_index = SpatialIndex(self.site_infor, list(self.attr_index.site_order.keys()))
+      
+      print("gathering database summary...")
+      if not self.summary_cache.load(self.site_infor_path):
+         print("site information changed, summarizing sites...")
+         self.summary_cache.build(self.site_infor)
+         self.summary_cache.dump()
+      self.summary = self.db_summary()
+   
+   def init_catalogue(self):
+      # sites and their index are fetched from the catalogue when needed, nothing is loaded at start
+      print("open site catalogue...")
+      self.catalogue = SqliteCatalogue(self.site_infor_path)
+      self.site_infor = self.catalogue.sites
+      self.db_index = self.catalogue.index
+      rows = self.catalogue.site_rows()
+      self.spatial_index = SpatialIndex(dict(zip(self.site_infor.keys(), rows)), list(self.site_infor.keys()))
+      
+      if not self.lazy_loading:
+         print("load all ebas data files...")
+         files = EbasFiles.get_load_files(data_path=self.data_path, 
+                                          selected="all", 
+                                          loaded_db=[], 
+                                          full_db=self.site_infor.keys(), 
+                                          compression=self.compression,
+                                          lazy_loading=False,
+                                          dump_format=self.dump_format)
+         _, db = EbasFiles.load_files(files=files, lazy_loading=False, report=self.report)
+         self.db.update(db)
+      
       print("gathering database summary...")
       self.summary = self.db_summary()
    
+   @utilities.timed_stage()
+   def export_catalogue(self, path="ebas_catalogue.sqlite"):
+      # write site information and database index to a SQLite catalogue, to be opened as site_infor_path
+      print(f"exporting catalogue to '{path}'...")
+      SqliteCatalogue.build(path, self.site_infor, self.db_index)
+   
+   def update_stale_index(self):
+      # sites imported after "ebas_db_index.dump" was written are loaded from their dumps
+      missing = [k for k in self.site_infor.keys() 
+                 if k not in self.db_index.keys() and "files" in self.site_infor[k]]
+      if len(missing)==0:
+         return False
+      
+      print(f"{len(missing)} sites are missing in the database index, loading their index...")
+      files = EbasFiles.get_load_files(data_path=self.data_path, 
+                                       selected=missing, 
+                                       loaded_db=[], 
+                                       compression=self.compression,
+                                       lazy_loading=True,
+                                       dump_format=self.dump_format)
+      db_index, _ = EbasFiles.load_files(files=files, lazy_loading=True, report=self.report)
+      self.db_index.update(self.encode_index(db_index))
+      return True
+   
+   def encode_index(self, db_index):
+      # dumps written by EbasData.ingest keep values that were new to the value index as values
+      for content_index in db_index.values():
+         for c in content_index.values():
+            self.value_index.encode_content(c)
+      return db_index
+   
    def db_summary(self, all =True):
       # generate summary for all sites or selected sites
       if all:
          items = self.site_infor.keys()
       else:
          items =self.selected
-      res ={"country":[],"site":[]}
-      
-      for k in items:
-         res["country"].append(self.site_infor[k]["country"])
-         res["site"].append({
-            "country":self.site_infor[k]["country"],
-            "land_use":self.site_infor[k]["land_use"],
-            "station_setting":self.site_infor[k]["station_setting"],
-            "name":self.site_infor[k]["name"],
-            "id":self.site_infor[k]["id"],
-            "lat":self.site_infor[k]["lat"],
-            "lon":self.site_infor[k]["lon"],
-            "alt":self.site_infor[k]["alt"],
-            })
-      res["country"]= list(set(res["country"]))
-      res["components"] =self.summary_attr("component")
-      res["matrix"] = self.summary_attr("matrix")
-      res["st"] = np.min(self.summary_attr("st"))
-      res["ed"] = np.max(self.summary_attr("ed"))
-      
+      if self.catalogue is not None:
+         res = self.catalogue_summary(None if all else list(items))
+      else:
+         # merged from the site summaries, only the selected sites are visited
+         res = self.summary_cache.merge(None if all else items)
+         res["components"] = self.decode_values("component", res["components"])
+         res["matrix"] = self.decode_values("matrix", res["matrix"])
       
       print(f"{len(res['site']):<10} sites included in current database.")
       print(f"{len(res['components']):<10} components included in current database.")
       print(f"{len(res['matrix']):<10} matrix included in current database.")
       print(f"{len(res['country']):<10} country included in current database.")
-      print(f"Current database ranges from {np.datetime_as_string(res['st'], unit='D'):10} to {np.datetime_as_string(res['ed'], unit='D'):10}.")
+      if res["st"] is not None and res["ed"] is not None:
+         print(f"Current database ranges from {np.datetime_as_string(res['st'], unit='D'):10} to {np.datetime_as_string(res['ed'], unit='D'):10}.")
       
       return res
       
+   def catalogue_summary(self, sites=None):
+      res = {"site": self.catalogue.site_rows(sites)}
+      res["site"] = [{k: r[k] for k in ["country", "land_use", "station_setting", "name", "id", "lat", "lon", "alt"]} 
+                     for r in res["site"]]
+      res["country"] = list(set(r["country"] for r in res["site"]))
+      res["components"] = self.decode_values("component", self.catalogue.summary_attr("component", sites))
+      res["matrix"] = self.decode_values("matrix", self.catalogue.summary_attr("matrix", sites))
+      res["st"] = self.catalogue.summary_attr("st", sites)
+      res["ed"] = self.catalogue.summary_attr("ed", sites)
+      return res
+   
    def summary_attr(self, attr):
       # attr can be anything in contents: matrix, res_code, unit, var, component
+      if self.catalogue is not None:
+         res = self.catalogue.summary_attr(attr)
+         if attr in ["matrix", "res_code", "unit", "component"]:
+            res = self.decode_values(attr, res)
+         return res
+      
       res = []
       for site in self.site_infor.keys():
          files = self.site_infor[site]["files"]
@@ -119,24 +220,26 @@ class EbasDataBase:
       res = list(set(res))
       res.sort()
       if attr in ["matrix", "res_code", "unit", "component"]:
-         res = self.value_index.convert_list(attr, res)
+         res = self.decode_values(attr, res)
       return res
    
+   def decode_values(self, attr, values):
+      # site information holds value index codes if it was built with use_value_index, and the values otherwise
+      values = list(values)
+      if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+         return self.value_index.decode(attr, values).tolist()
+      return values
+   
+   @utilities.timed_stage()
    def select_db(self, condition):
-      res = {}
+      # conditions are converted to value index, keep the caller's dict untouched
+      condition = dict(condition)
       condition_key = list(condition.keys())
-      site_selector_key = ["id", "name", "land_use", "station_setting","country"]
-      site_selector_key = list(set(site_selector_key) & set(condition_key))
-            
-      measure_selector_key = ["component", "matrix","stat"]
-      measure_selector_key = list(set(measure_selector_key) & set(condition_key))
-      
-      if "component" in measure_selector_key:
-         condition["component"] = self.value_index.convert_list("component", condition["component"])
-      if "matrix" in measure_selector_key:
-         condition["matrix"] = self.value_index.convert_list("matrix", condition["matrix"])
-      if "id" in measure_selector_key:
-         condition["id"] = self.value_index.convert_list("id", condition["id"])   
+      
+      if "component" in condition_key:
+         condition["component"] = self.value_index.encode("component", condition["component"]).tolist()
+      if "matrix" in condition_key:
+         condition["matrix"] = self.value_index.encode("matrix", condition["matrix"]).tolist()
 
       time_selector_key =  ["st", "ed"]
       time_selector_key = list(set(time_selector_key) & set(condition_key))
@@ -145,37 +248,20 @@ class EbasDataBase:
       for k in time_selector_key:
          self.time_selector[k] = condition[k]
       
-      for site_id in tqdm(self.site_infor.keys(), desc="seraching..."):
-         select =True
-         if len(site_selector_key)>0:
-            for key in site_selector_key:
-               if self.site_infor[site_id][key] not in condition[key]:
-                  select=False
-                  break
-               
-         # if the site is not the target, examing files are not necessary.
-         if not select:
-            continue
-         
-         files = []
-         for file_id in self.db_index[site_id].keys():
-            select_file = True
-            content = self.db_index[site_id][file_id]
-            if "st" in site_selector_key:
-               if content["ed"]<condition["st"]:
-                  select_file = False
-            if "ed" in site_selector_key:
-               if content["st"]>condition["ed"]:
-                  select_file = False
-            for k in measure_selector_key:
-               if content[k] not in condition[k]:
-                  select_file = False
-                  break
-            if select_file:
-               files.append(file_id)
+      if self.catalogue is not None:
+         # one query, the time overlap included
+         res = self.catalogue.select(condition)
+      else:
+         res = self.attr_index.select(condition)
          
-         if len(files)>0:
-            res[site_id] = files
+         # records not overlapping with the time range will not be loaded
+         if len(self.time_selector)>0:
+            overlap = self.interval_index.query(self.time_selector.get("st"), self.time_selector.get("ed"))
+            res = {site_id: [cid for cid in cids if (site_id, cid) in overlap] for site_id, cids in res.items()}
+            res = {site_id: cids for site_id, cids in res.items() if len(cids)>0}
+      
+      # bbox, radius, alt and nearest, see SpatialIndex
+      res = self.spatial_index.select(res, condition)
       
       self.selected = res
       return res
@@ -186,67 +272,388 @@ class EbasDataBase:
          for file in db_list[site_index]:
             print(site_index, self.db[site_index][file])
             
-   def get_selected_db(self, use_number_index=True):
-      print("Loading necessary data...")
+   @utilities.timed_stage()
+   def get_selected_db(self, use_number_index=True, val_dtype=np.float64, qc_policy="bad_qc", qc_column=False):
+      """this method loads selected sites and gathers selected data into one dataframe.
+
+      Args:
+          use_number_index (bool, optional): site, component, unit and matrix as value index if True, 
+             otherwise as categoricals of their values. Defaults to True.
+          val_dtype (np.dtype, optional): dtype of val, e.g. np.float32 to halve its size. Defaults to np.float64.
+          qc_policy (optional): values invalidated (set to NaN) by their qc flag, see qc_invalid. 
+             Defaults to "bad_qc".
+          qc_column (bool, optional): add the qc flags as column "qc". Defaults to False.
+
+      Returns:
+          pd.DataFrame: columns st, ed, val, site, component, unit, matrix
+      """
+      print("Gathering data to dataframe...")
+      slices = []
+      with tqdm(total=len(self.selected)) as progress:
+         # sites are loaded in batches fitting cache_bytes, a batch is gathered before the next one may evict it
+         for batch in self.load_batches(list(self.selected.keys())):
+            site_dbs = self.load_sites(batch)
+            for site_id in batch:
+               for cid in self.selected[site_id]:
+                  slices.append(self.get_record_slice(site_id, cid, site_dbs[site_id][cid]))
+            progress.update(len(batch))
+      
+      res = self.build_chunk(slices, use_number_index, val_dtype=val_dtype, qc_policy=qc_policy, qc_column=qc_column)
+      self.report.add(rows=len(res))
+      return res
+   
+   result_columns = ["st", "ed", "val", "site", "component", "unit", "matrix"]
+   code_columns = ["site", "component", "unit", "matrix"]
+   
+   def iter_selected_db(self, use_number_index=True, chunk_rows=None, as_frame=True, val_dtype=np.float64, 
+                        qc_policy="bad_qc", qc_column=False):
+      """this method yields selected data chunk by chunk, so large selections can be processed with bounded memory.
+      sites not loaded in the database are loaded when they are reached, and released afterwards.
+
+      Args:
+          use_number_index (bool, optional): keep value index instead of values. Defaults to True.
+          chunk_rows (int, optional): rows per chunk, one chunk per site if None. Defaults to None.
+          as_frame (bool, optional): yield pd.DataFrame, or a record batch {column: np.ndarray} if False. Defaults to True.
+          val_dtype (np.dtype, optional): dtype of val. Defaults to np.float64.
+          qc_policy (optional): see qc_invalid. Defaults to "bad_qc".
+          qc_column (bool, optional): add the qc flags as column "qc". Defaults to False.
+
+      Yields:
+          pd.DataFrame or dict: columns st, ed, val, site, component, unit, matrix
+      """
+      buffer = []
+      buffered = 0
+      for site_id in self.selected.keys():
+         site_db = self.load_site(site_id)
+         slices = [self.get_record_slice(site_id, cid, site_db[cid]) for cid in self.selected[site_id]]
+         
+         if chunk_rows is None:
+            yield self.build_chunk(slices, use_number_index, as_frame, val_dtype, qc_policy, qc_column)
+            continue
+         
+         # slices are views, a buffered slice keeps its site's data alive until its chunk is built
+         for sl in slices:
+            buffer.append(sl)
+            buffered += len(sl["ts"])
+            while buffered >= chunk_rows:
+               chunk, buffer = EbasDataBase.split_slices(buffer, chunk_rows)
+               buffered -= chunk_rows
+               yield self.build_chunk(chunk, use_number_index, as_frame, val_dtype, qc_policy, qc_column)
+      
+      if buffered>0:
+         yield self.build_chunk(buffer, use_number_index, as_frame, val_dtype, qc_policy, qc_column)
+   
+   @utilities.timed_stage()
+   def aggregate(self, freq="M", stats=("mean", "min", "max", "count", "coverage"), by=("site", "component"), 
+                 use_number_index=True, qc_policy="bad_qc", use_rollups=True):
+      """this method aggregates selected data to calendar bins, weighted by how long each record overlaps a bin.
+      records are aggregated one at a time from the stored arrays, the full resolution data is never gathered.
+      records crossing the time range of the selection count with their part inside it, as in rollups.
+      sites with rollups of freq (see EbasData.import_site_data) are answered from them without loading their data,
+      if the qc policy is the one of the rollups and the time range of the selection falls on bin edges.
+
+      Args:
+          freq (str, optional): "D", "M" or "Y" (or "daily", "monthly", "annual"). Defaults to "M".
+          stats (tuple, optional): any of mean, min, max, count, coverage. Defaults to all.
+          by (tuple, optional): any of site, component, unit, matrix. Defaults to ("site", "component").
+          use_number_index (bool, optional): keep value index instead of values. Defaults to True.
+          qc_policy (optional): see qc_invalid. Defaults to "bad_qc".
+          use_rollups (bool, optional): use rollups where possible. Defaults to True.
+
+      Returns:
+          pd.DataFrame: columns by, st, ed (bin bounds) and stats
+      """
+      unit = get_unit(freq)
+      use_rollups = use_rollups and isinstance(qc_policy, str) and self.rollup_aligned(unit)
+      
+      groups = {}
+      partials = []
+      for site_id in tqdm(self.selected.keys(), desc="aggregating..."):
+         rollup = self.load_rollup(site_id, unit, qc_policy) if use_rollups else None
+         if rollup is not None and any(cid not in rollup for cid in self.selected[site_id]):
+            # rollups out of sync with the database index
+            rollup = None
+         site_db = self.load_site(site_id) if rollup is None else None
+         for cid in self.selected[site_id]:
+            codes = self.get_record_codes(site_id, cid)
+            group = groups.setdefault(tuple(codes[k] for k in by), len(groups))
+            if rollup is not None:
+               partials.append(self.get_rollup_slice(rollup[cid], group))
+               continue
+            sl = self.get_record_slice(site_id, cid, site_db[cid], clip=True)
+            val = sl["val"][:,0].astype(np.float64)
+            val[EbasDataBase.qc_invalid(sl["qc"], qc_policy)] = np.nan
+            partials.append(aggregate_intervals(sl["ts"], val, group, unit))
+      
+      res = finalize_partials(merge_partials(partials), stats)
+      
+      keys = np.array(list(groups.keys()), dtype=np.int32).reshape(len(groups), len(by))
+      columns = {}
+      for i, k in enumerate(by):
+         columns[k] = keys[:,i].take(res["group"])
+         if not use_number_index:
+            columns[k] = pd.Categorical.from_codes(columns[k], categories=self.value_index.get_values(k))
+      for k in ["st", "ed"] + list(stats):
+         columns[k] = res[k]
+      self.report.add(rows=len(res["st"]))
+      return pd.DataFrame(columns)
+   
+   def rollup_aligned(self, unit):
+      # rollup bins can only answer a time range starting and ending on bin edges
+      for t in self.time_selector.values():
+         t = np.datetime64(t, "ns")
+         if t.astype(f"datetime64[{unit}]").astype("datetime64[ns]") != t:
+            return False
+      return True
+   
+   def load_rollup(self, site_id, unit, qc_policy="bad_qc"):
+      # rollups of one site at unit, None if there are none for this unit or qc policy
+      path = os.path.join(self.rollup_path, f"{site_id}.rollup")
+      # kept with the size and mtime of the file, rollups rewritten or removed by a later import are read again
+      try:
+         stat = os.stat(path)
+         fingerprint = (stat.st_size, stat.st_mtime_ns)
+      except FileNotFoundError:
+         fingerprint = None
+      if site_id not in self.rollups or self.rollups[site_id][0] != fingerprint:
+         self.rollups[site_id] = (fingerprint, utilities.load_pickle(path) if fingerprint is not None else None)
+      rollup = self.rollups[site_id][1]
+      if rollup is None or rollup["qc_policy"] != qc_policy:
+         return None
+      return rollup["freqs"].get(unit)
+   
+   def get_rollup_slice(self, partial, group):
+      # rollup bins inside the time range of the selection
+      keep = np.ones(len(partial["st"]), dtype=bool)
+      if "st" in self.time_selector.keys():
+         keep &= partial["st"] >= np.datetime64(self.time_selector["st"], "ns")
+      if "ed" in self.time_selector.keys():
+         keep &= partial["ed"] <= np.datetime64(self.time_selector["ed"], "ns")
+      res = {k: v[keep] for k, v in partial.items()}
+      res["group"] = np.full(len(res["st"]), group, dtype=np.int64)
+      return res
+   
+   
+   @staticmethod
+   def split_slices(slices, rows):
+      # the first slices holding exactly "rows" rows, and the rest
+      head = []
+      for i, sl in enumerate(slices):
+         n = len(sl["ts"])
+         if n < rows:
+            head.append(sl)
+            rows -= n
+            continue
+         head.append(dict(sl, ts=sl["ts"][:rows], val=sl["val"][:rows], qc=sl["qc"][:rows]))
+         tail = [dict(sl, ts=sl["ts"][rows:], val=sl["val"][rows:], qc=sl["qc"][rows:])] if n > rows else []
+         return head, tail + slices[i+1:]
+      return head, []
+   
+   def load_batches(self, site_ids):
+      """this method groups sites in batches loaded together by load_sites, in their order.
+      all sites are one batch without cache_bytes. with it, the sites of a batch are expected to fit the budget,
+      their size is estimated from their dumps, see estimate_nbytes. the first site loaded and sites not fitting
+      the budget are batches of their own.
+
+      Args:
+          site_ids (list): site ids
+
+      Yields:
+          list: site ids of one batch
+      """
+      budget = self.db.max_bytes
+      if budget is None:
+         if len(site_ids)>0:
+            yield site_ids
+         return
+      
+      batch = []
+      size = 0
+      for site_id in site_ids:
+         # estimated as batches are loaded, every batch refines the estimate of the next ones
+         nbytes = self.db.sizes[site_id] if site_id in self.db else self.estimate_nbytes(site_id)
+         if nbytes is None or nbytes > budget:
+            if len(batch)>0:
+               yield batch
+            yield [site_id]
+            batch = []
+            size = 0
+            continue
+         if size + nbytes > budget:
+            yield batch
+            batch = []
+            size = 0
+         batch.append(site_id)
+         size += nbytes
+      if len(batch)>0:
+         yield batch
+   
+   def estimate_nbytes(self, site_id):
+      # loaded bytes of a site, the size of its dump times the loaded bytes per dump byte of the sites loaded so far.
+      # None if no site is loaded yet
+      if self.loaded_bytes["dump"] == 0:
+         return None
+      file = EbasFiles.get_load_files(data_path=self.data_path, 
+                                      selected=[site_id], 
+                                      loaded_db=[], 
+                                      compression=self.compression,
+                                      dump_format=self.dump_format)[0]
+      return int(os.path.getsize(file["path"]) * self.loaded_bytes["data"] / self.loaded_bytes["dump"])
+   
+   def load_sites(self, site_ids):
+      # data of several sites, the ones not in the cache are loaded in parallel by EbasFiles.load_files and kept in the cache
+      missing = [site_id for site_id in site_ids if site_id not in self.db]
+      if len(missing) <= 1:
+         return {site_id: self.load_site(site_id, keep=True) for site_id in site_ids}
+      
+      # cached sites are taken first, loading the others may evict them
+      res = {site_id: self.db.get(site_id) for site_id in site_ids if site_id in self.db}
+      self.report.count("site_cache_hits", len(res))
+      self.report.count("site_cache_misses", len(missing))
       files = EbasFiles.get_load_files(data_path=self.data_path, 
-                                       selected=list(self.selected.keys()), 
-                                       loaded_db=list(self.db.keys()), 
-                                       full_db=list(self.site_infor.keys()), 
+                                       selected=missing, 
+                                       loaded_db=[], 
                                        compression=self.compression,
-                                       lazy_loading=False)
+                                       lazy_loading=False,
+                                       dump_format=self.dump_format)
+      _, db = EbasFiles.load_files(files=files, lazy_loading=False, report=self.report)
+      for file in files:
+         self.count_loaded_bytes(file["path"], db[file["name"]])
+      self.db.update(db)
+      res.update(db)
+      return res
+   
+   def count_loaded_bytes(self, path, site_db):
+      self.loaded_bytes["dump"] += os.path.getsize(path)
+      self.loaded_bytes["data"] += SiteCache.site_nbytes(site_db)
+   
+   def load_site(self, site_id, keep=False):
+      # data of one site, taken from the cache if loaded, otherwise read from its dump and kept in the cache if keep
+      site_db = self.db.get(site_id)
+      if site_db is not None:
+         self.report.count("site_cache_hits")
+         return site_db
+      self.report.count("site_cache_misses")
+      file = EbasFiles.get_load_files(data_path=self.data_path, 
+                                      selected=[site_id], 
+                                      loaded_db=[], 
+                                      compression=self.compression,
+                                      lazy_loading=False,
+                                      dump_format=self.dump_format)[0]
+      loaded = EbasFiles.load_file(file)
+      self.report.record_file("load_file", loaded["path"], decode_s=loaded["decode_s"], bytes_read=loaded["bytes_read"])
+      site_db = loaded["data"]
+      if not isinstance(site_db, SiteStore):
+         site_db.pop("content_index", None)
+      self.count_loaded_bytes(loaded["path"], site_db)
+      if keep:
+         self.db.put(site_id, site_db)
+      return site_db
+   
+   def get_record_codes(self, site_id, cid):
+      header = self.db_index[site_id][cid]
+      return {
+         "site": self.value_index.site[site_id],
+         "component": header["component"],
+         "unit": header["unit"],
+         "matrix": header["matrix"],
+      }
+   
+   def get_record_slice(self, site_id, cid, record, clip=False):
+      # records inside the selected time range. 
+      # clip: records crossing st or ed are kept too, cut to the time range, as rollup bins count them
+      ts = record["ts"]
+      val = record["val"]
+      # dumps written before qc flags were kept have their bad values removed already
+      qc = record["qc"] if "qc" in record else np.zeros(ts.shape[0], dtype=np.uint16)
       
-      _, db = EbasFiles.load_files(files=files, 
-                                          lazy_loading=False)
+      if len(self.time_selector)>0:
+         # ts is sorted in time, the selected rows are one contiguous slice
+         lo = 0
+         hi = ts.shape[0]
+         if "st" in self.time_selector.keys():
+            if clip:
+               lo = np.searchsorted(ts[:,1], self.time_selector["st"], side="right")
+            else:
+               lo = np.searchsorted(ts[:,0], self.time_selector["st"], side="left")
+         if "ed" in self.time_selector.keys():
+            if clip:
+               hi = np.searchsorted(ts[:,0], self.time_selector["ed"], side="left")
+            else:
+               hi = np.searchsorted(ts[:,1], self.time_selector["ed"], side="right")
+         ts = ts[lo:max(lo, hi)]
+         val = val[lo:max(lo, hi)]
+         qc = qc[lo:max(lo, hi)]
+         
+         if clip and len(ts)>0:
+            ts = np.array(ts, dtype="datetime64[ns]")
+            if "st" in self.time_selector.keys():
+               ts[:,0] = np.maximum(ts[:,0], np.datetime64(self.time_selector["st"], "ns"))
+            if "ed" in self.time_selector.keys():
+               ts[:,1] = np.minimum(ts[:,1], np.datetime64(self.time_selector["ed"], "ns"))
       
-      self.db.update(db)
+      return dict(self.get_record_codes(site_id, cid), ts=ts, val=val, qc=qc)
+   
+   def build_chunk(self, slices, use_number_index=True, as_frame=True, val_dtype=np.float64, 
+                   qc_policy="bad_qc", qc_column=False):
+      # every column is allocated once with its final dtype and filled slice by slice
+      n = sum(len(sl["ts"]) for sl in slices)
+      columns = {
+         "st": np.empty(n, dtype="datetime64[ns]"),
+         "ed": np.empty(n, dtype="datetime64[ns]"),
+         "val": np.empty(n, dtype=val_dtype),
+         "qc": np.empty(n, dtype=np.uint16),
+      }
+      for k in EbasDataBase.code_columns:
+         columns[k] = np.empty(n, dtype=np.int32)
       
-      print("Gathering data to dataframe...")
-      res_ts = []
-      res_val = []
-      
-      for site in tqdm(self.selected.keys()):
-         site_id = site
-         for file in self.selected[site_id]:
-            header = self.db_index[site_id][file]
-            ts = self.db[site_id][file]["ts"]
-            val = self.db[site_id][file]["val"]
-            
-            if len(self.time_selector)>0:
-               if "st" in self.time_selector.keys():
-                  st = self.time_selector["st"]
-                  index = ts[:,0]>= st
-                  ts = ts[index]
-                  val = val[index]
-               if "ed" in self.time_selector.keys():
-                  ed = self.time_selector["ed"]
-                  index = ts[:,1]<=ed
-                  ts = ts[index]
-                  val = val[index]           
-            
-            infor = np.empty((ts.shape[0], 4))
-            infor[:,0] = self.value_index.site[site_id]
-            infor[:,1] = header["component"]
-            infor[:,2] = header["unit"]
-            infor[:,3] = header["matrix"]
-                        
-            val = np.hstack((val,infor))
-            
-            res_ts.append(ts)
-            res_val.append(val)
+      offset = 0
+      for sl in slices:
+         end = offset + len(sl["ts"])
+         columns["st"][offset:end] = sl["ts"][:,0]
+         columns["ed"][offset:end] = sl["ts"][:,1]
+         columns["val"][offset:end] = sl["val"][:,0]
+         columns["qc"][offset:end] = sl["qc"]
+         for k in EbasDataBase.code_columns:
+            columns[k][offset:end] = sl[k]
+         offset = end
       
-      # todo: handle None
-      res_ts = np.vstack(tuple(res_ts))
-      res_val = np.vstack(tuple(res_val))
+      columns["val"][EbasDataBase.qc_invalid(columns["qc"], qc_policy)] = np.nan
+      if not qc_column:
+         columns.pop("qc")
       
-      df1 = pd.DataFrame(res_ts, columns=["st", "ed"])
-      df2 = pd.DataFrame(res_val, columns=["val", "site","component","unit","matrix"])
-      df = pd.concat([df1,df2],axis=1)
-
       if not use_number_index:
-         df["site"] =df["site"].map(self.value_index.site)
-         df["component"] =df["component"].map(self.value_index.component)
-         df["unit"] =df["unit"].map(self.value_index.unit)
-         df["matrix"] =df["matrix"].map(self.value_index.matrix)
-         
-      return df
-      
\ No newline at end of file
+         for k in EbasDataBase.code_columns:
+            if as_frame:
+               columns[k] = pd.Categorical.from_codes(columns[k], categories=self.value_index.get_values(k))
+            else:
+               columns[k] = self.value_index.decode(k, columns[k])
+      
+      if as_frame:
+         return pd.DataFrame(columns, columns=EbasDataBase.result_columns + (["qc"] if qc_column else []))
+      return columns
+   
+   @staticmethod
+   def qc_invalid(qc, qc_policy="bad_qc"):
+      """this method finds values invalidated by their qc flags
+
+      Args:
+          qc (np.ndarray): uint16 qc flags, 0 if not flagged
+          qc_policy (optional): "bad_qc" for the flags in value_index.bad_qc, a list of flags, 
+             a function returning a boolean mask from qc, or None to keep all values. Defaults to "bad_qc".
+
+      Returns:
+          np.ndarray: boolean mask, True for invalid values
+      """
+      if qc_policy is None:
+         return np.zeros(qc.shape, dtype=bool)
+      if callable(qc_policy):
+         return np.asarray(qc_policy(qc), dtype=bool)
+      if isinstance(qc_policy, str):
+         if qc_policy != "bad_qc":
+            raise ValueError(f"unknown qc policy '{qc_policy}'.")
+         qc_policy = bad_qc
+      # one lookup in a table of all uint16 flags
+      table = np.zeros(1<<16, dtype=bool)
+      table[np.asarray(list(qc_policy), dtype=np.int64)] = True
+      return table[qc]
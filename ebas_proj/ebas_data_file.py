@@ -1,30 +1,35 @@
 import utilities
-import pickle
-import lzma
 import json
 import os
+import time
+
+from ebas_importer.site_store import SiteStore
 
 class EbasFiles:
    def __init__(self):
       pass
 
    @staticmethod
-   def get_load_files(data_path, selected, loaded_db, full_db, compression='xz', lazy_loading=False):
+   def get_load_files(data_path, selected, loaded_db, full_db=None, compression='xz', lazy_loading=False, dump_format="pickle"):
       """this method generate files need to be loaded for db
       
       Args:
           data_path (str): data path to files
           selected (list): list of selected sites
           loaded_db (list): list of loaded sites
-          full_db (list): list of all sites
-          compression (str, optional):  Defaults to 'xz'.
+          full_db (list, optional): list of all sites, only used if selected is "all". Defaults to None.
+          compression (str, optional): codec name, see utilities.list_codecs. Defaults to 'xz'.
+          dump_format (str, optional): "pickle" or "columnar". Defaults to "pickle".
 
       Returns:
           (list): list of  {"name":"", "path":""}
       """
       
       files = []
-      suffix = '.xz' if compression=="xz" else ''
+      if dump_format == "columnar":
+         suffix = SiteStore.suffix
+      else:
+         suffix = utilities.get_codec(compression).suffix
       
       if selected == "all":
          for site in full_db:
@@ -45,23 +50,38 @@ class EbasFiles:
       return files
    
    @staticmethod
-   def load_files(files, lazy_loading=True):
+   def load_files(files, lazy_loading=True, report=None):
       """this method opens ebas data files
       
       Args:
           files (dict): {"path":"", "name":""}
           lazy_loading (bool, optional): [whether load whole dataset]. Defaults to True.
+          report (utilities.RunReport, optional): records the timing of every file. Defaults to None.
       
       Returns:
           (tuple): (db_index, db)    
       """
       db_index = {}
       db = {}
-      res = utilities.run_mp(EbasFiles.load_file, files)
+      if len(files)==0:
+         return db_index, db
+      
+      # columnar stores only read their header when opened, no need for extra processes
+      if all(f["path"].endswith(SiteStore.suffix) for f in files):
+         res = [EbasFiles.load_file(f) for f in files]
+      else:
+         # site arrays come back through shared memory, only their descriptors are pickled
+         res = utilities.run_mp(EbasFiles.load_file, files, shared=True)
             
       # combine all the data
       for r in res:
-         if not lazy_loading:
+         if report is not None:
+            report.record_file("load_file", r["path"], decode_s=r["decode_s"], bytes_read=r["bytes_read"])
+         if isinstance(r["data"], SiteStore):
+            db_index[r["name"]] = r["data"].content_index
+            if not lazy_loading:
+               db[r["name"]] = r["data"]
+         elif not lazy_loading:
             db_index[r["name"]] = r["data"]["content_index"]
             r["data"].pop("content_index")
             db[r["name"]] = r["data"]
@@ -72,13 +92,13 @@ class EbasFiles:
    
    @staticmethod
    def load_file(file):
-      """this method opens one '.xz', '.json', and python pickle files
+      """this method opens one '.json', '.ebas' columnar store, and python pickle files of any codec
 
       Args:
           file (dict): {"name":"", "path":"", lazy_loading:""}
 
       Returns:
-          dict: {"name":"", "data":""}
+          dict: {"name":"", "data":"", "path":"", "decode_s":"", "bytes_read":""}
       """
       if "lazy_loading" in file.keys():
          lazy_loading = file["lazy_loading"]
@@ -86,18 +106,23 @@ class EbasFiles:
          lazy_loading = False
       
       file_path = file["path"]
+      timing = {"path": file_path, "bytes_read": os.path.getsize(file_path)}
+      start = time.perf_counter()
       
-      if file_path.endswith("xz"):
-         with lzma.open(file_path, "rb") as pickle_file:
-            res = pickle.load(pickle_file)
+      if file_path.endswith(SiteStore.suffix):
+         # the store is memory mapped, lazy loading costs nothing more than the header
+         res = SiteStore(file_path)
+         timing["bytes_read"] = res.data_start
+         return dict(timing, name=file["name"], data=res, decode_s=time.perf_counter() - start)
       elif file_path.endswith("json"):
          with open(file_path,"r") as json_file:
             res = json.load(json_file)
       else:
-         with open(file_path, "rb") as pickle_file:
-            res = pickle.load(pickle_file)
+         # compression of pickled files is detected from their header
+         res = utilities.load_pickle(file_path)
       
+      timing["decode_s"] = time.perf_counter() - start
       if lazy_loading:
-         return {"name":file["name"], "data":res["content_index"]}
+         return dict(timing, name=file["name"], data=res["content_index"])
       else:
-         return {"name":file["name"], "data":res}
+         return dict(timing, name=file["name"], data=res)
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+
+from ebas_importer.site_store import SiteStore
+
+__all__ = [
+   "SiteCache",
+]
+
+class SiteCache:
+   """
+   loaded site data of the database, least recently used sites are evicted beyond a byte budget:
+   1. max_bytes=None keeps everything, as a plain dict would
+   2. pinned sites are never evicted
+   3. hits and misses are counted on lookups
+   """
+
+   def __init__(self, max_bytes=None):
+      self.max_bytes = max_bytes
+      self.data = OrderedDict()
+      self.sizes = {}
+      self.pinned = set()
+      self.nbytes = 0
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+   @staticmethod
+   def site_nbytes(site_data):
+      # bytes of the ts/val arrays of one site, a columnar store counts the bytes it may page in
+      if isinstance(site_data, SiteStore):
+         return site_data.nbytes
+      size = 0
+      for record in site_data.values():
+         if isinstance(record, dict):
+            size += sum(v.nbytes for v in record.values() if hasattr(v, "nbytes"))
+      return size
+
+   def get(self, site_id, default=None):
+      if site_id not in self.data:
+         self.misses += 1
+         return default
+      self.hits += 1
+      self.data.move_to_end(site_id)
+      return self.data[site_id]
+
+   def put(self, site_id, site_data):
+      if site_id in self.data:
+         self.nbytes -= self.sizes[site_id]
+      self.data[site_id] = site_data
+      self.data.move_to_end(site_id)
+      self.sizes[site_id] = SiteCache.site_nbytes(site_data)
+      self.nbytes += self.sizes[site_id]
+      self.evict(keep=site_id)
+
+   def update(self, db):
+      for site_id, site_data in db.items():
+         self.put(site_id, site_data)
+
+   def evict(self, keep=None):
+      if self.max_bytes is None:
+         return
+      for site_id in list(self.data.keys()):
+         if self.nbytes <= self.max_bytes:
+            break
+         if site_id in self.pinned or site_id == keep:
+            continue
+         self.pop(site_id)
+         self.evictions += 1
+
+   def pop(self, site_id, default=None):
+      if site_id not in self.data:
+         return default
+      self.nbytes -= self.sizes.pop(site_id)
+      return self.data.pop(site_id)
+
+   def pin(self, site_ids):
+      self.pinned |= set(site_ids)
+
+   def unpin(self, site_ids):
+      self.pinned -= set(site_ids)
+      self.evict()
+
+   def clear(self):
+      self.data.clear()
+      self.sizes.clear()
+      self.nbytes = 0
+
+   def stats(self):
+      return {"sites": len(self.data),
+              "nbytes": self.nbytes,
+              "max_bytes": self.max_bytes,
+              "pinned": len(self.pinned),
+              "hits": self.hits,
+              "misses": self.misses,
+              "evictions": self.evictions}
+
+   def __getitem__(self, site_id):
+      if site_id not in self.data:
+         raise KeyError(site_id)
+      return self.get(site_id)
+
+   def __setitem__(self, site_id, site_data):
+      self.put(site_id, site_data)
+
+   def __contains__(self, site_id):
+      return site_id in self.data
+
+   def __len__(self):
+      return len(self.data)
+
+   def __iter__(self):
+      return iter(self.data)
+
+   def keys(self):
+      return self.data.keys()
@@ -0,0 +1,31 @@
+import numpy as np
+from ebas_importer.aggregation import aggregate_intervals, merge_partials, finalize_partials
+
+
+def ts(*bounds):
+    return np.array([[np.datetime64(st, "ns"), np.datetime64(ed, "ns")] for st, ed in bounds])
+
+
+def test_record_split_across_bins():
+    # the second record covers 12h of each day
+    p = aggregate_intervals(ts(("2010-01-01T00", "2010-01-01T12"), ("2010-01-01T12", "2010-01-02T12"),
+                               ("2010-01-02T12", "2010-01-02T18")),
+                            np.array([1.0, 3.0, np.nan]), freq="D")
+    res = finalize_partials(p)
+
+    assert res["st"].tolist() == list(np.array(["2010-01-01", "2010-01-02"], dtype="datetime64[ns]").tolist())
+    assert np.allclose(res["mean"], [2.0, 3.0])
+    assert res["count"].tolist() == [2, 1]
+    assert np.allclose(res["coverage"], [1.0, 0.5])
+    assert res["min"].tolist() == [1.0, 3.0] and res["max"].tolist() == [3.0, 3.0]
+
+
+def test_merge_partials():
+    a = aggregate_intervals(ts(("2010-01-01", "2010-01-11")), np.array([1.0]), group=1, freq="M")
+    b = aggregate_intervals(ts(("2010-01-11", "2010-01-31"), ("2011-05-01", "2011-05-02")),
+                            np.array([4.0, 2.0]), group=np.array([1, 0]), freq="M")
+    res = finalize_partials(merge_partials([b, a]), ["mean", "count"])
+
+    assert res["group"].tolist() == [0, 1]
+    assert np.allclose(res["mean"], [2.0, 3.0])
+    assert res["count"].tolist() == [1, 2]
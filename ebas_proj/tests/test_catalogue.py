@@ -0,0 +1,28 @@
+from ebas_importer.catalogue import CatalogueManifest
+
+
+catalogue_xml = b"""<?xml version="1.0" encoding="UTF-8"?>
+<catalog xmlns="http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0" version="1.0.1">
+  <dataset name="ebas" ID="ebas">
+    <dataset name="a.nc" ID="ebas/a.nc" urlPath="ebas/a.nc">
+      <dataSize units="Kbytes">12.5</dataSize>
+      <date type="modified">2021-01-01T00:00:00Z</date>
+    </dataset>
+    <dataset name="b.nc" ID="ebas/b.nc" urlPath="ebas/b.nc">
+      <dataSize units="Mbytes">1.2</dataSize>
+      <date type="modified">2021-01-02T00:00:00Z</date>
+    </dataset>
+  </dataset>
+</catalog>"""
+
+
+def test_catalogue_diff(tmp_path):
+    catalogue = CatalogueManifest.parse_catalogue(catalogue_xml)
+    assert catalogue["a.nc"] == {"size": "12.5 Kbytes", "modified": "2021-01-01T00:00:00Z"}
+
+    manifest = CatalogueManifest(str(tmp_path / "manifest.json"))
+    manifest.files = {"a.nc": {"size": "12.5 Kbytes", "modified": "2020-01-01T00:00:00Z"}}
+    assert manifest.diff(catalogue, ["a.nc", "c.nc"]) == (["b.nc"], ["a.nc"], ["c.nc"])
+
+    manifest.update(catalogue, ["a.nc", "c.nc"], downloaded=["a.nc", "b.nc"], removed=["c.nc"])
+    assert CatalogueManifest(manifest.path).diff(catalogue, ["a.nc", "b.nc"]) == ([], [], [])
@@ -0,0 +1,54 @@
+import numpy as np
+from ebas_proj.catalogue_db import SqliteCatalogue
+from ebas_proj.db_index import AttributeIndex
+from ebas_importer.data_importer import EbasFtpDataImporter
+
+
+def content(component, st, ed, stat="arithmetic mean"):
+    return {"file": "f.nc", "var": "v", "component": component, "matrix": 0, "stat": stat,
+            "unit": 0, "res_code": 0, "st": np.datetime64(st, "ns"), "ed": np.datetime64(ed, "ns")}
+
+
+site_infor = {
+    "DE0001R": {"id": "DE0001R", "name": "a", "country": "Germany", "land_use": None, "station_setting": None,
+                "files": {"f.nc": {"contents": [], "attrs": {"k": "v"}}}},
+    "FR0002R": {"id": "FR0002R", "name": "b", "country": "France", "land_use": None, "station_setting": "Rural",
+                "files": {}},
+}
+# error record of a file that could not be indexed, as get_site_infor stores it
+site_infor.update(EbasFtpDataImporter.combine_infor(
+    [EbasFtpDataImporter.error_record("broken.nc", OSError("can not read"))]))
+db_index = {
+    "DE0001R": {0: content(1, "2000-01-01", "2001-01-01")},
+    "FR0002R": {0: content(1, "1990-01-01", "2020-01-01", "median"),
+                1: content(2, "2005-01-01", "2010-01-01")},
+}
+
+
+def test_select_as_attribute_index(tmp_path):
+    path = str(tmp_path / "catalogue.sqlite")
+    SqliteCatalogue.build(path, site_infor, db_index)
+    catalogue = SqliteCatalogue(path)
+    index = AttributeIndex(site_infor, db_index)
+
+    for condition in [{}, {"component": [2]}, {"station_setting": [None]}, {"stat": ["median", "x"]}]:
+        assert catalogue.select(condition) == index.select(condition)
+    assert catalogue.select({"st": np.datetime64("2002-01-01"), "ed": np.datetime64("2004-01-01")}) == \
+        {"FR0002R": [0]}
+
+    assert list(catalogue.sites) == ["DE0001R", "FR0002R"]
+    assert catalogue.sites["DE0001R"]["files"]["f.nc"]["attrs"] == {"k": "v"}
+    assert catalogue.index["FR0002R"][1] == db_index["FR0002R"][1]
+    assert catalogue.summary_attr("component") == [1, 2]
+    assert catalogue.summary_attr("st", ["DE0001R"]) == np.datetime64("2000-01-01")
+
+
+def test_select_many_values(tmp_path):
+    path = str(tmp_path / "catalogue.sqlite")
+    SqliteCatalogue.build(path, site_infor, db_index)
+    catalogue = SqliteCatalogue(path)
+
+    # more values than SQLite can bind as variables
+    sites = [f"XX{i:05d}R" for i in range(40000)] + ["FR0002R", None]
+    assert catalogue.select({"id": sites, "component": [np.int64(2)]}) == {"FR0002R": [1]}
+    assert [s["id"] for s in catalogue.site_rows(sites)] == ["FR0002R"]
@@ -0,0 +1,56 @@
+import numpy as np
+from ebas_proj.db_index import AttributeIndex, IntervalIndex, SpatialIndex
+
+
+site_infor = {
+    "DE0001R": {"id": "DE0001R", "name": "a", "country": "Germany", "land_use": None, "station_setting": None},
+    "FR0002R": {"id": "FR0002R", "name": "b", "country": "France", "land_use": None, "station_setting": "Rural"},
+    "NO0003R": {"id": "NO0003R", "name": "c", "country": "Norway", "land_use": None, "station_setting": "Rural"},
+}
+db_index = {
+    "DE0001R": {0: {"component": 1, "matrix": 0, "stat": "arithmetic mean"}},
+    "FR0002R": {0: {"component": 1, "matrix": 0, "stat": "median"},
+                1: {"component": 2, "matrix": 0, "stat": "arithmetic mean"}},
+    "NO0003R": {0: {"component": 2, "matrix": 1, "stat": "arithmetic mean"}},
+}
+
+
+def test_attribute_index_select():
+    index = AttributeIndex(site_infor, db_index)
+
+    assert index.select({}) == {"DE0001R": [0], "FR0002R": [0, 1], "NO0003R": [0]}
+    assert index.select({"component": [2]}) == {"FR0002R": [1], "NO0003R": [0]}
+    assert index.select({"component": [1, 2], "stat": ["arithmetic mean"], "station_setting": ["Rural"]}) == \
+        {"FR0002R": [1], "NO0003R": [0]}
+    assert index.select({"country": ["Germany"], "matrix": [1]}) == {}
+
+
+def test_interval_index_query():
+    index = IntervalIndex({
+        "DE0001R": {0: {"st": np.datetime64("2000-01-01"), "ed": np.datetime64("2001-01-01")},
+                    1: {"st": np.datetime64("2005-01-01"), "ed": np.datetime64("2010-01-01")}},
+        "FR0002R": {0: {"st": np.datetime64("1990-01-01"), "ed": np.datetime64("2020-01-01")}},
+    })
+
+    assert index.query() == {("DE0001R", 0), ("DE0001R", 1), ("FR0002R", 0)}
+    assert index.query(np.datetime64("2002-01-01"), np.datetime64("2004-01-01")) == {("FR0002R", 0)}
+    assert index.query(st=np.datetime64("2009-01-01")) == {("DE0001R", 1), ("FR0002R", 0)}
+    assert index.query(ed=np.datetime64("2000-01-01")) == {("DE0001R", 0), ("FR0002R", 0)}
+
+
+def test_spatial_index_select():
+    located = {
+        "DE0001R": {"lat": "52.5", "lon": "13.4", "alt": "34.0 m"},
+        "FR0002R": {"lat": 48.85, "lon": 2.35, "alt": None},
+        "NO0003R": {"lat": "78.9", "lon": "11.9", "alt": "474.0 m"},
+        "US0004R": {"lat": None, "lon": None, "alt": "10 m"},
+    }
+    index = SpatialIndex(located, list(located.keys()))
+    res = {k: [0] for k in located.keys()}
+
+    assert index.select(res, {"radius": {"lat": 52.52, "lon": 13.40, "km": 10}}) == {"DE0001R": [0]}
+    assert list(index.select(res, {"bbox": {"lat": (45, 80), "lon": (0, 12)}}).keys()) == ["FR0002R", "NO0003R"]
+    assert list(index.select(res, {"alt": (0, 100)}).keys()) == ["DE0001R", "US0004R"]
+    assert index.nearest(50.0, 5.0, 2) == ["FR0002R", "DE0001R"]
+    assert list(index.select(res, {"alt": (0, 500), "nearest": {"lat": 80, "lon": 0, "k": 1}}).keys()) == ["NO0003R"]
+    assert abs(index.distance(48.85, 2.35, ["DE0001R"])[0] - 878) < 5
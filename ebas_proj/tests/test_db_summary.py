@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from ebas_proj.db_summary import SummaryCache
+from ebas_importer.data_importer import EbasFtpDataImporter
+
+
+def site(site_id, country, contents):
+    return {"id": site_id, "name": site_id, "country": country, "land_use": None, "station_setting": None,
+            "lat": "1.0", "lon": "2.0", "alt": "3.0 m", "files": {"f.nc": {"contents": contents, "attrs": {}}}}
+
+
+site_infor = {
+    "DE0001R": site("DE0001R", "Germany", [
+        {"component": 1, "matrix": 0, "st": np.datetime64("2000-01-01"), "ed": np.datetime64("2001-01-01")}]),
+    "FR0002R": site("FR0002R", "France", [
+        {"component": 2, "matrix": 0, "st": np.datetime64("1990-01-01"), "ed": np.datetime64("1995-01-01")},
+        {"component": 1, "matrix": 1, "st": np.datetime64("1995-01-01"), "ed": np.datetime64("2005-01-01")}]),
+}
+# error record of a file that could not be indexed, as get_site_infor stores it
+site_infor.update(EbasFtpDataImporter.combine_infor(
+    [EbasFtpDataImporter.error_record("broken.nc", OSError("can not read"))]))
+
+
+def test_summary_merge_and_reload(tmp_path):
+    infor_path = tmp_path / "site_infor.xz"
+    infor_path.write_bytes(b"site information")
+    cache = SummaryCache(str(tmp_path / "summary.dump"))
+    assert not cache.load(str(infor_path))
+    cache.build(site_infor)
+    cache.dump()
+
+    res = cache.merge()
+    assert [s["id"] for s in res["site"]] == ["DE0001R", "FR0002R"]
+    assert res["components"] == [1, 2] and res["matrix"] == [0, 1]
+    assert res["st"] == np.datetime64("1990-01-01") and res["ed"] == np.datetime64("2005-01-01")
+    assert cache.merge(["DE0001R"])["components"] == [1]
+
+    reloaded = SummaryCache(str(tmp_path / "summary.dump"))
+    assert reloaded.load(str(infor_path))
+    assert reloaded.merge() == res
+
+    infor_path.write_bytes(b"site information, changed")
+    assert not SummaryCache(str(tmp_path / "summary.dump")).load(str(infor_path))
@@ -0,0 +1,62 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import utilities
+
+
+content = bytes(range(256)) * 1600
+requests_seen = []
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    # the first full request of "flaky.nc" is cut in the middle, to be resumed with a Range request
+    flaky = {"done": False}
+
+    def do_GET(self):
+        requests_seen.append((self.path, self.headers.get("Range")))
+        if self.path.endswith("missing.nc"):
+            self.send_error(404)
+            return
+
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(content)-1}/{len(content)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+
+        if self.path.endswith("flaky.nc") and not RangeHandler.flaky["done"]:
+            RangeHandler.flaky["done"] = True
+            self.wfile.write(content[start:start + 100000])
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/"
+    httpd.shutdown()
+
+
+def test_download_concurrent_resumes_and_reports_errors(server, tmp_path):
+    files = ["a.nc", "b.nc", "flaky.nc", "missing.nc"]
+    errors = utilities.download_concurrent(files, str(tmp_path), url=server, max_workers=4,
+                                           retries=2, backoff=0, error_file=None)
+
+    assert errors == [["missing.nc"]]
+    for f in ["a.nc", "b.nc", "flaky.nc"]:
+        assert (tmp_path / f).read_bytes() == content
+    assert not list(tmp_path.glob("*.part"))
+    # the retry of flaky.nc only asked for the missing bytes
+    assert any(path == "/flaky.nc" and rng is not None for path, rng in requests_seen)
@@ -0,0 +1,53 @@
+import lzma
+import pickle
+import numpy as np
+import pytest
+import utilities
+
+
+obj = {"content_index": {0: {"component": "ozone", "st": np.datetime64("2000-01-01", "ns")}},
+       0: {"ts": np.arange(20000).astype("datetime64[ns]").reshape(-1, 2), "val": np.linspace(0, 1, 10000)}}
+
+
+def equal(a, b):
+    return a["content_index"] == b["content_index"] and all(np.array_equal(a[0][k], b[0][k]) for k in ["ts", "val"])
+
+
+@pytest.mark.parametrize("name", utilities.list_codecs())
+def test_round_trip_and_detect(tmp_path, name):
+    codec = utilities.get_codec(name)
+    path = str(tmp_path / ("dump" + codec.suffix))
+    utilities.dump_pickle(obj, path, name)
+
+    with open(path, "rb") as f:
+        assert utilities.detect_codec(f.read(8)).suffix == codec.suffix
+    assert equal(utilities.load_pickle(path), obj)
+
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_legacy_pickles(tmp_path, protocol):
+    # uncompressed pickles of any protocol are not taken for zlib streams
+    path = str(tmp_path / "dump")
+    for data in [obj, ["x"], (1, 2), "text", 7]:
+        with open(path, "wb") as f:
+            pickle.dump(data, f, protocol=protocol)
+        with open(path, "rb") as f:
+            assert utilities.detect_codec(f.read(8)).name == "none"
+        loaded = utilities.load_pickle(path)
+        assert equal(loaded, obj) if data is obj else loaded == data
+
+    # site dumps written with lzma.open before codecs were added
+    with lzma.open(path, "wb") as f:
+        pickle.dump(obj, f, protocol=protocol)
+    assert equal(utilities.load_pickle(path), obj)
+
+
+def test_truncated_zlib_dump(tmp_path):
+    path = str(tmp_path / "dump.zz")
+    utilities.dump_pickle(obj, path, "zlib")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    with pytest.raises(EOFError):
+        utilities.load_pickle(path)
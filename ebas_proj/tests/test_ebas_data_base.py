@@ -0,0 +1,182 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import write_synthetic_file
+from ebas_importer import EbasData
+from ebas_proj import EbasDataBase
+from ebas_proj.catalogue_db import CatalogueMapping
+from ebas_proj.ebas_data_file import EbasFiles
+
+sites = ["DE0001R", "FR0002R", "NO0003R"]
+
+
+def build(tmp_path, monkeypatch, rollups=(), use_value_index=True):
+    # weekly records, many of them cross month edges
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "raw").mkdir()
+    for i, site in enumerate(sites):
+        write_synthetic_file(str(tmp_path / "raw" / f"{site}.synthetic.nc"), site, ("ozone", "nitrate"), rows=60,
+                             resolution=np.timedelta64(7, "D"), seed=i)
+    d = EbasData(str(tmp_path / "raw"), compression=None, backend="serial")
+    d.get_site_infor()
+    if use_value_index:
+        d.create_value_index()
+        d.get_site_infor(use_value_index=True)
+    d.import_site_data(rollups=rollups)
+    return d
+
+
+def open_db(**kwargs):
+    return EbasDataBase("site_infor.xz", data_path="ebas_proj_dump", compression=None, **kwargs)
+
+
+def test_selected_db_stays_within_cache_bytes(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    full = open_db()
+    full.select_db({})
+    expected = full.get_selected_db()
+
+    db = open_db(cache_bytes=1)
+    db.select_db({})
+    res = db.get_selected_db()
+
+    assert res.equals(expected)
+    # every site is read once and only the last one is kept
+    assert db.report.counters["site_cache_misses"] == len(sites)
+    assert len(db.db.keys()) == 1
+
+
+def test_selected_db_loads_batches_within_cache_bytes(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    batches = []
+    load_files = EbasFiles.load_files
+    monkeypatch.setattr(EbasFiles, "load_files",
+                        lambda files, **kwargs: batches.append(len(files)) or load_files(files, **kwargs))
+
+    full = open_db()
+    full.select_db({})
+    batches.clear()
+    expected = full.get_selected_db()
+    # every site in one parallel load
+    assert batches == [len(sites)]
+
+    site_nbytes = max(full.db.sizes.values())
+    db = open_db(cache_bytes=2 * site_nbytes)
+    db.select_db({})
+    batches.clear()
+    res = db.get_selected_db()
+
+    assert res.equals(expected)
+    # the first site sets the estimate of the others, which fit the budget together
+    assert batches == [len(sites) - 1]
+    assert db.report.counters["site_cache_misses"] == len(sites)
+    assert db.db.nbytes <= 2 * site_nbytes
+
+
+def test_rollups_equal_raw_aggregation(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch, rollups=("M",))
+    db = open_db()
+    # month edges, records crossing them count with their part inside the range in both paths
+    db.select_db({"st": np.datetime64("2000-02-01"), "ed": np.datetime64("2000-09-01")})
+    raw = db.aggregate("M", use_rollups=False)
+    assert db.report.counters["site_cache_misses"] == len(sites)
+    res = db.aggregate("M")
+    assert db.report.counters["site_cache_misses"] == len(sites)
+
+    assert len(res) == len(sites) * 2 * 7
+    assert res["st"].min() == np.datetime64("2000-02-01") and res["ed"].max() == np.datetime64("2000-09-01")
+    for k in ["site", "component", "st", "ed", "count"]:
+        assert np.array_equal(res[k], raw[k])
+    for k in ["mean", "min", "max", "coverage"]:
+        assert np.allclose(res[k], raw[k], equal_nan=True)
+
+
+def test_site_loads_do_not_list_the_catalogue(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    open_db().export_catalogue("ebas_catalogue.sqlite")
+    db = EbasDataBase("ebas_catalogue.sqlite", data_path="ebas_proj_dump", compression=None)
+    db.select_db({})
+
+    listed = []
+    keys = CatalogueMapping.keys
+    monkeypatch.setattr(CatalogueMapping, "keys", lambda self: listed.append(1) or keys(self))
+    db.aggregate("M", use_rollups=False)
+    assert db.report.counters["site_cache_misses"] == len(sites)
+    assert listed == []
+
+
+def test_rollups_written_after_opening_are_used(tmp_path, monkeypatch):
+    d = build(tmp_path, monkeypatch)
+    db = open_db()
+    db.select_db({})
+    expected = db.aggregate("M")
+    assert db.report.counters["site_cache_misses"] == len(sites)
+
+    d.import_site_data(rollups=("M",))
+    res = db.aggregate("M")
+    # answered from the new rollups, without loading any site
+    assert db.report.counters["site_cache_misses"] == len(sites)
+    assert np.allclose(res["mean"], expected["mean"], equal_nan=True)
+
+    os.remove(d.data_importer.get_rollup_path(sites[0]))
+    db.aggregate("M")
+    assert db.report.counters["site_cache_misses"] == len(sites) + 1
+
+
+@pytest.mark.parametrize("use_value_index", [True, False])
+def test_summary_values(tmp_path, monkeypatch, use_value_index):
+    build(tmp_path, monkeypatch, use_value_index=use_value_index)
+    db = open_db()
+
+    assert sorted(db.summary["components"]) == ["nitrate", "ozone"]
+    assert db.summary["matrix"] == ["air"]
+    assert db.summary_attr("unit") == ["ug/m3"]
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 1, 25, 58, 10000])
+def test_chunks_concatenate_to_selected_db(tmp_path, monkeypatch, chunk_rows):
+    build(tmp_path, monkeypatch)
+    db = open_db()
+    # 29 records of each content inside the time range, 174 in all
+    db.select_db({"st": np.datetime64("2000-02-01"), "ed": np.datetime64("2000-09-01")})
+    expected = db.get_selected_db(use_number_index=False)
+
+    chunks = list(db.iter_selected_db(use_number_index=False, chunk_rows=chunk_rows))
+    assert pd.concat(chunks, ignore_index=True).equals(expected)
+    if chunk_rows is None:
+        assert len(chunks) == len(sites)
+    else:
+        # 25 splits inside records, 58 ends with the records of a site, 10000 is more than the selection
+        assert [len(c) for c in chunks[:-1]] == [chunk_rows] * (len(chunks) - 1)
+        assert 0 < len(chunks[-1]) <= chunk_rows
+
+    batches = list(db.iter_selected_db(chunk_rows=chunk_rows, as_frame=False))
+    expected = db.get_selected_db()
+    for k in EbasDataBase.result_columns:
+        assert np.array_equal(np.concatenate([b[k] for b in batches]), expected[k].to_numpy(), equal_nan=k == "val")
+
+
+def test_typed_columns(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    db = open_db()
+    db.select_db({})
+    codes = db.get_selected_db()
+    res = db.get_selected_db(use_number_index=False, val_dtype=np.float32, qc_column=True)
+
+    assert res["st"].dtype == "datetime64[ns]" and res["ed"].dtype == "datetime64[ns]"
+    assert res["val"].dtype == np.float32 and res["qc"].dtype == np.uint16
+    assert np.array_equal(res["val"], codes["val"].astype(np.float32), equal_nan=True)
+    assert all(codes[k].dtype == np.int32 for k in EbasDataBase.code_columns)
+
+    for k in EbasDataBase.code_columns:
+        assert isinstance(res[k].dtype, pd.CategoricalDtype)
+        assert list(res[k].cat.categories) == db.value_index.get_values(k)
+        assert np.array_equal(res[k].cat.codes, codes[k])
+    assert sorted(res["site"].unique()) == sites
+    assert sorted(res["component"].unique()) == ["nitrate", "ozone"]
+    assert list(res["unit"].unique()) == ["ug/m3"] and list(res["matrix"].unique()) == ["air"]
+
+    batch = next(db.iter_selected_db(use_number_index=False, as_frame=False))
+    assert batch["component"].dtype == object
+    assert list(batch["component"]) == list(res["component"][:len(batch["component"])])
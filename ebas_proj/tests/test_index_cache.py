@@ -0,0 +1,67 @@
+import os
+from ebas_importer.index_cache import IndexCache
+from ebas_importer.data_importer import EbasFtpDataImporter
+
+
+def record(site_id):
+    return {site_id: {"id": site_id, "files": {}}}
+
+
+def write(path, data, mtime_ns=None):
+    path.write_bytes(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_changed_and_removed_files(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for f in ["a.nc", "b.nc", "c.nc"]:
+        write(raw / f, b"data", 10**18)
+    cache_path = str(tmp_path / "cache.xz")
+
+    cache = IndexCache(cache_path)
+    stale, removed, fingerprints = cache.diff(str(raw), ["a.nc", "b.nc", "c.nc"])
+    assert sorted(stale) == ["a.nc", "b.nc", "c.nc"] and removed == []
+    cache.update({f: record(f[0]) for f in stale}, fingerprints)
+    cache.dump()
+
+    # b.nc changed size, c.nc changed mtime only, a.nc was archived
+    write(raw / "b.nc", b"more data", 10**18)
+    write(raw / "c.nc", b"data", 2 * 10**18)
+    os.remove(raw / "a.nc")
+    cache = IndexCache(cache_path)
+    stale, removed, fingerprints = cache.diff(str(raw), ["b.nc", "c.nc"])
+    assert sorted(stale) == ["b.nc", "c.nc"] and removed == ["a.nc"]
+
+    cache.drop(removed)
+    assert cache.records() == [record("b"), record("c")]
+
+
+def test_options_invalidate_cache(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    write(raw / "a.nc", b"data")
+    cache_path = str(tmp_path / "cache.xz")
+
+    cache = IndexCache(cache_path, options={"use_value_index": False})
+    _, _, fingerprints = cache.diff(str(raw), ["a.nc"])
+    cache.update({"a.nc": record("a")}, fingerprints)
+    cache.dump()
+
+    assert IndexCache(cache_path, options={"use_value_index": False}).diff(str(raw), ["a.nc"])[0] == []
+    assert IndexCache(cache_path, options={"use_value_index": True}).diff(str(raw), ["a.nc"])[0] == ["a.nc"]
+
+
+def test_error_records_are_not_cached(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    write(raw / "a.nc", b"data")
+    write(raw / "bad.nc", b"not netcdf")
+    cache = IndexCache(str(tmp_path / "cache.xz"))
+    _, _, fingerprints = cache.diff(str(raw), ["a.nc", "bad.nc"])
+    cache.update({"a.nc": record("a"), "bad.nc": EbasFtpDataImporter.error_record("bad.nc", OSError("bad"))},
+                 fingerprints)
+
+    assert cache.records() == [record("a")]
+    assert cache.diff(str(raw), ["a.nc", "bad.nc"])[0] == ["bad.nc"]
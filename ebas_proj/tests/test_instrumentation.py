@@ -0,0 +1,53 @@
+import json
+import pytest
+from utilities import RunReport
+from benchmarks.synthetic import generate_dataset
+from ebas_importer import EbasData
+
+
+def test_stage_sums_worker_records(tmp_path):
+    events = []
+    report = RunReport(events.append)
+    worker = RunReport()
+    worker.record_file("get_indexing", "a.nc", open_s=0.5, rows=10, bytes_read=100)
+    worker.record_file("get_indexing", "b.nc", open_s=2.0, rows=5, bytes_read=50)
+    worker.record_failure("get_indexing", "c.nc", ValueError("broken"))
+    worker.count("index_cache_misses", 3)
+
+    with report.stage("get_site_infor"):
+        with report.stage("worker_get_indexing"):
+            report.extend(worker.drain())
+        report.add(bytes_written=7)
+
+    inner, outer = report.stages
+    assert inner["parent"] == "get_site_infor"
+    assert inner["files"] == 2 and inner["rows"] == 15 and inner["bytes_read"] == 150
+    assert outer["bytes_written"] == 7 and outer["error"] is None
+    assert report.failures[0]["item"] == "c.nc"
+    assert report.counters == {"index_cache_misses": 3}
+    assert worker.drain() == {"files": [], "failures": [], "counters": {}}
+    assert list(report.slowest_files(1)["file"]) == ["b.nc"]
+    assert [e["kind"] for e in events] == ["file", "file", "failure", "stage", "stage"]
+
+    report.to_json(str(tmp_path / "report.json"))
+    with open(tmp_path / "report.json") as f:
+        assert len(json.load(f)["stages"]) == 2
+
+
+def test_stage_records_error():
+    report = RunReport()
+    with pytest.raises(KeyError):
+        with report.stage("init_db"):
+            raise KeyError("site")
+    assert report.stages[0]["error"] == "KeyError('site')"
+
+
+def test_thread_workers_report_every_file(tmp_path, monkeypatch):
+    # site information is written to the working directory
+    monkeypatch.chdir(tmp_path)
+    files = generate_dataset(str(tmp_path / "raw"), sites=4, files_per_site=3, rows=24)
+    d = EbasData(str(tmp_path / "raw"), compression=None, backend="thread")
+    d.get_site_infor()
+
+    recorded = [f["file"] for f in d.report.files if f["stage"] == "get_indexing"]
+    assert sorted(recorded) == sorted(files)
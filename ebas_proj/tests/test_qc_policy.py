@@ -0,0 +1,21 @@
+import numpy as np
+from ebas_proj import EbasDataBase
+from ebas_importer.site_store import SiteStore
+
+
+def test_qc_invalid():
+    qc = np.array([0, 459, 999, 100, 0], dtype=np.uint16)
+
+    assert EbasDataBase.qc_invalid(qc).tolist() == [False, True, True, False, False]
+    assert not EbasDataBase.qc_invalid(qc, None).any()
+    assert EbasDataBase.qc_invalid(qc, [100]).tolist() == [False, False, False, True, False]
+    assert EbasDataBase.qc_invalid(qc, lambda q: q > 0).sum() == 3
+
+
+def test_site_store_keeps_qc(tmp_path):
+    path = str(tmp_path / "site.ebas")
+    data = {0: {"ts": np.zeros((3, 2), dtype="datetime64[ns]"), "val": np.ones((3, 1)),
+                "qc": np.array([0, 459, 0], dtype=np.uint16)}}
+    SiteStore.write(path, {0: {}}, data)
+
+    assert SiteStore(path)[0]["qc"].tolist() == [0, 459, 0]
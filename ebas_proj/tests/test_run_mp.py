@@ -0,0 +1,36 @@
+import pytest
+import utilities
+
+
+def square(x):
+    return x * x
+
+
+def append(acc, r):
+    acc.append(r)
+    return acc
+
+
+def init_offset(offset):
+    global _offset
+    _offset = offset
+
+
+def add_offset(x):
+    return x + _offset
+
+
+@pytest.mark.parametrize("backend", ["serial", "thread", "process"])
+def test_backends_agree(backend):
+    args = list(range(50))
+    expected = [x * x for x in args]
+
+    assert utilities.run_mp(square, args, backend=backend, max_workers=3) == expected
+    assert utilities.run_mp(square, args, combine_func=sum, chunksize=7, backend=backend, max_workers=3) == \
+        sum(expected)
+    # a reducer folds results as chunks complete, their order is not fixed
+    reduced = utilities.run_mp(square, args, reducer=append, initial=[], backend=backend, max_workers=3)
+    assert sorted(reduced) == expected
+    assert utilities.run_mp(add_offset, args, initializer=init_offset, initargs=(100,),
+                            backend=backend, max_workers=3) == [x + 100 for x in args]
+    assert utilities.run_mp(square, [], backend=backend) == []
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pytest
+import utilities
+from utilities import share_arrays, attach_arrays, SharedArrays
+
+
+def test_share_and_attach(tmp_path):
+    ts = np.arange(20000).astype("datetime64[ns]").reshape(-1, 2)
+    site = {"content_index": {"a": {"st": 1}},
+            "a": {"ts": ts, "val": np.linspace(0, 1, 10000).reshape(-1, 1), "qc": np.zeros(3, dtype=np.uint16)}}
+
+    shared = share_arrays([site], min_bytes=1024, dir=str(tmp_path))
+    assert isinstance(shared, SharedArrays)
+    assert len(os.listdir(tmp_path)) == 1
+
+    # a second link keeps the file readable after attach_arrays removes it
+    os.link(shared.path, str(tmp_path / "link"))
+    res = attach_arrays(shared)[0]
+    assert os.listdir(tmp_path) == ["link"]
+    assert res["content_index"] == site["content_index"]
+    for k in ["ts", "val", "qc"]:
+        assert res["a"][k].dtype == site["a"][k].dtype
+        assert np.array_equal(res["a"][k], site["a"][k])
+    # copy on write, the arrays can be changed without changing the file or other views of it
+    res["a"]["val"][0] = 5
+    assert res["a"]["val"][0, 0] == 5
+    other = attach_arrays(SharedArrays(shared.obj, str(tmp_path / "link")))[0]
+    assert np.array_equal(other["a"]["val"], site["a"]["val"])
+    # small arrays are pickled as usual
+    small = {"qc": site["a"]["qc"]}
+    assert share_arrays(small, min_bytes=1024) is small
+
+
+def fail_on_three(i):
+    if i == 3:
+        raise ValueError("three")
+    return np.zeros(100000)
+
+
+def test_failed_run_leaves_no_shared_files():
+    def shared_files():
+        return {f for f in os.listdir(utilities.shared_dir()) if f.startswith("ebas_shared_")}
+
+    before = shared_files()
+    with pytest.raises(ValueError):
+        utilities.run_mp(fail_on_three, list(range(8)), chunksize=1, max_workers=2, shared=True)
+    assert shared_files() == before
@@ -0,0 +1,30 @@
+import numpy as np
+from ebas_proj.site_cache import SiteCache
+
+
+def site(rows):
+    return {0: {"ts": np.zeros((rows, 2), dtype="datetime64[ns]"), "val": np.zeros((rows, 1))}}
+
+
+def test_site_cache_evicts_least_recently_used():
+    cache = SiteCache(max_bytes=2 * 24 * 10)
+    cache.put("a", site(10))
+    cache.put("b", site(10))
+    cache.get("a")
+    cache.put("c", site(10))
+
+    assert list(cache.keys()) == ["a", "c"]
+    assert cache.stats()["hits"] == 1
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_site_cache_keeps_pinned_sites():
+    cache = SiteCache(max_bytes=24 * 10)
+    cache.put("a", site(10))
+    cache.pin(["a"])
+    cache.put("b", site(10))
+
+    assert "a" in cache and "b" in cache
+    cache.unpin(["a"])
+    assert "a" not in cache
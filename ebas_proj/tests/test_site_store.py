@@ -0,0 +1,20 @@
+import numpy as np
+from ebas_importer.site_store import SiteStore
+
+
+def test_site_store_round_trip(tmp_path):
+    ts = np.array([["2010-01-01", "2010-01-02"], ["2010-01-02", "2010-01-03"]], dtype="datetime64[ns]")
+    data = {0: {"ts": ts, "val": np.array([[1.0], [np.nan]])},
+            1: {"ts": ts[:0], "val": np.empty((0, 1))}}
+    content_index = {0: {"component": "ozone"}, 1: {"component": "nitrate"}}
+    path = str(tmp_path / "AM0001R.ebas")
+
+    SiteStore.write(path, content_index, data)
+    store = SiteStore(path)
+
+    assert SiteStore.is_store(path)
+    assert store.content_index == content_index
+    assert list(store.keys()) == [0, 1]
+    assert np.array_equal(store[0]["ts"], ts)
+    assert np.array_equal(store[0]["val"], data[0]["val"], equal_nan=True)
+    assert store[1]["val"].shape == (0, 1)
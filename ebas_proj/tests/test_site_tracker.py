@@ -0,0 +1,51 @@
+import os
+import shutil
+import pickle
+import utilities
+from benchmarks.synthetic import generate_dataset
+from ebas_importer import EbasData
+from ebas_importer.site_tracker import DirtySiteTracker
+
+
+def test_sync_imports_only_dirty_sites(tmp_path, monkeypatch):
+    # dumps, rollups, the database index and the tracker are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    raw = str(tmp_path / "raw")
+    files = generate_dataset(raw, sites=3, files_per_site=2, rows=24)
+    # the third file of the first site is published after the first import
+    new = generate_dataset(str(tmp_path / "remote"), sites=1, files_per_site=3, rows=24)[2]
+
+    d = EbasData(raw, compression=None, backend="serial")
+    d.get_site_infor()
+    d.import_site_data(rollups=("M",))
+    assert sorted(os.listdir("ebas_proj_rollup")) == ["DE0000R.rollup", "FR0001R.rollup", "NO0002R.rollup"]
+
+    # the last site is no longer published, its files are archived
+    catalogue = {f: {"size": "1 Kbytes", "modified": "2021-01-01T00:00:00Z"}
+                 for f in files + [new] if not f.startswith("NO0002R")}
+    monkeypatch.setattr(d.data_checker, "get_catalogue", lambda: catalogue)
+    def download_files(names):
+        for f in names:
+            shutil.copy(str(tmp_path / "remote" / f), raw)
+        return []
+    monkeypatch.setattr(d.data_checker, "download_files", download_files)
+    d.check_updates(download=True, print_file=False)
+    assert d.site_tracker.sites() == ["DE0000R", "NO0002R"]
+
+    d.get_site_infor()
+    d.report = utilities.RunReport()
+    d.import_site_data(only_dirty=True, rollups=("M",))
+
+    # only the site with a new file is imported again
+    imported = [f["file"] for f in d.report.files if f["stage"] == "get_site_data"]
+    assert sorted(imported) == sorted([f for f in files if f.startswith("DE0000R")] + [new])
+    assert sorted(os.listdir("ebas_proj_rollup")) == ["DE0000R.rollup", "FR0001R.rollup"]
+    assert not os.path.exists(d.data_importer.get_dump_path("NO0002R"))
+
+    with open("ebas_db_index.dump", "rb") as f:
+        db_index = pickle.load(f)
+    assert sorted(db_index.keys()) == ["DE0000R", "FR0001R"]
+    assert new in [c["file"] for c in db_index["DE0000R"].values()]
+
+    assert d.site_tracker.sites() == []
+    assert DirtySiteTracker().sites() == []
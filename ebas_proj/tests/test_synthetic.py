@@ -0,0 +1,114 @@
+import pickle
+import pytest
+import numpy as np
+import utilities
+from benchmarks.synthetic import generate_dataset
+from ebas_importer import EbasData
+from ebas_importer.value_index import ValueIndex
+from ebas_importer.data_importer import EbasFtpDataImporter, init_worker, worker_get_indexing
+
+
+def test_synthetic_files_are_indexed(tmp_path, monkeypatch):
+    # site dumps are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    files = generate_dataset(str(tmp_path), sites=2, files_per_site=2, rows=48, components_per_file=2, revisions=3)
+    importer = EbasFtpDataImporter(str(tmp_path), None)
+    infor = importer.combine_infor([importer.get_indexing(f) for f in files])
+
+    assert sorted(infor.keys()) == ["DE0000R", "FR0001R"]
+    site = infor["DE0000R"]
+    assert site["file_num"] == 2 and isinstance(site["alt"], float)
+    contents = site["files"][files[1]]["contents"]
+    assert [c["component"] for c in contents] == ["nitrate", "sulphate_total"]
+    assert contents[0]["st"] == np.datetime64("2000-01-03T00")
+
+    data = importer.get_site_data(site["files"])
+    assert len(data["DE0000R"]) == 4
+
+
+def test_fast_scan_matches_xarray(tmp_path):
+    files = generate_dataset(str(tmp_path), sites=2, files_per_site=1, rows=24, components_per_file=3, revisions=2)
+    importer = EbasFtpDataImporter(str(tmp_path), None)
+    fast = [importer.get_indexing(f) for f in files]
+    importer.fast_scan = False
+    full = [importer.get_indexing(f) for f in files]
+
+    assert repr(fast) == repr(full)
+    assert importer.report.counters == {}
+
+
+def test_error_records_have_no_files(tmp_path):
+    files = generate_dataset(str(tmp_path), sites=1, files_per_site=1, rows=24)
+    (tmp_path / "XX0000R.bad.nc").write_bytes(b"not a netcdf file")
+    importer = EbasFtpDataImporter(str(tmp_path), None)
+    infor = importer.combine_infor([importer.get_indexing(f) for f in files + ["XX0000R.bad.nc"]])
+
+    assert "error" in infor["XX0000R.bad.nc"] and "files" not in infor["XX0000R.bad.nc"]
+    assert [k for k in infor.keys() if "files" in infor[k]] == ["DE0000R"]
+
+
+def test_failed_file_leaves_nothing_in_the_dump(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    files = generate_dataset(str(tmp_path), sites=1, files_per_site=2, rows=24, components_per_file=2)
+    importer = EbasFtpDataImporter(str(tmp_path), None)
+    site = importer.combine_infor([importer.get_indexing(f) for f in files])["DE0000R"]
+    # the second content of the last file can not be read
+    site["files"][files[1]]["contents"][1]["var"] = "missing"
+
+    db_index = importer.get_site_data(site["files"])["DE0000R"]
+    assert [c["file"] for c in db_index.values()] == [files[0], files[0]]
+    data = utilities.load_pickle(importer.get_dump_path("DE0000R"))
+    assert sorted(k for k in data.keys() if k != "content_index") == [0, 1]
+    assert importer.report.failures[0]["item"] == files[1]
+
+
+def test_fast_scan_with_thread_workers(tmp_path):
+    # netCDF4 is not thread safe, scanning headers in threads crashed the interpreter without the lock
+    files = generate_dataset(str(tmp_path), sites=40, files_per_site=3, rows=24)
+    args = (str(tmp_path), None, "pickle", True, False)
+    init_worker(*args)
+    serial = [worker_get_indexing(f) for f in files]
+    for _ in range(3):
+        threaded = utilities.run_mp(worker_get_indexing, files, backend="thread", max_workers=16, chunksize=1,
+                                    initializer=init_worker, initargs=args)
+        assert repr(threaded) == repr(serial)
+
+
+@pytest.mark.parametrize("use_value_index", [False, True])
+def test_ingest_equals_indexing_and_import(tmp_path, monkeypatch, use_value_index):
+    raw = str(tmp_path / "raw")
+    files = generate_dataset(raw, sites=3, files_per_site=2, rows=24, components_per_file=2)
+    sites = sorted(set(f.split(".")[0] for f in files))
+    res = {}
+    for name in ["two_pass", "ingest"]:
+        # each run writes its own site information, dumps, database index and value index
+        (tmp_path / name).mkdir()
+        monkeypatch.chdir(tmp_path / name)
+        d = EbasData(raw, compression=None, backend="serial")
+        if name == "two_pass":
+            d.get_site_infor(use_value_index=use_value_index)
+            d.import_site_data()
+        else:
+            d.ingest(use_value_index=use_value_index)
+        with open("ebas_db_index.dump", "rb") as f:
+            db_index = pickle.load(f)
+        dumps = {site: utilities.load_pickle(d.data_importer.get_dump_path(site)) for site in sites}
+        # ingest dumps keep values new to the value index as values, the database encodes them when loading
+        for dump in dumps.values():
+            for c in dump["content_index"].values():
+                d.value_index.encode_content(c)
+        res[name] = (utilities.load_pickle("site_infor.xz"), db_index, dumps, d.value_index)
+
+    (infor, db_index, dumps, value_index), (ingest_infor, ingest_db_index, ingest_dumps, ingest_value_index) = \
+        res["two_pass"], res["ingest"]
+    assert ingest_infor == infor
+    assert ingest_db_index == db_index
+    for attr in ValueIndex.attrs:
+        assert ingest_value_index.get_values(attr) == value_index.get_values(attr)
+    for site in sites:
+        assert ingest_dumps[site]["content_index"] == dumps[site]["content_index"] == db_index[site]
+        for cid in db_index[site]:
+            for k in ["ts", "val", "qc"]:
+                assert np.array_equal(ingest_dumps[site][cid][k], dumps[site][cid][k], equal_nan=k == "val")
+    if use_value_index:
+        assert isinstance(db_index[sites[0]][0]["component"], int)
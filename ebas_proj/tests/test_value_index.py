@@ -0,0 +1,70 @@
+import pickle
+import os
+import numpy as np
+from ebas_importer.value_index import ValueIndex
+from ebas_importer import EbasData
+from benchmarks.synthetic import generate_dataset, write_synthetic_file
+
+
+def test_append_only_codes(tmp_path):
+    path = str(tmp_path / "value_index")
+    index = ValueIndex(path)
+    index.update_index("component", ["nitrate", "ozone"])
+    index.update_index("component", ["ammonia", "nitrate", "ozone"])
+
+    assert index.get_values("component") == ["nitrate", "ozone", "ammonia"]
+    assert index.component["ozone"] == 1
+    assert index.encode("component", np.array([["ozone", "x"], [None, "ammonia"]])).tolist() == [[1, -1], [-1, 2]]
+    assert index.decode("component", [2, 0, -1]).tolist() == ["ammonia", "nitrate", None]
+
+    reloaded = ValueIndex(path)
+    assert reloaded.version == 2
+    assert reloaded.get_values("component") == ["nitrate", "ozone", "ammonia"]
+
+
+def test_load_legacy_value_index(tmp_path):
+    path = str(tmp_path / "value_index")
+    with open(path, "wb") as pickle_file:
+        pickle.dump({"matrix": {0: "air", "air": 0}, "unit": {}, "res_code": {},
+                     "component": {0: "nitrate", "nitrate": 0, 1: "ozone", "ozone": 1},
+                     "site": {0: "DE0001R", "DE0001R": 0}}, pickle_file)
+
+    index = ValueIndex(path)
+    assert index.get_values("component") == ["nitrate", "ozone"]
+    assert index.site["DE0001R"] == 0
+    assert len(index.unit) == 0
+
+
+def test_appends_of_other_processes_are_kept(tmp_path):
+    path = str(tmp_path / "value_index")
+    a = ValueIndex(path)
+    b = ValueIndex(path)
+    a.update_index("component", ["ozone"])
+    # b was loaded before, it reloads the newer version before appending
+    b.update_index("component", ["nitrate"])
+
+    assert ValueIndex(path).get_values("component") == ["ozone", "nitrate"]
+    assert ValueIndex(path).version == 2
+    assert b.encode_content({"component": "ozone", "unit": "ppb"}) == {"component": 0, "unit": "ppb"}
+
+
+def test_incremental_indexing_adds_new_values(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generate_dataset(str(tmp_path / "raw"), sites=2, files_per_site=1, rows=24)
+    d = EbasData(str(tmp_path / "raw"), compression=None)
+    d.get_site_infor()
+    d.create_value_index()
+    d.get_site_infor(use_value_index=True, incremental=True)
+    components = d.value_index.get_values("component")
+
+    # a new site measuring a new component
+    write_synthetic_file(str(tmp_path / "raw" / "NO0042R.new.nc"), "NO0042R", ("pm10_mass", "ozone"), rows=24)
+    d.raw_data_files = os.listdir(str(tmp_path / "raw"))
+    d.get_site_infor(use_value_index=True, incremental=True)
+
+    index = ValueIndex()
+    assert index.get_values("component") == components + ["pm10_mass"]
+    contents = d.site_infor["NO0042R"]["files"]["NO0042R.new.nc"]["contents"]
+    assert index.decode("component", [c["component"] for c in contents]).tolist() == ["pm10_mass", "ozone"]
+    assert index.decode("site", [contents[0]["site"]]).tolist() == ["NO0042R"]
+    assert sorted(d.site_infor["NO0042R"]["components"].keys()) == sorted(c["component"] for c in contents)
@@ -1,8 +1,12 @@
 from .utilities import *
+from .downloader import *
+from .dump_codecs import *
+from .instrumentation import *
+from .shared_arrays import *
 
 # __all__=[
 #    "run_mp",
 #    "list2csv",
 #    "list2dict",
 #    "list2set"
-# ]
\ No newline at end of file
+# ]
@@ -0,0 +1,108 @@
+import concurrent.futures
+import os
+import re
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from .utilities import list2csv
+
+__all__ = [
+   "download_concurrent",
+   "download_file",
+]
+
+def download_concurrent(files, out_path, url="https://thredds.nilu.no/thredds/fileServer/ebas/",
+                        max_workers=8, retries=3, backoff=1.0, timeout=60, error_file="errors.csv"):
+   """this method downloads files with a bounded thread pool sharing one keep-alive session
+
+   Args:
+       files (list): file names relative to url
+       out_path (str): output directory
+       url (str, optional): file server. Defaults to EBAS thredds file server.
+       max_workers (int, optional): concurrent downloads. Defaults to 8.
+       retries (int, optional): retries per file, partial downloads are resumed. Defaults to 3.
+       backoff (float, optional): first retry delay in seconds, doubled every retry. Defaults to 1.0.
+       timeout (int, optional): connect/read timeout in seconds. Defaults to 60.
+       error_file (str, optional): csv listing failed files, not written if None. Defaults to "errors.csv".
+
+   Returns:
+       list: [[file], ...] of failed files, same as download_ftp
+   """
+   session = requests.Session()
+   adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+   session.mount("http://", adapter)
+   session.mount("https://", adapter)
+
+   errors = []
+   with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+      with tqdm(total=len(files), desc="downloading...") as progress:
+         futures = {}
+         for f in files:
+            future = pool.submit(download_file, session, url.rstrip("/") + "/" + f, os.path.join(out_path, f),
+                                 retries, backoff, timeout)
+            futures[future] = f
+
+         for future in concurrent.futures.as_completed(futures):
+            try:
+               future.result()
+            except Exception as e:
+               print(e)
+               errors.append([futures[future]])
+            progress.update()
+
+   session.close()
+   if error_file is not None:
+      list2csv(errors, error_file, header=["error"], single_col=True)
+
+   return errors
+
+def download_file(session, url, path, retries=3, backoff=1.0, timeout=60, chunk_size=1<<16):
+   """this method downloads one file to "path.part", resumes it with a Range request,
+   and renames it to path only when complete.
+
+   Returns:
+       str: path
+   """
+   part = path + ".part"
+   for attempt in range(retries + 1):
+      try:
+         pos = os.path.getsize(part) if os.path.exists(part) else 0
+         headers = {"Range": f"bytes={pos}-"} if pos > 0 else {}
+
+         with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code == 416:
+               # nothing left to fetch if the partial file already has the full size
+               if _content_range_total(r) == pos:
+                  os.replace(part, path)
+                  return path
+               os.remove(part)
+               raise IOError(f"invalid partial download of {url}, restarting.")
+            r.raise_for_status()
+
+            # the server may ignore the Range header and send the whole file
+            resumed = r.status_code == 206
+            expected = int(r.headers["Content-Length"]) if "Content-Length" in r.headers else None
+            received = 0
+            with open(part, "ab" if resumed else "wb") as f:
+               for chunk in r.iter_content(chunk_size):
+                  f.write(chunk)
+                  received += len(chunk)
+
+            if expected is not None and received < expected:
+               raise IOError(f"incomplete download of {url}: {received}/{expected} bytes.")
+
+         os.replace(part, path)
+         return path
+
+      except (requests.RequestException, IOError) as e:
+         status = getattr(getattr(e, "response", None), "status_code", None)
+         # client errors will not go away by retrying
+         if attempt == retries or (status is not None and 400 <= status < 500 and status not in [408, 429]):
+            raise
+         time.sleep(backoff * 2 ** attempt)
+
+def _content_range_total(response):
+   match = re.search(r"/(\d+)", response.headers.get("Content-Range", ""))
+   return int(match.group(1)) if match else None
@@ -0,0 +1,202 @@
+import io
+import bz2
+import lzma
+import pickle
+import time
+import zlib
+import pandas as pd
+
+try:
+   import zstandard
+except ImportError:
+   zstandard = None
+
+try:
+   import lz4.frame
+except ImportError:
+   lz4 = None
+
+__all__ = [
+   "Codec",
+   "get_codec",
+   "list_codecs",
+   "detect_codec",
+   "dump_pickle",
+   "load_pickle",
+   "benchmark_codecs",
+]
+
+class Codec:
+   """
+   compression used for pickled dumps and indexes:
+   1. name, e.g. "none", "zlib-6", "lzma-1", as given by the compression parameter
+   2. suffix of dump files
+   3. compress/decompress of bytes
+   4. open, a streaming reader of a compressed file object, so dumps are not read whole before unpickling
+   """
+
+   def __init__(self, name, suffix, compress, decompress, open):
+      self.name = name
+      self.suffix = suffix
+      self.compress = compress
+      self.decompress = decompress
+      self.open = open
+
+   def __repr__(self):
+      return f"Codec({self.name})"
+
+
+def _identity(data):
+   return data
+
+class _ZlibReader(io.RawIOBase):
+   # streaming reader of a zlib stream, the standard library only streams gzip
+
+   def __init__(self, f, chunk=1 << 20):
+      self.f = f
+      self.chunk = chunk
+      self.decompressor = zlib.decompressobj()
+
+   def readable(self):
+      return True
+
+   def readinto(self, b):
+      while True:
+         if self.decompressor.unconsumed_tail:
+            out = self.decompressor.decompress(self.decompressor.unconsumed_tail, len(b))
+         elif self.decompressor.eof:
+            return 0
+         else:
+            data = self.f.read(self.chunk)
+            if not data:
+               raise EOFError("compressed file ended before the end-of-stream marker was reached.")
+            out = self.decompressor.decompress(data, len(b))
+         if len(out) > 0:
+            b[:len(out)] = out
+            return len(out)
+
+def _open_zlib(f):
+   return io.BufferedReader(_ZlibReader(f), buffer_size=1 << 20)
+
+def _codecs():
+   codecs = {"none": Codec("none", "", _identity, _identity, _identity)}
+
+   codecs["zlib"] = Codec("zlib", ".zz", lambda d: zlib.compress(d, 6), zlib.decompress, _open_zlib)
+   for level in range(1, 10):
+      codecs[f"zlib-{level}"] = Codec(f"zlib-{level}", ".zz", lambda d, l=level: zlib.compress(d, l), zlib.decompress,
+                                      _open_zlib)
+
+   # "xz" is the historical name used by the compression parameter
+   for name in ["xz", "lzma"]:
+      codecs[name] = Codec(name, ".xz", lzma.compress, lzma.decompress, lzma.LZMAFile)
+   for preset in range(0, 10):
+      codecs[f"lzma-{preset}"] = Codec(f"lzma-{preset}", ".xz",
+                                       lambda d, p=preset: lzma.compress(d, preset=p), lzma.decompress, lzma.LZMAFile)
+
+   codecs["bz2"] = Codec("bz2", ".bz2", bz2.compress, bz2.decompress, bz2.BZ2File)
+
+   # faster codecs, only if installed
+   if zstandard is not None:
+      open_zstd = lambda f: io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=False))
+      codecs["zstd"] = Codec("zstd", ".zst", lambda d: zstandard.ZstdCompressor(level=3).compress(d),
+                             lambda d: zstandard.ZstdDecompressor().decompress(d), open_zstd)
+      for level in [1, 9, 19]:
+         codecs[f"zstd-{level}"] = Codec(f"zstd-{level}", ".zst",
+                                         lambda d, l=level: zstandard.ZstdCompressor(level=l).compress(d),
+                                         lambda d: zstandard.ZstdDecompressor().decompress(d), open_zstd)
+   if lz4 is not None:
+      codecs["lz4"] = Codec("lz4", ".lz4", lz4.frame.compress, lz4.frame.decompress, lz4.frame.LZ4FrameFile)
+
+   return codecs
+
+CODECS = _codecs()
+
+def list_codecs():
+   return list(CODECS.keys())
+
+def get_codec(name):
+   # None means uncompressed pickle, as for the compression parameter
+   name = "none" if name is None else name
+   if name not in CODECS:
+      raise ValueError(f"unknown compression {name}, available: {', '.join(list_codecs())}.")
+   return CODECS[name]
+
+def detect_codec(header):
+   """this method detects the codec of a file from its first bytes
+
+   Args:
+       header (bytes): at least the first 4 bytes of the file
+
+   Returns:
+       Codec
+   """
+   if header.startswith(b"\xfd7zXZ\x00"):
+      return CODECS["xz"]
+   if header.startswith(b"BZh"):
+      return CODECS["bz2"]
+   if header.startswith(b"\x28\xb5\x2f\xfd"):
+      if "zstd" not in CODECS:
+         raise ValueError("zstd compressed file, but zstandard is not installed.")
+      return CODECS["zstd"]
+   if header.startswith(b"\x04\x22\x4d\x18"):
+      if "lz4" not in CODECS:
+         raise ValueError("lz4 compressed file, but lz4 is not installed.")
+      return CODECS["lz4"]
+   # zlib.compress always writes 0x78, pickles never start with it (protocol 2+ start with 0x80)
+   if len(header) >= 2 and header[0] == 0x78 and (header[0] * 256 + header[1]) % 31 == 0:
+      return CODECS["zlib"]
+   return CODECS["none"]
+
+def dump_pickle(obj, path, compression="xz"):
+   with open(path, "wb") as f:
+      f.write(get_codec(compression).compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
+
+def load_pickle(path):
+   # the codec is detected from the file header, whatever the file suffix is.
+   # the pickle is read from a streaming decompressor, the compressed file is never held in memory
+   with open(path, "rb") as f:
+      codec = detect_codec(f.read(8))
+      f.seek(0)
+      return pickle.load(codec.open(f))
+
+def benchmark_codecs(paths, codecs=None, repeat=3):
+   """this method compares codecs on existing dumps
+
+   Args:
+       paths (list): dump files, any supported codec
+       codecs (list, optional): codec names, all available if None. Defaults to None.
+       repeat (int, optional): timing repeats, the best one is kept. Defaults to 3.
+
+   Returns:
+       pd.DataFrame: ratio, compress and decompress throughput (MB/s of raw pickle) per codec
+   """
+   raw = []
+   for path in paths:
+      with open(path, "rb") as f:
+         data = f.read()
+      raw.append(detect_codec(data[:8]).decompress(data))
+   raw_size = sum(len(r) for r in raw)
+
+   res = []
+   for name in (list_codecs() if codecs is None else codecs):
+      codec = get_codec(name)
+      compress_time = float("inf")
+      decompress_time = float("inf")
+      for _ in range(repeat):
+         t = time.perf_counter()
+         packed = [codec.compress(r) for r in raw]
+         compress_time = min(compress_time, time.perf_counter() - t)
+
+         t = time.perf_counter()
+         for p in packed:
+            codec.decompress(p)
+         decompress_time = min(decompress_time, time.perf_counter() - t)
+
+      packed_size = sum(len(p) for p in packed)
+      res.append({"codec": name,
+                  "size (MB)": packed_size/1024/1024,
+                  "ratio": raw_size/packed_size if packed_size > 0 else float("nan"),
+                  "compress (MB/s)": raw_size/1024/1024/max(compress_time, 1e-9),
+                  "decompress (MB/s)": raw_size/1024/1024/max(decompress_time, 1e-9)})
+
+   return pd.DataFrame(res).sort_values("decompress (MB/s)", ascending=False).reset_index(drop=True)
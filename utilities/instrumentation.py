@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import logging
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+__all__ = [
+   "RunReport",
+   "timed_stage",
+]
+
+class RunReport:
+   """
+   timings of one run, kept as plain records so they can be sent back from worker processes:
+   1. stages: wall and cpu time of a step, e.g. get_site_infor, init_db, nested stages keep their parent
+   2. files: per file timings (open_s, decode_s, serialize_s, cpu_s), bytes_read, bytes_written and rows
+   3. failures: files or sites that raised, with the error
+   4. counters: e.g. cache hits and misses
+   every record is passed to the logger as it is made: a logging.Logger gets it as JSON, a callable gets the dict.
+   the report is written with to_json or to_csv.
+   """
+
+   def __init__(self, logger=None):
+      self.logger = logger
+      self.stages = []
+      self.files = []
+      self.failures = []
+      self.counters = {}
+      self.open_stages = []
+
+   def log(self, kind, record):
+      if self.logger is None:
+         return
+      event = dict(record, kind=kind)
+      if isinstance(self.logger, logging.Logger):
+         self.logger.info(json.dumps(event, default=str))
+      else:
+         self.logger(event)
+
+   @contextmanager
+   def stage(self, name, **fields):
+      """this method times the enclosed code as one stage.
+      rows, bytes and worker cpu of the file records made meanwhile are summed into the stage.
+
+      Yields:
+          dict: the stage record, more fields can be set on it
+      """
+      record = {"stage": name, "parent": self.open_stages[-1]["stage"] if len(self.open_stages) > 0 else None}
+      record.update(fields)
+      first_file = len(self.files)
+      self.open_stages.append(record)
+      wall = time.perf_counter()
+      cpu = time.process_time()
+      try:
+         yield record
+         record["error"] = None
+      except BaseException as e:
+         record["error"] = repr(e)
+         raise
+      finally:
+         record["wall_s"] = time.perf_counter() - wall
+         record["cpu_s"] = time.process_time() - cpu
+         files = self.files[first_file:]
+         record["files"] = len(files)
+         for k in ["rows", "bytes_read", "bytes_written"]:
+            record[k] = record.get(k, 0) + sum(f.get(k) or 0 for f in files)
+         record["worker_cpu_s"] = sum(f.get("cpu_s") or 0 for f in files)
+         self.open_stages.pop()
+         self.stages.append(record)
+         self.log("stage", record)
+
+   def add(self, **fields):
+      # add numbers to the innermost open stage, e.g. rows=len(df)
+      if len(self.open_stages) == 0:
+         return
+      for k, v in fields.items():
+         self.open_stages[-1][k] = self.open_stages[-1].get(k, 0) + v
+
+   def record_file(self, stage, file, **fields):
+      record = {"stage": stage, "file": file, "pid": os.getpid()}
+      record.update(fields)
+      self.files.append(record)
+      self.log("file", record)
+
+   def record_failure(self, stage, item, error):
+      record = {"stage": stage, "item": item, "error": repr(error), "pid": os.getpid()}
+      self.failures.append(record)
+      self.log("failure", record)
+
+   def count(self, name, n=1):
+      self.counters[name] = self.counters.get(name, 0) + n
+
+   def drain(self):
+      # records made since the last drain, e.g. to be returned from a worker process
+      res = {"files": self.files, "failures": self.failures, "counters": self.counters}
+      self.files = []
+      self.failures = []
+      self.counters = {}
+      return res
+
+   def extend(self, drained):
+      # records drained from another report, e.g. of a worker process which has no logger
+      for r in drained["files"]:
+         self.files.append(r)
+         self.log("file", r)
+      for r in drained["failures"]:
+         self.failures.append(r)
+         self.log("failure", r)
+      for k, v in drained["counters"].items():
+         self.count(k, v)
+
+   def clear(self):
+      self.stages = []
+      self.files = []
+      self.failures = []
+      self.counters = {}
+
+   def slowest_files(self, n=10, by="wall_s"):
+      """this method lists the slowest files
+
+      Returns:
+          pd.DataFrame: n file records with the largest by, wall_s is open_s + decode_s + serialize_s
+      """
+      df = pd.DataFrame(self.files)
+      if len(df) == 0:
+         return df
+      df["wall_s"] = df.reindex(columns=["open_s", "decode_s", "serialize_s"]).fillna(0).sum(axis=1)
+      return df.sort_values(by, ascending=False).head(n)
+
+   def to_dict(self):
+      return {"stages": self.stages, "files": self.files, "failures": self.failures, "counters": self.counters}
+
+   def to_json(self, path="run_report.json"):
+      with open(path, "w") as f:
+         json.dump(self.to_dict(), f, indent=1, default=str)
+      print(f"Run report is written to '{path}'.")
+
+   def to_csv(self, path="run_report.csv"):
+      # one row per record, "kind" is stage, file, failure or counter
+      rows = [dict(r, kind="stage") for r in self.stages]
+      rows += [dict(r, kind="file") for r in self.files]
+      rows += [dict(r, kind="failure") for r in self.failures]
+      rows += [{"kind": "counter", "stage": k, "count": v} for k, v in self.counters.items()]
+      pd.DataFrame(rows).to_csv(path, index=False)
+      print(f"Run report is written to '{path}'.")
+
+def timed_stage(name=None):
+   """decorator timing a method as one stage of self.report
+
+   Args:
+       name (str, optional): stage name, the method name if None. Defaults to None.
+   """
+   def decorator(func):
+      @functools.wraps(func)
+      def wrapper(self, *args, **kwargs):
+         with self.report.stage(name or func.__name__):
+            return func(self, *args, **kwargs)
+      return wrapper
+   return decorator
@@ -0,0 +1,151 @@
+import os
+import mmap
+import uuid
+import atexit
+import tempfile
+import numpy as np
+
+__all__ = [
+   "SharedArray",
+   "SharedArrays",
+   "shared_dir",
+   "share_arrays",
+   "attach_arrays",
+   "discard_arrays",
+]
+
+# files that could not be removed while mapped (windows), removed at exit
+_pending_removal = []
+
+class SharedArray:
+   """
+   descriptor of an array written to a shared file, only the descriptor is pickled:
+   1. offset in the file
+   2. dtype and shape
+   """
+
+   def __init__(self, offset, dtype, shape):
+      self.offset = offset
+      self.dtype = dtype
+      self.shape = shape
+
+class SharedArrays:
+   """
+   result of share_arrays:
+   1. obj, the result with its large arrays replaced by SharedArray
+   2. path of the file holding the arrays
+   """
+
+   def __init__(self, obj, path):
+      self.obj = obj
+      self.path = path
+
+def shared_dir():
+   # tmpfs on linux, the files stay in memory and are shared by the page cache
+   if os.path.isdir("/dev/shm"):
+      return "/dev/shm"
+   return tempfile.gettempdir()
+
+def share_arrays(obj, min_bytes=1 << 16, dir=None):
+   """this method writes the large arrays of a result to one file in shared memory,
+   so only small descriptors are pickled back from a worker process. see attach_arrays.
+
+   Args:
+       obj: dicts, lists and tuples are searched for numpy arrays, anything else is kept as is
+       min_bytes (int, optional): smaller arrays are pickled as usual. Defaults to 64 KiB.
+       dir (str, optional): directory of the file, see shared_dir. Defaults to None.
+
+   Returns:
+       SharedArrays, or obj if it has no large arrays
+   """
+   arrays = []
+   def replace(x):
+      if isinstance(x, np.ndarray) and x.dtype != object and x.nbytes >= min_bytes:
+         arrays.append(x)
+         return SharedArray(None, x.dtype, x.shape)
+      elif isinstance(x, dict):
+         return {k: replace(v) for k, v in x.items()}
+      elif isinstance(x, list):
+         return [replace(v) for v in x]
+      elif isinstance(x, tuple):
+         return tuple(replace(v) for v in x)
+      return x
+
+   res = replace(obj)
+   if len(arrays) == 0:
+      return obj
+
+   path = os.path.join(dir or shared_dir(), f"ebas_shared_{os.getpid()}_{uuid.uuid4().hex}")
+   offsets = []
+   try:
+      with open(path, "wb") as f:
+         for a in arrays:
+            # aligned, so the arrays can be viewed in place
+            f.write(b"\0" * (-f.tell() % 64))
+            offsets.append(f.tell())
+            np.ascontiguousarray(a).tofile(f)
+   except BaseException:
+      os.remove(path)
+      raise
+
+   offsets = iter(offsets)
+   def set_offset(x):
+      if isinstance(x, SharedArray):
+         x.offset = next(offsets)
+      elif isinstance(x, (dict, list, tuple)):
+         for v in (x.values() if isinstance(x, dict) else x):
+            set_offset(v)
+   # arrays were collected in the same order
+   set_offset(res)
+   return SharedArrays(res, path)
+
+def attach_arrays(obj):
+   """this method maps the file written by share_arrays and views the arrays in place, the file is removed.
+   the mapping is copy on write, the arrays are writable and the memory is freed with the last of them.
+
+   Args:
+       obj: result of share_arrays
+
+   Returns:
+       the result with its arrays
+   """
+   if not isinstance(obj, SharedArrays):
+      return obj
+
+   try:
+      with open(obj.path, "rb") as f:
+         buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+   finally:
+      discard_arrays(obj)
+
+   def replace(x):
+      if isinstance(x, SharedArray):
+         count = int(np.prod(x.shape))
+         return np.frombuffer(buffer, dtype=x.dtype, count=count, offset=x.offset).reshape(x.shape)
+      elif isinstance(x, dict):
+         return {k: replace(v) for k, v in x.items()}
+      elif isinstance(x, list):
+         return [replace(v) for v in x]
+      elif isinstance(x, tuple):
+         return tuple(replace(v) for v in x)
+      return x
+   return replace(obj.obj)
+
+def discard_arrays(obj):
+   # removes the file of a result of share_arrays, e.g. one that will not be attached
+   if not isinstance(obj, SharedArrays):
+      return
+   try:
+      os.remove(obj.path)
+   except FileNotFoundError:
+      pass
+   except OSError:
+      _pending_removal.append(obj.path)
+
+@atexit.register
+def _remove_pending():
+   for path in _pending_removal:
+      try:
+         os.remove(path)
+      except OSError:
+         pass
@@ -11,32 +11,102 @@ import wget
 import math
 import pandas as pd
 import sys
+import re
 
-def run_mp(map_func, arg_list, combine_func=None):
-   num_cores = multiprocessing.cpu_count()
-   num_cores = len(arg_list) if len(arg_list)<num_cores else num_cores
+from .shared_arrays import share_arrays, attach_arrays, discard_arrays
+
+def run_mp(map_func, arg_list, combine_func=None, chunksize=None, initializer=None, initargs=(), 
+           reducer=None, initial=None, backend="process", max_workers=None, shared=False):
+   """this method maps a function over arguments with a process, thread or serial backend
+
+   Args:
+       map_func (callable): function of one argument, must be picklable for the process backend, 
+          i.e. a module level function, use initializer to build per-process state instead of bound methods
+       arg_list (list): arguments
+       combine_func (callable, optional): called with all results in argument order. Defaults to None.
+       chunksize (int, optional): arguments sent to a worker at once, chosen from the number of workers if None.
+       initializer (callable, optional): called once in every worker with initargs. Defaults to None.
+       initargs (tuple, optional): arguments of initializer. Defaults to ().
+       reducer (callable, optional): reducer(acc, result) -> acc, folds results as they complete,
+          so results are not kept. Defaults to None.
+       initial (optional): initial value of acc for reducer. Defaults to None.
+       backend (str, optional): "process", "thread" or "serial". Defaults to "process".
+       max_workers (int, optional): defaults to cpu count.
+       shared (bool, optional): large arrays of results are returned through a file in shared memory 
+          instead of being pickled, process backend only, see share_arrays. Defaults to False.
+
+   Returns:
+       reduced value if reducer is given, combine_func(results) if combine_func is given, otherwise results
+   """
+   num_cores = multiprocessing.cpu_count() if max_workers is None else max_workers
+   num_cores = max(1, min(num_cores, len(arg_list)))
+   if chunksize is None:
+      # a few chunks per worker keeps the load balanced while cutting per task overhead
+      chunksize = max(1, len(arg_list) // (num_cores * 8))
+   chunks = [arg_list[i:i+chunksize] for i in range(0, len(arg_list), chunksize)]
    
+   acc = initial
+   results = [None] * len(chunks)
    
-   with concurrent.futures.ProcessPoolExecutor(max_workers=num_cores) as pool:
-      with tqdm(total=len(arg_list)) as progress:
-         futures = []
-         
-         for args in arg_list:
-               future = pool.submit(map_func, args)
-               future.add_done_callback(lambda p: progress.update())
-               futures.append(future)
-
-         results = []
+   def collect(index, chunk_res):
+      nonlocal acc
+      chunk_res = attach_arrays(chunk_res)
+      if reducer is not None:
+         for r in chunk_res:
+            acc = reducer(acc, r)
+      else:
+         results[index] = chunk_res
+   
+   with tqdm(total=len(arg_list)) as progress:
+      if backend == "serial" or len(chunks) == 0:
+         if initializer is not None:
+            initializer(*initargs)
+         for index, chunk in enumerate(chunks):
+            collect(index, _run_chunk(map_func, chunk))
+            progress.update(len(chunk))
+      else:
+         if backend == "process":
+            executor = concurrent.futures.ProcessPoolExecutor
+         elif backend == "thread":
+            executor = concurrent.futures.ThreadPoolExecutor
+         else:
+            raise ValueError(f"unknown backend {backend}.")
          
-         for future in futures:
-               result = future.result()
-               results.append(result)
+         with executor(max_workers=num_cores, initializer=initializer, initargs=initargs) as pool:
+            futures = {pool.submit(_run_chunk, map_func, chunk, shared and backend == "process"): index 
+                       for index, chunk in enumerate(chunks)}
+            collected = set()
+            try:
+               for future in concurrent.futures.as_completed(futures):
+                  index = futures[future]
+                  collected.add(future)
+                  collect(index, future.result())
+                  progress.update(len(chunks[index]))
+            except BaseException:
+               # results in shared memory that will not be collected are removed, they would stay in tmpfs
+               for future in futures:
+                  future.cancel()
+               concurrent.futures.wait(futures)
+               for future in futures:
+                  if future not in collected and not future.cancelled() and future.exception() is None:
+                     discard_arrays(future.result())
+               raise
    
+   if reducer is not None:
+      return acc
+   
+   results = [r for chunk_res in results for r in chunk_res]
    if combine_func is not None:
       return combine_func(results)
    else:
       return results   
 
+def _run_chunk(map_func, chunk, shared=False):
+   res = [map_func(args) for args in chunk]
+   if shared:
+      return share_arrays(res)
+   return res
+
 def load_xz_file(file):
    with lzma.open(file["path"], "rb") as pickle_file:
       return {"name": file["name"],
@@ -153,6 +223,14 @@ def code2country(country_code):
 
 
 # convert from units
+def to_float(value):
+   # number in a metadata value, e.g. "2080.0 m", " 45.5", 12, None if there is none
+   if value is None or isinstance(value, bool):
+      return None
+   if isinstance(value, (int, float)):
+      return None if math.isnan(value) else float(value)
+   match = re.search(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?", str(value))
+   return float(match.group(0)) if match else None
 
 
 